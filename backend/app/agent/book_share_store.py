@@ -1,13 +1,19 @@
 """Store MongoDB per condivisioni di libri."""
 import os
 import sys
-from typing import Optional, Dict, Any, List
+import time
+from typing import Optional, Dict, Any, List, Tuple
 from datetime import datetime
 from motor.motor_asyncio import AsyncIOMotorClient
 from pymongo import IndexModel, ASCENDING, DESCENDING
 from pymongo.errors import DuplicateKeyError
 from app.models import BookShare
 
+# Cache in-process dei controlli di accesso: i permessi cambiano raramente
+# durante il polling, e ogni scrittura sulle condivisioni la invalida
+ACCESS_CACHE_TTL_SECONDS = 30.0
+ACCESS_CACHE_MAX_ENTRIES = 1024
+
 
 class BookShareStore:
     """Store MongoDB per gestione condivisioni di libri."""
@@ -27,6 +33,7 @@ class BookShareStore:
         self.collection_name = collection
         self.db = None
         self.shares_collection = None
+        self._access_cache: Dict[Tuple[str, str], Tuple[float, bool]] = {}
         print(f"[BookShareStore] Inizializzato. DB: {database}, Collection: {collection}", file=sys.stderr)
     
     async def connect(self):
@@ -145,6 +152,7 @@ class BookShareStore:
                 await self.connect()
             
             await self.shares_collection.insert_one(doc)
+            self._invalidate_access_cache()
             print(f"[BookShareStore] Condivisione creata: {share_id} (book: {book_session_id}, {owner_id} -> {recipient_id}, {status})", file=sys.stderr)
             return share
         except DuplicateKeyError:
@@ -353,6 +361,7 @@ class BookShareStore:
                     }
                 }
             )
+            self._invalidate_access_cache()
             
             if result.modified_count > 0:
                 share.status = status
@@ -417,6 +426,7 @@ class BookShareStore:
                     }
                 }
             )
+            self._invalidate_access_cache()
             
             if result.modified_count > 0:
                 share.status = "pending"
@@ -462,6 +472,7 @@ class BookShareStore:
             
             # Elimina
             result = await self.shares_collection.delete_one({"_id": share_id})
+            self._invalidate_access_cache()
             deleted = result.deleted_count > 0
             
             if deleted:
@@ -514,6 +525,9 @@ class BookShareStore:
         """
         Verifica se un utente ha accesso a un libro (owner o condivisione accettata).
         
+        L'esito per (book_session_id, user_id) è tenuto in cache per
+        ACCESS_CACHE_TTL_SECONDS, così il polling non interroga MongoDB a ogni richiesta.
+        
         Args:
             book_session_id: ID sessione del libro
             user_id: ID utente da verificare
@@ -526,12 +540,41 @@ class BookShareStore:
         if user_id == owner_id:
             return True
         
+        return await self.has_accepted_share(book_session_id, user_id)
+    
+    async def has_accepted_share(self, book_session_id: str, user_id: str) -> bool:
+        """
+        Verifica se esiste una condivisione accettata del libro verso l'utente.
+        
+        Non richiede l'owner, quindi può essere eseguita in parallelo al recupero
+        della sessione. L'esito è in cache per ACCESS_CACHE_TTL_SECONDS.
+        
+        Args:
+            book_session_id: ID sessione del libro
+            user_id: ID utente da verificare
+        
+        Returns:
+            True se esiste una condivisione accettata, False altrimenti
+        """
+        cache_key = (book_session_id, user_id)
+        now = time.monotonic()
+        cached = self._access_cache.get(cache_key)
+        if cached and cached[0] > now:
+            return cached[1]
+        
         # Verifica se esiste condivisione accettata
         share = await self.get_book_share(book_session_id, user_id)
-        if share and share.status == "accepted":
-            return True
+        has_access = bool(share and share.status == "accepted")
         
-        return False
+        if len(self._access_cache) >= ACCESS_CACHE_MAX_ENTRIES:
+            # Scarta la voce più vecchia (i dict mantengono l'ordine di inserimento)
+            self._access_cache.pop(next(iter(self._access_cache)))
+        self._access_cache[cache_key] = (now + ACCESS_CACHE_TTL_SECONDS, has_access)
+        return has_access
+    
+    def _invalidate_access_cache(self):
+        """Svuota la cache dei controlli di accesso dopo una modifica alle condivisioni."""
+        self._access_cache.clear()
     
     async def delete_all_shares_for_book(
         self,
@@ -556,6 +599,7 @@ class BookShareStore:
                 "book_session_id": book_session_id,
                 "owner_id": owner_id
             })
+            self._invalidate_access_cache()
             deleted_count = result.deleted_count
             if deleted_count > 0:
                 print(f"[BookShareStore] Eliminate {deleted_count} condivisioni per libro {book_session_id}", file=sys.stderr)
@@ -563,7 +607,35 @@ class BookShareStore:
         except Exception as e:
             print(f"[BookShareStore] ERRORE nell'eliminazione condivisioni libro: {e}", file=sys.stderr)
             raise
-
+    
+    async def delete_all_shares_for_books(self, book_session_ids: List[str]) -> int:
+        """
+        Elimina tutte le condivisioni di più libri con una sola delete_many (pulizia admin).
+        
+        Args:
+            book_session_ids: ID sessione dei libri
+        
+        Returns:
+            Numero di condivisioni eliminate
+        """
+        if not book_session_ids:
+            return 0
+        if self.shares_collection is None:
+            await self.connect()
+        
+        try:
+            result = await self.shares_collection.delete_many({
+                "book_session_id": {"$in": list(book_session_ids)}
+            })
+            self._invalidate_access_cache()
+            deleted_count = result.deleted_count
+            if deleted_count > 0:
+                print(f"[BookShareStore] Eliminate {deleted_count} condivisioni per {len(book_session_ids)} libri", file=sys.stderr)
+            return deleted_count
+        except Exception as e:
+            print(f"[BookShareStore] ERRORE nell'eliminazione condivisioni libri: {e}", file=sys.stderr)
+            raise
+    
     async def get_sent_shares(self, owner_id: str) -> list:
         """
         Recupera tutte le condivisioni inviate da un utente (per export GDPR).
@@ -598,7 +670,7 @@ class BookShareStore:
         except Exception as e:
             print(f"[BookShareStore] ERRORE get_sent_shares: {e}", file=sys.stderr)
             return []
-
+    
     async def get_received_shares(self, recipient_id: str) -> list:
         """
         Recupera tutte le condivisioni ricevute da un utente (per export GDPR).
@@ -633,7 +705,7 @@ class BookShareStore:
         except Exception as e:
             print(f"[BookShareStore] ERRORE get_received_shares: {e}", file=sys.stderr)
             return []
-
+    
     async def delete_shares_for_book(self, book_session_id: str) -> int:
         """
         Elimina tutte le condivisioni di un libro (senza verifica owner).
@@ -650,11 +722,12 @@ class BookShareStore:
         
         try:
             result = await self.shares_collection.delete_many({"book_session_id": book_session_id})
+            self._invalidate_access_cache()
             return result.deleted_count
         except Exception as e:
             print(f"[BookShareStore] ERRORE delete_shares_for_book: {e}", file=sys.stderr)
             return 0
-
+    
     async def anonymize_user_shares(self, user_id: str) -> int:
         """
         Anonimizza le condivisioni di un utente (per cancellazione account GDPR).
@@ -695,6 +768,7 @@ class BookShareStore:
                 }
             )
             
+            self._invalidate_access_cache()
             total = result_owner.modified_count + result_recipient.modified_count
             print(f"[BookShareStore] Anonimizzate {total} condivisioni per utente {user_id}", file=sys.stderr)
             return total
@@ -708,7 +782,12 @@ _book_share_store: Optional[BookShareStore] = None
 
 
 def get_book_share_store() -> BookShareStore:
-    """Restituisce l'istanza globale del BookShareStore."""
+    """
+    Restituisce l'istanza globale del BookShareStore.
+    
+    La connessione viene aperta una sola volta in startup_db (main.py): gli endpoint
+    usano direttamente l'istanza già connessa, senza chiamare connect() a ogni richiesta.
+    """
     global _book_share_store
     if _book_share_store is None:
         mongo_uri = os.getenv("MONGODB_URI")
@@ -1,6 +1,5 @@
 import os
 import base64
-from pathlib import Path
 from typing import Optional
 from io import BytesIO
 import asyncio
@@ -8,6 +7,7 @@ from google import genai
 from google.genai import types
 from PIL import Image as PILImage
 from app.core.config import get_app_config
+from app.services.storage_service import COVERS_DIR
 
 
 async def generate_book_cover(
@@ -103,9 +103,8 @@ La copertina deve essere:
         },
     ]
     
-    sessions_dir = Path(__file__).parent.parent.parent / "sessions"
-    sessions_dir.mkdir(exist_ok=True)
-    cover_path = sessions_dir / f"{session_id}_cover.png"
+    COVERS_DIR.mkdir(exist_ok=True)
+    cover_path = COVERS_DIR / f"{session_id}_cover.png"
     
     last_error = None
     
@@ -3,7 +3,8 @@ import json
 import asyncio
 import sys
 from io import BytesIO
-from typing import Any, Optional, Dict
+from pathlib import Path
+from typing import Any, Optional, Dict, Union
 
 from google import genai
 from google.genai import types
@@ -91,12 +92,12 @@ def _response_to_text(response: Any) -> str:
     return str(response)
 
 
-def extract_text_from_pdf(pdf_bytes: bytes, max_chars: Optional[int] = None) -> str:
+def extract_text_from_pdf(pdf_bytes: Union[bytes, Path], max_chars: Optional[int] = None) -> str:
     """
     Estrae testo da un PDF per uso con OpenAI (che non supporta PDF direttamente).
     
     Args:
-        pdf_bytes: Bytes del file PDF
+        pdf_bytes: Bytes del file PDF, oppure path del file (letto pagina per pagina da disco)
         max_chars: Numero massimo di caratteri da estrarre (None = tutto)
                    Utile per rispettare limiti token (GPT-5.2: ~400k token ≈ ~1.6M caratteri)
     
@@ -114,11 +115,14 @@ def extract_text_from_pdf(pdf_bytes: bytes, max_chars: Optional[int] = None) ->
             "PyPDF2 non è installato. Installa con: pip install PyPDF2 o uv add PyPDF2"
         )
     
-    if not pdf_bytes or len(pdf_bytes) == 0:
+    if isinstance(pdf_bytes, Path):
+        if not pdf_bytes.exists() or pdf_bytes.stat().st_size == 0:
+            raise ValueError("PDF vuoto o non trovato")
+    elif not pdf_bytes or len(pdf_bytes) == 0:
         raise ValueError("PDF bytes vuoto")
     
     try:
-        pdf_file = BytesIO(pdf_bytes)
+        pdf_file = str(pdf_bytes) if isinstance(pdf_bytes, Path) else BytesIO(pdf_bytes)
         pdf_reader = PyPDF2.PdfReader(pdf_file)
         
         extracted_text = []
@@ -252,11 +256,50 @@ def _extract_token_usage_google_genai(response: Any, model_name: str) -> Dict[st
     return token_usage
 
 
+# Semaforo condiviso che limita le critiche concorrenti (creato al primo utilizzo)
+_critique_semaphore: Optional[asyncio.Semaphore] = None
+
+
+def _get_critique_semaphore() -> asyncio.Semaphore:
+    """Restituisce il semaforo per le critiche, dimensionato da max_concurrent_requests."""
+    global _critique_semaphore
+    if _critique_semaphore is None:
+        cfg = get_literary_critic_config()
+        _critique_semaphore = asyncio.Semaphore(max(1, int(cfg.get("max_concurrent_requests", 4))))
+    return _critique_semaphore
+
+
 async def generate_literary_critique_from_pdf(
     title: str,
     author: str,
-    pdf_bytes: bytes,
+    pdf_bytes: Optional[bytes] = None,
+    api_key: Optional[str] = None,
+    pdf_path: Optional[Path] = None,
+) -> tuple[Dict[str, Any], Dict[str, int]]:
+    """
+    Genera una valutazione critica usando come input il PDF finale del libro.
+    
+    Il PDF può essere passato come bytes oppure come path su disco (pdf_path):
+    in quel caso non viene caricato interamente in memoria.
+    
+    Le richieste concorrenti (es. più libri completati insieme) vengono eseguite
+    in parallelo fino a max_concurrent_requests; le successive attendono in coda.
+    
+    Returns:
+        Tupla (critique_dict, token_usage)
+    """
+    if pdf_bytes is None and pdf_path is None:
+        raise ValueError("Specificare pdf_bytes oppure pdf_path")
+    async with _get_critique_semaphore():
+        return await _generate_literary_critique_from_pdf(title, author, pdf_bytes, api_key, pdf_path)
+
+
+async def _generate_literary_critique_from_pdf(
+    title: str,
+    author: str,
+    pdf_bytes: Optional[bytes] = None,
     api_key: Optional[str] = None,
+    pdf_path: Optional[Path] = None,
 ) -> tuple[Dict[str, Any], Dict[str, int]]:
     """
     Genera una valutazione critica usando come input il PDF finale del libro.
@@ -306,12 +349,22 @@ async def generate_literary_critique_from_pdf(
                 print(f"[LITERARY_CRITIC] API Key Google trovata: {'Sì' if api_key else 'No'}", file=sys.stderr)
                 client = genai.Client(api_key=api_key)
                 
-                pdf_part = types.Part(
-                    inline_data=types.Blob(
-                        mime_type="application/pdf",
-                        data=pdf_bytes,
+                uploaded_file = None
+                if pdf_path is not None:
+                    # PDF su disco: upload tramite File API (letto a blocchi), referenziato per URI
+                    uploaded_file = await asyncio.to_thread(
+                        client.files.upload,
+                        file=pdf_path,
+                        config=types.UploadFileConfig(mime_type="application/pdf"),
+                    )
+                    pdf_part = types.Part.from_uri(file_uri=uploaded_file.uri, mime_type="application/pdf")
+                else:
+                    pdf_part = types.Part(
+                        inline_data=types.Blob(
+                            mime_type="application/pdf",
+                            data=pdf_bytes,
+                        )
                     )
-                )
                 
                 config_obj = None
                 if hasattr(types, "GenerateContentConfig"):
@@ -331,12 +384,19 @@ async def generate_literary_critique_from_pdf(
                 ]
 
                 print(f"[LITERARY_CRITIC] Invio PDF diretto a Gemini API (multimodale)...", file=sys.stderr)
-                response = await asyncio.to_thread(
-                    client.models.generate_content,
-                    model=model_name,
-                    contents=contents,
-                    config=config_obj,
-                )
+                try:
+                    response = await asyncio.to_thread(
+                        client.models.generate_content,
+                        model=model_name,
+                        contents=contents,
+                        config=config_obj,
+                    )
+                finally:
+                    if uploaded_file is not None:
+                        try:
+                            await asyncio.to_thread(client.files.delete, name=uploaded_file.name)
+                        except Exception as delete_err:
+                            print(f"[LITERARY_CRITIC] Avviso: impossibile eliminare il file caricato {uploaded_file.name}: {delete_err}", file=sys.stderr)
                 response_text = _response_to_text(response)
                 
                 # Estrai token usage per google.genai
@@ -365,7 +425,10 @@ async def generate_literary_critique_from_pdf(
                 
                 # Estrai testo dal PDF
                 print(f"[LITERARY_CRITIC] Estrazione testo da PDF per OpenAI (max {MAX_TEXT_CHARS_OPENAI:,} caratteri)...", file=sys.stderr)
-                pdf_text = extract_text_from_pdf(pdf_bytes, max_chars=MAX_TEXT_CHARS_OPENAI)
+                pdf_text = extract_text_from_pdf(
+                    pdf_path if pdf_path is not None else pdf_bytes,
+                    max_chars=MAX_TEXT_CHARS_OPENAI,
+                )
                 print(f"[LITERARY_CRITIC] Testo estratto: {len(pdf_text):,} caratteri da PDF", file=sys.stderr)
                 
                 # Crea prompt completo con testo estratto
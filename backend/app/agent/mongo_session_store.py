@@ -1,14 +1,35 @@
 """Store MongoDB per le sessioni usando Motor (driver async)."""
 import os
+import re
 import sys
-from typing import Optional, Dict, Any
+from typing import Optional, Dict, Any, List
 from datetime import datetime
 from motor.motor_asyncio import AsyncIOMotorClient
-from pymongo import IndexModel, ASCENDING
+from pymongo import IndexModel, ASCENDING, DESCENDING
 from app.models import SubmissionRequest, QuestionAnswer
 from app.agent.session_store import SessionStore, SessionData
 
 
+# Ordinamenti della libreria (valori UI) -> campi del documento
+LIBRARY_SORT_FIELDS = {
+    "created_at": "created_at",
+    "updated_at": "updated_at",
+    "title": "current_title",
+    "score": "literary_critique.score",
+    "cost": "real_cost_eur",
+    "total_pages": "writing_progress.total_pages",
+}
+
+# Libri obsoleti per la pulizia admin: senza valutazione critica, oppure completati senza copertina
+# (stesso criterio di get_obsolete_sessions_async per lo store su file)
+OBSOLETE_SESSIONS_MATCH = {
+    "$or": [
+        {"literary_critique.score": None},
+        {"status": "complete", "cover_image_path": {"$in": [None, ""]}},
+    ]
+}
+
+
 class MongoSessionStore(SessionStore):
     """Store MongoDB per le sessioni con persistenza su database."""
     
@@ -65,9 +86,16 @@ class MongoSessionStore(SessionStore):
                 IndexModel([("status", ASCENDING)]),
                 IndexModel([("user_id", ASCENDING)]),  # Indice per filtro per utente
                 IndexModel([("form_data.llm_model", ASCENDING)]),
+                # Filtro libreria per modalità: user_id + $in sui modelli + status
+                IndexModel([("user_id", ASCENDING), ("form_data.llm_model", ASCENDING), ("status", ASCENDING)]),
                 IndexModel([("form_data.genre", ASCENDING)]),
                 IndexModel([("created_at", ASCENDING)]),
                 IndexModel([("updated_at", ASCENDING)]),
+                # Libreria dell'utente ordinata per data (sort + filtro serviti dallo stesso indice)
+                IndexModel([("user_id", ASCENDING), ("created_at", DESCENDING)]),
+                IndexModel([("user_id", ASCENDING), ("updated_at", DESCENDING)]),
+                # Pulizia dei libri obsoleti (ramo "senza valutazione" di OBSOLETE_SESSIONS_MATCH)
+                IndexModel([("literary_critique.score", ASCENDING), ("status", ASCENDING)]),
             ]
             await self.sessions_collection.create_indexes(indexes)
             print(f"[MongoSessionStore] Indici creati con successo", file=sys.stderr)
@@ -162,7 +190,7 @@ class MongoSessionStore(SessionStore):
             
             # Sessione legacy (senza user_id) o ownership verificata: permettere accesso
             return session
-            
+        
         except Exception as e:
             print(f"[MongoSessionStore] ERRORE nel recupero sessione {session_id}: {e}", file=sys.stderr)
             return None
@@ -252,6 +280,7 @@ class MongoSessionStore(SessionStore):
                 )
         
         session.current_outline = outline_text
+        session.outline_section_count = None  # Outline cambiato: il conteggio va ricalcolato
         if version is not None:
             session.outline_version = version
         else:
@@ -271,6 +300,20 @@ class MongoSessionStore(SessionStore):
             print(f"[MongoSessionStore] ERRORE nell'eliminazione sessione {session_id}: {e}", file=sys.stderr)
             return False
     
+    async def delete_sessions(self, session_ids: List[str]) -> int:
+        """Elimina più sessioni con una sola delete_many; restituisce quante sono state eliminate."""
+        if not session_ids:
+            return 0
+        if self.sessions_collection is None:
+            await self.connect()
+        
+        try:
+            result = await self.sessions_collection.delete_many({"_id": {"$in": list(session_ids)}})
+            return result.deleted_count
+        except Exception as e:
+            print(f"[MongoSessionStore] ERRORE nell'eliminazione di {len(session_ids)} sessioni: {e}", file=sys.stderr)
+            return 0
+    
     async def update_writing_progress(
         self,
         session_id: str,
@@ -369,6 +412,55 @@ class MongoSessionStore(SessionStore):
             print(f"[MongoSessionStore] ERRORE nell'aggiornamento estimated_cost per sessione {session_id}: {e}", file=sys.stderr)
             return False
     
+    async def set_writing_time_minutes(self, session_id: str, writing_time_minutes: float) -> bool:
+        """
+        Aggiorna solo writing_time_minutes in writing_progress senza sovrascrivere l'intero dict.
+        
+        Args:
+            session_id: ID della sessione
+            writing_time_minutes: Tempo di scrittura dei capitoli (in minuti)
+        
+        Returns:
+            True se l'aggiornamento è riuscito, False altrimenti
+        """
+        if self.sessions_collection is None:
+            await self.connect()
+        
+        try:
+            result = await self.sessions_collection.update_one(
+                {"_id": session_id},
+                {"$set": {"writing_progress.writing_time_minutes": writing_time_minutes, "updated_at": datetime.now().isoformat()}}
+            )
+            return result.modified_count > 0
+        except Exception as e:
+            print(f"[MongoSessionStore] ERRORE nell'aggiornamento writing_time_minutes per sessione {session_id}: {e}", file=sys.stderr)
+            return False
+    
+    async def set_outline_section_count(self, session_id: str, outline_section_count: int) -> bool:
+        """
+        Memorizza il numero di sezioni dell'outline corrente, così il polling
+        del progresso non deve ri-analizzare l'outline a ogni richiesta.
+        
+        Args:
+            session_id: ID della sessione
+            outline_section_count: Numero di sezioni restituite da parse_outline_sections
+        
+        Returns:
+            True se l'aggiornamento è riuscito, False altrimenti
+        """
+        if self.sessions_collection is None:
+            await self.connect()
+        
+        try:
+            result = await self.sessions_collection.update_one(
+                {"_id": session_id},
+                {"$set": {"outline_section_count": outline_section_count}}
+            )
+            return result.matched_count > 0
+        except Exception as e:
+            print(f"[MongoSessionStore] ERRORE nell'aggiornamento outline_section_count per sessione {session_id}: {e}", file=sys.stderr)
+            return False
+    
     async def pause_writing(
         self,
         session_id: str,
@@ -415,8 +507,9 @@ class MongoSessionStore(SessionStore):
         chapter_title: str,
         chapter_content: str,
         section_index: int,
+        page_count: Optional[int] = None,
     ) -> SessionData:
-        """Aggiunge o aggiorna un capitolo completato."""
+        """Aggiunge o aggiorna un capitolo completato (page_count, se fornito, è salvato nel capitolo)."""
         session = await self.get_session(session_id)
         if not session:
             raise ValueError(f"Sessione {session_id} non trovata")
@@ -427,6 +520,8 @@ class MongoSessionStore(SessionStore):
             "content": chapter_content,
             "section_index": section_index,
         }
+        if page_count is not None:
+            chapter_dict["page_count"] = page_count
         
         # Rimuovi eventuale capitolo esistente con lo stesso section_index
         session.book_chapters = [
@@ -577,9 +672,115 @@ class MongoSessionStore(SessionStore):
         await self.save_session(session)
         return True
     
+    async def get_sessions_bulk(self, session_ids: List[str], user_id: Optional[str] = None,
+                                fields: Optional[list] = None) -> Dict[str, SessionData]:
+        """
+        Recupera più sessioni con una sola query ($in sugli _id).
+        
+        Args:
+            session_ids: ID delle sessioni da recuperare
+            user_id: ID utente per verificare ownership (stesse regole di get_session)
+            fields: Lista di campi da includere (proiezione MongoDB). Se None, carica tutto.
+        
+        Returns:
+            Dict session_id -> SessionData con le sole sessioni trovate e accessibili
+        """
+        if not session_ids:
+            return {}
+        if self.sessions_collection is None:
+            await self.connect()
+        
+        sessions = {}
+        try:
+            projection = None
+            if fields:
+                projection = {field: 1 for field in fields}
+                projection["_id"] = 1
+            
+            cursor = self.sessions_collection.find({"_id": {"$in": list(session_ids)}}, projection)
+            async for doc in cursor:
+                session = self._doc_to_session(doc)
+                # Sessioni legacy (senza user_id) accessibili da tutti, come in get_session
+                if user_id and session.user_id and session.user_id != user_id:
+                    continue
+                sessions[session.session_id] = session
+            return sessions
+        except Exception as e:
+            print(f"[MongoSessionStore] ERRORE nel recupero bulk delle sessioni: {e}", file=sys.stderr)
+            return {}
+    
+    async def get_obsolete_sessions(self, fields: Optional[list] = None) -> Dict[str, SessionData]:
+        """
+        Recupera i libri obsoleti (vedi OBSOLETE_SESSIONS_MATCH) filtrandoli in MongoDB.
+        
+        Args:
+            fields: Lista di campi da includere (proiezione MongoDB). Se None, carica tutto.
+        
+        Returns:
+            Dict session_id -> SessionData dei soli libri obsoleti
+        """
+        if self.sessions_collection is None:
+            await self.connect()
+        
+        sessions = {}
+        try:
+            pipeline = [{"$match": OBSOLETE_SESSIONS_MATCH}]
+            if fields:
+                projection = {field: 1 for field in fields}
+                projection["_id"] = 1
+                pipeline.append({"$project": projection})
+            
+            async for doc in self.sessions_collection.aggregate(pipeline):
+                session = self._doc_to_session(doc)
+                sessions[session.session_id] = session
+            return sessions
+        except Exception as e:
+            print(f"[MongoSessionStore] ERRORE nel recupero dei libri obsoleti: {e}", file=sys.stderr)
+            return {}
+    
+    async def get_sessions_by_model(self, model_substring: str, user_id: Optional[str] = None,
+                                    fields: Optional[list] = None) -> Dict[str, SessionData]:
+        """
+        Recupera le sessioni il cui modello LLM contiene model_substring (case-insensitive),
+        filtrandole in MongoDB invece di caricare tutte le sessioni.
+        
+        Args:
+            model_substring: Sottostringa del modello (es. "gemini-2.5")
+            user_id: Se fornito, filtra solo le sessioni dell'utente
+            fields: Lista di campi da includere (proiezione MongoDB). Se None, carica tutto.
+        
+        Returns:
+            Dict session_id -> SessionData delle sole sessioni del modello
+        """
+        if self.sessions_collection is None:
+            await self.connect()
+        
+        sessions = {}
+        try:
+            query = {"form_data.llm_model": {"$regex": re.escape(model_substring), "$options": "i"}}
+            if user_id:
+                query["user_id"] = user_id
+            
+            projection = None
+            if fields:
+                projection = {field: 1 for field in fields}
+                projection["_id"] = 1
+            
+            async for doc in self.sessions_collection.find(query, projection):
+                session = self._doc_to_session(doc)
+                sessions[session.session_id] = session
+            return sessions
+        except Exception as e:
+            print(f"[MongoSessionStore] ERRORE nel recupero delle sessioni per modello {model_substring}: {e}", file=sys.stderr)
+            return {}
+    
     async def get_all_sessions(self, user_id: Optional[str] = None, fields: Optional[list] = None, 
                               status: Optional[str] = None, llm_model: Optional[str] = None,
-                              genre: Optional[str] = None) -> Dict[str, SessionData]:
+                              genre: Optional[str] = None,
+                              llm_models: Optional[List[str]] = None,
+                              search: Optional[str] = None,
+                              sort_by: Optional[str] = None,
+                              sort_order: Optional[str] = "desc") -> Dict[str, SessionData]:
         """
         Recupera tutte le sessioni (per libreria/statistiche).
         
@@ -590,9 +791,13 @@ class MongoSessionStore(SessionStore):
             status: Filtra per stato della sessione (draft, outline, writing, paused, complete)
             llm_model: Filtra per modello LLM usato
             genre: Filtra per genere del libro
+            llm_models: Filtra per uno qualsiasi dei modelli LLM indicati (es. tutti i modelli di una modalità)
+            search: Sottostringa (case-insensitive) da cercare in titolo o nome autore
+            sort_by: Ordinamento della libreria (chiave di LIBRARY_SORT_FIELDS), applicato da MongoDB
+            sort_order: "asc" o "desc"
         
         Returns:
-            Dict di SessionData
+            Dict di SessionData (nell'ordine restituito da MongoDB)
         """
         if self.sessions_collection is None:
             await self.connect()
@@ -610,12 +815,29 @@ class MongoSessionStore(SessionStore):
                 # Per ora manteniamo il filtro in Python, ma possiamo ottimizzare in futuro
                 pass  # Gestito dopo il caricamento
             
-            if llm_model:
+            if llm_models is not None:
+                query["form_data.llm_model"] = {"$in": list(llm_models)}
+            elif llm_model:
                 query["form_data.llm_model"] = llm_model
             
             if genre:
                 query["form_data.genre"] = genre
             
+            if search:
+                # Ricerca per sottostringa: regex escapata e case-insensitive ($text cerca solo parole intere)
+                pattern = {"$regex": re.escape(search), "$options": "i"}
+                search_clauses = [
+                    {"current_title": pattern},
+                    {"form_data.user_name": pattern},
+                ]
+                # In libreria titolo e autore mancanti sono mostrati come "Romanzo" e "Autore"
+                search_lower = search.lower()
+                if search_lower in "romanzo":
+                    search_clauses.append({"current_title": {"$in": [None, ""]}})
+                if search_lower in "autore":
+                    search_clauses.append({"form_data.user_name": {"$in": [None, ""]}})
+                query["$or"] = search_clauses
+            
             # Costruisci proiezione se specificata
             projection = None
             if fields:
@@ -624,6 +846,10 @@ class MongoSessionStore(SessionStore):
                 projection["_id"] = 1
             
             cursor = self.sessions_collection.find(query, projection)
+            if sort_by:
+                direction = DESCENDING if sort_order == "desc" else ASCENDING
+                sort_field = LIBRARY_SORT_FIELDS.get(sort_by, "created_at")
+                cursor = cursor.sort([(sort_field, direction), ("_id", direction)])
             async for doc in cursor:
                 session = self._doc_to_session(doc)
                 
@@ -638,7 +864,7 @@ class MongoSessionStore(SessionStore):
         except Exception as e:
             print(f"[MongoSessionStore] ERRORE nel recupero di tutte le sessioni: {e}", file=sys.stderr)
             return {}
-
+    
     async def get_sessions_by_user(self, user_id: str) -> list:
         """
         Recupera tutte le sessioni di un utente (per export GDPR).
@@ -2,7 +2,7 @@ import json
 import os
 import sys
 from pathlib import Path
-from typing import Optional, Dict, Any
+from typing import Optional, Dict, Any, List
 from datetime import datetime
 from app.models import SubmissionRequest, QuestionAnswer
 
@@ -27,6 +27,7 @@ class SessionData:
         self.validated: bool = False
         self.current_outline: Optional[str] = None
         self.outline_version: int = 0
+        self.outline_section_count: Optional[int] = None  # Numero di sezioni dell'outline corrente (memoizzato)
         self.book_chapters: list[Dict[str, Any]] = []  # Lista di capitoli completati
         self.writing_progress: Optional[Dict[str, Any]] = None  # Stato di avanzamento scrittura
         self.cover_image_path: Optional[str] = None  # Path dell'immagine copertina
@@ -89,6 +90,7 @@ class SessionData:
             "validated": self.validated,
             "current_outline": self.current_outline,
             "outline_version": self.outline_version,
+            "outline_section_count": self.outline_section_count,
             "book_chapters": self.book_chapters,
             "writing_progress": self.writing_progress,
             "cover_image_path": self.cover_image_path,
@@ -125,6 +127,7 @@ class SessionData:
         session.validated = data.get("validated", False)
         session.current_outline = data.get("current_outline")
         session.outline_version = data.get("outline_version", 0)
+        session.outline_section_count = data.get("outline_section_count")
         session.book_chapters = data.get("book_chapters", [])
         session.writing_progress = data.get("writing_progress")
         session.cover_image_path = data.get("cover_image_path")
@@ -269,6 +272,7 @@ class SessionStore:
         
         session.current_outline = outline_text
         session.outline_version += 1
+        session.outline_section_count = None  # Outline cambiato: il conteggio va ricalcolato
         session.update_timestamp()
         
         return session
@@ -280,6 +284,14 @@ class SessionStore:
             return True
         return False
     
+    def delete_sessions(self, session_ids: List[str]) -> int:
+        """Elimina più sessioni; restituisce quante sono state eliminate."""
+        deleted_count = 0
+        for session_id in session_ids:
+            if self._sessions.pop(session_id, None) is not None:
+                deleted_count += 1
+        return deleted_count
+    
     def update_writing_progress(
         self,
         session_id: str,
@@ -379,6 +391,48 @@ class SessionStore:
         
         return True
     
+    def set_writing_time_minutes(self, session_id: str, writing_time_minutes: float) -> bool:
+        """
+        Aggiorna solo writing_time_minutes in writing_progress senza sovrascrivere l'intero dict.
+        
+        Args:
+            session_id: ID della sessione
+            writing_time_minutes: Tempo di scrittura dei capitoli (in minuti)
+        
+        Returns:
+            True se l'aggiornamento è riuscito, False altrimenti
+        """
+        session = self.get_session(session_id)
+        if not session:
+            return False
+        
+        if session.writing_progress is None:
+            session.writing_progress = {}
+        
+        session.writing_progress["writing_time_minutes"] = writing_time_minutes
+        session.update_timestamp()
+        
+        return True
+    
+    def set_outline_section_count(self, session_id: str, outline_section_count: int) -> bool:
+        """
+        Memorizza il numero di sezioni dell'outline corrente, così il polling
+        del progresso non deve ri-analizzare l'outline a ogni richiesta.
+        
+        Args:
+            session_id: ID della sessione
+            outline_section_count: Numero di sezioni restituite da parse_outline_sections
+        
+        Returns:
+            True se l'aggiornamento è riuscito, False altrimenti
+        """
+        session = self.get_session(session_id)
+        if not session:
+            return False
+        
+        session.outline_section_count = outline_section_count
+        return True
+    
     def update_token_usage(
         self,
         session_id: str,
@@ -496,8 +550,9 @@ class SessionStore:
         chapter_title: str,
         chapter_content: str,
         section_index: int,
+        page_count: Optional[int] = None,
     ) -> SessionData:
-        """Aggiunge o aggiorna un capitolo completato."""
+        """Aggiunge o aggiorna un capitolo completato (page_count, se fornito, è salvato nel capitolo)."""
         session = self.get_session(session_id)
         if not session:
             raise ValueError(f"Sessione {session_id} non trovata")
@@ -508,6 +563,8 @@ class SessionStore:
             "content": chapter_content,
             "section_index": section_index,
         }
+        if page_count is not None:
+            chapter_dict["page_count"] = page_count
         
         # Rimuovi eventuale capitolo esistente con lo stesso section_index
         session.book_chapters = [
@@ -553,7 +610,7 @@ class SessionStore:
         session.critique_error = None
         session.update_timestamp()
         return session
-
+    
     def update_critique_status(
         self,
         session_id: str,
@@ -564,13 +621,13 @@ class SessionStore:
         session = self.get_session(session_id)
         if not session:
             raise ValueError(f"Sessione {session_id} non trovata")
-
+        
         session.critique_status = status
         session.critique_error = error
         session.update_timestamp()
         # Se fallita, non cancelliamo automaticamente una critica già presente (utile per storico/debug)
         return session
-
+    
     def update_writing_times(
         self,
         session_id: str,
@@ -581,14 +638,14 @@ class SessionStore:
         session = self.get_session(session_id)
         if not session:
             raise ValueError(f"Sessione {session_id} non trovata")
-
+        
         if start_time is not None:
             session.writing_start_time = start_time
         if end_time is not None:
             session.writing_end_time = end_time
         self._save_sessions()
         return session
-
+    
     def start_chapter_timing(self, session_id: str, start_time: Optional[datetime] = None) -> SessionData:
         """Inizia il tracciamento del tempo per un capitolo."""
         session = self.get_session(session_id)
@@ -598,7 +655,7 @@ class SessionStore:
         session.chapter_start_time = start_time or datetime.now()
         self._save_sessions()
         return session
-
+    
     def end_chapter_timing(self, session_id: str, end_time: Optional[datetime] = None) -> SessionData:
         """Termina il tracciamento del tempo per un capitolo e salva il risultato."""
         session = self.get_session(session_id)
@@ -613,7 +670,7 @@ class SessionStore:
             self._save_sessions()
         
         return session
-
+    
     def _save_sessions(self):
         """Metodo vuoto per compatibilità. Sovrascritto in FileSessionStore per salvare su file."""
         pass
@@ -759,6 +816,13 @@ class FileSessionStore(SessionStore):
             self._save_sessions()
         return result
     
+    def delete_sessions(self, session_ids: List[str]) -> int:
+        """Elimina più sessioni con un solo salvataggio su file."""
+        deleted_count = super().delete_sessions(session_ids)
+        if deleted_count:
+            self._save_sessions()
+        return deleted_count
+    
     def update_writing_progress(
         self,
         session_id: str,
@@ -801,10 +865,11 @@ class FileSessionStore(SessionStore):
         chapter_title: str,
         chapter_content: str,
         section_index: int,
+        page_count: Optional[int] = None,
     ) -> SessionData:
         """Aggiunge o aggiorna un capitolo completato e salva su file."""
         session = super().update_book_chapter(
-            session_id, chapter_title, chapter_content, section_index
+            session_id, chapter_title, chapter_content, section_index, page_count=page_count
         )
         self._save_sessions()
         return session
@@ -843,6 +908,20 @@ class FileSessionStore(SessionStore):
             self._save_sessions()
         return result
     
+    def set_writing_time_minutes(self, session_id: str, writing_time_minutes: float) -> bool:
+        """Imposta il tempo di scrittura e salva su file."""
+        result = super().set_writing_time_minutes(session_id, writing_time_minutes)
+        if result:
+            self._save_sessions()
+        return result
+    
+    def set_outline_section_count(self, session_id: str, outline_section_count: int) -> bool:
+        """Memorizza il numero di sezioni dell'outline e salva su file."""
+        result = super().set_outline_section_count(session_id, outline_section_count)
+        if result:
+            self._save_sessions()
+        return result
+    
     def set_real_cost(self, session_id: str, real_cost_eur: float) -> bool:
         """Imposta il costo reale e salva su file."""
         result = super().set_real_cost(session_id, real_cost_eur)
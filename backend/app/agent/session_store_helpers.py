@@ -1,11 +1,21 @@
 """Helper functions per gestire session_store in modo compatibile sync/async."""
-from typing import Optional, Dict, TYPE_CHECKING, Any
+import asyncio
+import sys
+from functools import lru_cache
+from typing import Optional, Dict, List, TYPE_CHECKING, Any, Literal
 from datetime import datetime
 from app.agent.session_store import SessionStore, SessionData
 from app.models import SubmissionRequest, QuestionAnswer
+from app.services.stats_service import invalidate_library_cache
+from app.services.pdf_service import calculate_page_count
 
 if TYPE_CHECKING:
     from app.agent.mongo_session_store import MongoSessionStore
+    from app.agent.book_share_store import BookShareStore
+
+# Livello di accesso a una sessione: owner (o sessione senza proprietario),
+# shared (condivisione accettata), public (richiesta senza utente), denied
+AccessLevel = Literal["owner", "shared", "public", "denied"]
 
 
 async def get_session_async(session_store: SessionStore, session_id: str, user_id: Optional[str] = None) -> Optional[SessionData]:
@@ -23,6 +33,94 @@ async def get_session_async(session_store: SessionStore, session_id: str, user_i
     return None
 
 
+async def get_sessions_bulk_async(
+    session_store: SessionStore,
+    session_ids: List[str],
+    user_id: Optional[str] = None,
+    fields: Optional[list] = None,
+) -> Dict[str, SessionData]:
+    """
+    Recupera più sessioni in un solo round-trip invece di una get_session_async per ID.
+    
+    Args:
+        session_store: Store delle sessioni
+        session_ids: ID delle sessioni da recuperare
+        user_id: Se fornito, esclude le sessioni di altri utenti (come get_session_async)
+        fields: Proiezione MongoDB (ignorata dallo store su file)
+    
+    Returns:
+        Dict session_id -> SessionData con le sole sessioni trovate
+    """
+    if hasattr(session_store, 'get_sessions_bulk'):
+        # MongoSessionStore
+        return await session_store.get_sessions_bulk(session_ids, user_id=user_id, fields=fields)
+    result = {}
+    for session_id in session_ids:
+        session = session_store.get_session(session_id)
+        if session and not (user_id and session.user_id != user_id):
+            result[session_id] = session
+    return result
+
+
+async def _has_accepted_share_safe(
+    book_share_store: "BookShareStore",
+    session_id: str,
+    user_id: str,
+) -> bool:
+    """
+    Verifica la condivisione senza propagare errori dello store delle condivisioni:
+    la query parte in parallelo anche per il proprietario, che non deve ricevere un 500
+    per un errore su un dato che non gli serve. In caso di errore conta come "nessuna condivisione".
+    """
+    try:
+        return await book_share_store.has_accepted_share(session_id, user_id)
+    except Exception as e:
+        print(f"[SessionStoreHelpers] Errore nella verifica condivisione {session_id}: {e}", file=sys.stderr)
+        return False
+
+
+async def get_session_with_access_async(
+    session_store: SessionStore,
+    session_id: str,
+    user_id: Optional[str],
+    book_share_store: Optional["BookShareStore"] = None,
+) -> tuple[Optional[SessionData], AccessLevel]:
+    """
+    Recupera una sessione e il livello di accesso dell'utente in un solo passaggio.
+    
+    Il recupero della sessione e la verifica della condivisione (in cache TTL nello store)
+    sono eseguiti in parallelo, invece di attendere la sessione per poi interrogare le condivisioni.
+    
+    Returns:
+        Tupla (sessione o None se non trovata, livello di accesso)
+    """
+    if user_id and book_share_store is None:
+        from app.agent.book_share_store import get_book_share_store
+        try:
+            book_share_store = get_book_share_store()
+        except ValueError:
+            # Senza MongoDB non esistono condivisioni: conta solo l'ownership
+            book_share_store = None
+    
+    if not user_id or book_share_store is None:
+        session = await get_session_async(session_store, session_id, user_id=None)
+        if not session:
+            return None, "denied"
+        if not user_id:
+            return session, "public"
+        return session, ("owner" if not session.user_id or session.user_id == user_id else "denied")
+    
+    session, has_share = await asyncio.gather(
+        get_session_async(session_store, session_id, user_id=None),
+        _has_accepted_share_safe(book_share_store, session_id, user_id),
+    )
+    if not session:
+        return None, "denied"
+    if not session.user_id or session.user_id == user_id:
+        return session, "owner"
+    return session, ("shared" if has_share else "denied")
+
+
 async def create_session_async(
     session_store: SessionStore,
     session_id: str,
@@ -33,13 +131,14 @@ async def create_session_async(
     """Helper per creare una sessione in modo async-compatibile."""
     if hasattr(session_store, 'connect'):
         # MongoSessionStore
-        return await session_store.create_session(session_id, form_data, question_answers, user_id=user_id)
+        session = await session_store.create_session(session_id, form_data, question_answers, user_id=user_id)
     else:
         # FileSessionStore (user_id gestito nel costruttore)
         session = session_store.create_session(session_id, form_data, question_answers)
         if user_id:
             session.user_id = user_id
-        return session
+    invalidate_library_cache()
+    return session
 
 
 async def update_draft_async(
@@ -51,9 +150,11 @@ async def update_draft_async(
 ) -> SessionData:
     """Helper per aggiornare una bozza in modo async-compatibile."""
     if hasattr(session_store, 'connect'):
-        return await session_store.update_draft(session_id, draft_text, version, title)
+        session = await session_store.update_draft(session_id, draft_text, version, title)
     else:
-        return session_store.update_draft(session_id, draft_text, version, title)
+        session = session_store.update_draft(session_id, draft_text, version, title)
+    invalidate_library_cache()
+    return session
 
 
 async def validate_session_async(session_store: SessionStore, session_id: str) -> SessionData:
@@ -85,9 +186,11 @@ async def update_outline_async(
 ) -> SessionData:
     """Helper per aggiornare outline in modo async-compatibile."""
     if hasattr(session_store, 'connect'):
-        return await session_store.update_outline(session_id, outline_text, allow_if_writing, version)
+        session = await session_store.update_outline(session_id, outline_text, allow_if_writing, version)
     else:
-        return session_store.update_outline(session_id, outline_text, allow_if_writing, version)
+        session = session_store.update_outline(session_id, outline_text, allow_if_writing, version)
+    invalidate_library_cache()
+    return session
 
 
 async def update_questions_progress_async(
@@ -141,16 +244,18 @@ async def update_writing_progress_async(
     """Helper per aggiornare il progresso della scrittura in modo async-compatibile."""
     if hasattr(session_store, 'connect'):
         # MongoSessionStore - metodo async
-        return await session_store.update_writing_progress(
+        session = await session_store.update_writing_progress(
             session_id, current_step, total_steps, current_section_name, is_complete, is_paused, error,
             total_pages=total_pages, completed_chapters_count=completed_chapters_count
         )
     else:
         # FileSessionStore - metodo sync
-        return session_store.update_writing_progress(
+        session = session_store.update_writing_progress(
             session_id, current_step, total_steps, current_section_name, is_complete, is_paused, error,
             total_pages=total_pages, completed_chapters_count=completed_chapters_count
         )
+    invalidate_library_cache()
+    return session
 
 
 async def set_estimated_cost_async(
@@ -167,6 +272,34 @@ async def set_estimated_cost_async(
         return session_store.set_estimated_cost(session_id, estimated_cost)
 
 
+async def set_writing_time_minutes_async(
+    session_store: SessionStore,
+    session_id: str,
+    writing_time_minutes: float,
+) -> bool:
+    """Helper per aggiornare writing_time_minutes in modo async-compatibile."""
+    if hasattr(session_store, 'connect'):
+        # MongoSessionStore - metodo async
+        return await session_store.set_writing_time_minutes(session_id, writing_time_minutes)
+    else:
+        # FileSessionStore - metodo sync
+        return session_store.set_writing_time_minutes(session_id, writing_time_minutes)
+
+
+async def set_outline_section_count_async(
+    session_store: SessionStore,
+    session_id: str,
+    outline_section_count: int,
+) -> bool:
+    """Helper per memorizzare il numero di sezioni dell'outline in modo async-compatibile."""
+    if hasattr(session_store, 'connect'):
+        # MongoSessionStore - metodo async
+        return await session_store.set_outline_section_count(session_id, outline_section_count)
+    else:
+        # FileSessionStore - metodo sync
+        return session_store.set_outline_section_count(session_id, outline_section_count)
+
+
 async def start_chapter_timing_async(
     session_store: SessionStore,
     session_id: str,
@@ -203,10 +336,12 @@ async def update_critique_async(
     """Helper per aggiornare la critica in modo async-compatibile."""
     if hasattr(session_store, 'connect'):
         # MongoSessionStore - metodo async
-        return await session_store.update_critique(session_id, critique)
+        session = await session_store.update_critique(session_id, critique)
     else:
         # FileSessionStore - metodo sync
-        return session_store.update_critique(session_id, critique)
+        session = session_store.update_critique(session_id, critique)
+    invalidate_library_cache()
+    return session
 
 
 async def update_critique_status_async(
@@ -218,10 +353,12 @@ async def update_critique_status_async(
     """Helper per aggiornare lo stato della critica in modo async-compatibile."""
     if hasattr(session_store, 'connect'):
         # MongoSessionStore - metodo async
-        return await session_store.update_critique_status(session_id, status, error)
+        session = await session_store.update_critique_status(session_id, status, error)
     else:
         # FileSessionStore - metodo sync
-        return session_store.update_critique_status(session_id, status, error)
+        session = session_store.update_critique_status(session_id, status, error)
+    invalidate_library_cache()
+    return session
 
 
 async def update_writing_times_async(
@@ -244,9 +381,11 @@ async def update_cover_image_path_async(
 ) -> SessionData:
     """Helper per aggiornare il path della copertina in modo async-compatibile."""
     if hasattr(session_store, 'connect'):
-        return await session_store.update_cover_image_path(session_id, cover_image_path)
+        session = await session_store.update_cover_image_path(session_id, cover_image_path)
     else:
-        return session_store.update_cover_image_path(session_id, cover_image_path)
+        session = session_store.update_cover_image_path(session_id, cover_image_path)
+    invalidate_library_cache()
+    return session
 
 
 async def update_book_chapter_async(
@@ -256,11 +395,17 @@ async def update_book_chapter_async(
     chapter_content: str,
     section_index: int,
 ) -> SessionData:
-    """Helper per aggiornare un capitolo in modo async-compatibile."""
+    """
+    Helper per aggiornare un capitolo in modo async-compatibile.
+    
+    Il conteggio pagine viene calcolato qui una sola volta e salvato nel capitolo, così
+    libreria e progresso non devono rileggere (né scaricare) il contenuto per ottenerlo.
+    """
+    page_count = calculate_page_count(chapter_content)
     if hasattr(session_store, 'connect'):
-        return await session_store.update_book_chapter(session_id, chapter_title, chapter_content, section_index)
+        return await session_store.update_book_chapter(session_id, chapter_title, chapter_content, section_index, page_count=page_count)
     else:
-        return session_store.update_book_chapter(session_id, chapter_title, chapter_content, section_index)
+        return session_store.update_book_chapter(session_id, chapter_title, chapter_content, section_index, page_count=page_count)
 
 
 async def pause_writing_async(
@@ -273,9 +418,11 @@ async def pause_writing_async(
 ) -> SessionData:
     """Helper per mettere in pausa la scrittura in modo async-compatibile."""
     if hasattr(session_store, 'connect'):
-        return await session_store.pause_writing(session_id, current_step, total_steps, current_section_name, error_msg)
+        session = await session_store.pause_writing(session_id, current_step, total_steps, current_section_name, error_msg)
     else:
-        return session_store.pause_writing(session_id, current_step, total_steps, current_section_name, error_msg)
+        session = session_store.pause_writing(session_id, current_step, total_steps, current_section_name, error_msg)
+    invalidate_library_cache()
+    return session
 
 
 async def resume_writing_async(
@@ -284,9 +431,11 @@ async def resume_writing_async(
 ) -> SessionData:
     """Helper per riprendere la scrittura in modo async-compatibile."""
     if hasattr(session_store, 'connect'):
-        return await session_store.resume_writing(session_id)
+        session = await session_store.resume_writing(session_id)
     else:
-        return session_store.resume_writing(session_id)
+        session = session_store.resume_writing(session_id)
+    invalidate_library_cache()
+    return session
 
 
 async def delete_session_async(
@@ -296,10 +445,27 @@ async def delete_session_async(
     """Helper per eliminare una sessione in modo async-compatibile."""
     if hasattr(session_store, 'connect'):
         # MongoSessionStore - metodo async
-        return await session_store.delete_session(session_id)
+        deleted = await session_store.delete_session(session_id)
     else:
         # FileSessionStore - metodo sync
-        return session_store.delete_session(session_id)
+        deleted = session_store.delete_session(session_id)
+    invalidate_library_cache()
+    return deleted
+
+
+async def delete_sessions_async(
+    session_store: SessionStore,
+    session_ids: List[str],
+) -> int:
+    """Helper per eliminare più sessioni con una sola operazione sullo store; restituisce quante ne ha eliminate."""
+    if hasattr(session_store, 'connect'):
+        # MongoSessionStore - metodo async
+        deleted_count = await session_store.delete_sessions(session_ids)
+    else:
+        # FileSessionStore - metodo sync
+        deleted_count = session_store.delete_sessions(session_ids)
+    invalidate_library_cache()
+    return deleted_count
 
 
 async def update_token_usage_async(
@@ -327,32 +493,109 @@ async def set_real_cost_async(
     """Helper per impostare il costo reale in modo async-compatibile."""
     if hasattr(session_store, 'connect'):
         # MongoSessionStore - metodo async
-        return await session_store.set_real_cost(session_id, real_cost_eur)
+        updated = await session_store.set_real_cost(session_id, real_cost_eur)
     else:
         # FileSessionStore - metodo sync
-        return session_store.set_real_cost(session_id, real_cost_eur)
+        updated = session_store.set_real_cost(session_id, real_cost_eur)
+    invalidate_library_cache()
+    return updated
 
 
 async def get_all_sessions_async(session_store: SessionStore, user_id: Optional[str] = None, 
                                  fields: Optional[list] = None, status: Optional[str] = None,
-                                 llm_model: Optional[str] = None, genre: Optional[str] = None) -> Dict[str, SessionData]:
-    """Helper per ottenere tutte le sessioni in modo async-compatibile."""
+                                 llm_model: Optional[str] = None, genre: Optional[str] = None,
+                                 llm_models: Optional[List[str]] = None,
+                                 search: Optional[str] = None,
+                                 sort_by: Optional[str] = None,
+                                 sort_order: Optional[str] = "desc") -> Dict[str, SessionData]:
+    """
+    Helper per ottenere tutte le sessioni in modo async-compatibile.
+    
+    llm_models filtra per appartenenza a una lista di modelli (es. una modalità) e ha
+    precedenza su llm_model; una lista vuota non restituisce nessuna sessione.
+    search filtra per sottostringa case-insensitive su titolo o nome autore.
+    sort_by/sort_order fanno ordinare i documenti a MongoDB; lo store su file (in memoria)
+    restituisce l'ordine di inserimento e l'ordine finale resta compito del chiamante.
+    """
     if hasattr(session_store, 'get_all_sessions'):
         # MongoSessionStore
         return await session_store.get_all_sessions(user_id=user_id, fields=fields, 
-                                                   status=status, llm_model=llm_model, genre=genre)
+                                                   status=status, llm_model=llm_model, genre=genre,
+                                                   llm_models=llm_models, search=search,
+                                                   sort_by=sort_by, sort_order=sort_order)
     else:
-        # FileSessionStore - _sessions è un dict normale, filtra per user_id e altri filtri
+        # FileSessionStore - _sessions è un dict normale: tutti i filtri in un solo passaggio
         all_sessions = session_store._sessions
-        result = all_sessions
-        if user_id:
-            result = {sid: sess for sid, sess in result.items() if sess.user_id == user_id}
-        if llm_model:
-            result = {sid: sess for sid, sess in result.items() 
-                     if sess.form_data and sess.form_data.llm_model == llm_model}
-        if genre:
-            result = {sid: sess for sid, sess in result.items() 
-                     if sess.form_data and sess.form_data.genre == genre}
-        if status and status != "all":
-            result = {sid: sess for sid, sess in result.items() if sess.get_status() == status}
-        return result
+        filter_status = status if status and status != "all" else None
+        search_lower = search.lower() if search else None
+        if not (user_id or llm_models is not None or llm_model or genre or filter_status or search_lower):
+            return all_sessions
+        
+        def _matches(sess: SessionData) -> bool:
+            if user_id and sess.user_id != user_id:
+                return False
+            if llm_models is not None:
+                if not (sess.form_data and sess.form_data.llm_model in llm_models):
+                    return False
+            elif llm_model and not (sess.form_data and sess.form_data.llm_model == llm_model):
+                return False
+            if genre and not (sess.form_data and sess.form_data.genre == genre):
+                return False
+            if filter_status and sess.get_status() != filter_status:
+                return False
+            if search_lower:
+                # Stessi valori mostrati in libreria: titolo e autore mancanti diventano "Romanzo" e "Autore"
+                if not (search_lower in (sess.current_title or "Romanzo").lower()
+                        or (sess.form_data and search_lower in (sess.form_data.user_name or "Autore").lower())):
+                    return False
+            return True
+        
+        return {sid: sess for sid, sess in all_sessions.items() if _matches(sess)}
+
+
+async def get_obsolete_sessions_async(session_store: SessionStore,
+                                      fields: Optional[list] = None) -> Dict[str, SessionData]:
+    """
+    Helper per ottenere i libri obsoleti: senza valutazione critica, oppure completati senza copertina.
+    
+    Con MongoDB il filtro è eseguito dal database (solo i documenti obsoleti arrivano all'app);
+    lo store su file applica lo stesso criterio in memoria.
+    fields: Proiezione MongoDB (ignorata dallo store su file)
+    """
+    if hasattr(session_store, 'get_obsolete_sessions'):
+        # MongoSessionStore
+        return await session_store.get_obsolete_sessions(fields=fields)
+    
+    def _is_obsolete(sess: SessionData) -> bool:
+        critique = sess.literary_critique
+        score = critique.get('score') if isinstance(critique, dict) else getattr(critique, 'score', None)
+        return score is None or (sess.get_status() == "complete" and not sess.cover_image_path)
+    
+    return {sid: sess for sid, sess in session_store._sessions.items() if _is_obsolete(sess)}
+
+
+@lru_cache(maxsize=128)
+def _model_name_contains(llm_model: str, model_substring: str) -> bool:
+    """Confronto case-insensitive del nome del modello, memoizzato: i modelli distinti sono pochi."""
+    return model_substring.lower() in llm_model.lower()
+
+
+async def get_sessions_by_model_async(session_store: SessionStore, model_substring: str,
+                                      user_id: Optional[str] = None,
+                                      fields: Optional[list] = None) -> Dict[str, SessionData]:
+    """
+    Helper per ottenere le sessioni il cui modello LLM contiene model_substring (case-insensitive).
+    
+    Con MongoDB il filtro è eseguito dal database; lo store su file lo applica in memoria.
+    fields: Proiezione MongoDB (ignorata dallo store su file)
+    """
+    if hasattr(session_store, 'get_sessions_by_model'):
+        # MongoSessionStore
+        return await session_store.get_sessions_by_model(model_substring, user_id=user_id, fields=fields)
+    
+    return {
+        sid: sess for sid, sess in session_store._sessions.items()
+        if sess.form_data and sess.form_data.llm_model
+        and _model_name_contains(sess.form_data.llm_model, model_substring)
+        and (not user_id or sess.user_id == user_id)
+    }
@@ -1,13 +1,16 @@
 """Store MongoDB per utenti."""
 import os
 import sys
-from typing import Optional
+from typing import AsyncIterator, Optional, Dict, List
 from datetime import datetime, timedelta
 from motor.motor_asyncio import AsyncIOMotorClient
 from pymongo import IndexModel, ASCENDING
 from pymongo.errors import DuplicateKeyError
 from app.models import User, ModeCredits
 
+# Documenti per batch dei cursori di aggregazione (statistiche admin)
+_AGGREGATE_BATCH_SIZE = 2000
+
 
 class UserStore:
     """Store MongoDB per gestione utenti."""
@@ -209,6 +212,72 @@ class UserStore:
             return self._doc_to_user(doc)
         return None
     
+    async def get_users_by_ids(self, user_ids: List[str]) -> Dict[str, User]:
+        """
+        Recupera più utenti con una sola query ($in sugli _id).
+        
+        Returns:
+            Dict user_id -> User con i soli utenti trovati
+        """
+        if not user_ids:
+            return {}
+        users = {}
+        cursor = self.users_collection.find({"_id": {"$in": list(user_ids)}})
+        async for doc in cursor:
+            user = self._doc_to_user(doc)
+            users[user.id] = user
+        return users
+    
+    async def count_users(self) -> int:
+        """Conta gli utenti registrati (per admin)."""
+        if self.client is None or self.users_collection is None:
+            await self.connect()
+        return await self.users_collection.count_documents({})
+    
+    async def get_users_with_book_counts(
+        self,
+        skip: int = 0,
+        limit: int = 10000,
+        sessions_collection: str = "sessions",
+    ) -> list[dict]:
+        """
+        Recupera gli utenti con il numero di libri in un'unica aggregazione (per admin).
+        
+        Il conteggio è calcolato lato server con un $lookup sulla collection delle sessioni
+        (servito dall'indice su sessions.user_id): per ogni utente arrivano solo i campi
+        mostrati nelle statistiche più books_count. Ordinamento e paginazione sono
+        applicati da MongoDB, che restituisce solo la pagina richiesta.
+        
+        Returns:
+            Lista di dict con _id, name, email, created_at e books_count, ordinati per
+            books_count decrescente (a parità, utenti più recenti prima)
+        """
+        if self.client is None or self.users_collection is None:
+            await self.connect()
+        
+        pipeline = [
+            {"$project": {"name": 1, "email": 1, "created_at": 1}},
+            {"$lookup": {
+                "from": sessions_collection,
+                "let": {"uid": "$_id"},
+                "pipeline": [
+                    {"$match": {"$expr": {"$eq": ["$user_id", "$$uid"]}}},
+                    # Solo user_id: il conteggio è coperto dall'indice, senza leggere capitoli e outline
+                    {"$project": {"_id": 0, "user_id": 1}},
+                    {"$count": "c"},
+                ],
+                "as": "bk",
+            }},
+            {"$addFields": {"books_count": {"$ifNull": [{"$first": "$bk.c"}, 0]}}},
+            {"$project": {"bk": 0}},
+            {"$sort": {"books_count": -1, "created_at": -1, "_id": 1}},
+            {"$skip": skip},
+            {"$limit": limit},
+        ]
+        # batchSize esplicito: memoria per batch prevedibile invece dei 101 documenti iniziali di default
+        cursor = self.users_collection.aggregate(pipeline, batchSize=_AGGREGATE_BATCH_SIZE, allowDiskUse=False)
+        return [doc async for doc in cursor]
+    
     async def update_password(self, user_id: str, new_password_hash: str) -> bool:
         """
         Aggiorna password utente.
@@ -274,13 +343,27 @@ class UserStore:
         # Assicurati che la connessione sia attiva
         if self.client is None or self.users_collection is None:
             await self.connect()
-
+        
         cursor = self.users_collection.find().skip(skip).limit(limit).sort("created_at", -1)
         users = []
         async for doc in cursor:
             users.append(self._doc_to_user(doc))
         return users
-
+    
+    async def iter_all_users(self, batch_size: int = 500) -> AsyncIterator[User]:
+        """
+        Itera tutti gli utenti (per admin) dal più recente, senza materializzarli in una lista.
+        
+        I documenti arrivano dal cursore a batch di batch_size: la memoria resta limitata
+        al batch corrente anche con molti utenti.
+        """
+        if self.client is None or self.users_collection is None:
+            await self.connect()
+        
+        cursor = self.users_collection.find({}, batch_size=batch_size).sort("created_at", -1)
+        async for doc in cursor:
+            yield self._doc_to_user(doc)
+    
     async def delete_user_by_email(self, email: str) -> bool:
         """
         Elimina un utente per email (per admin).
@@ -301,7 +384,7 @@ class UserStore:
         else:
             print(f"[UserStore] Utente non trovato per eliminazione: {email}", file=sys.stderr)
         return deleted
-
+    
     async def delete_user(self, user_id: str) -> bool:
         """
         Elimina un utente per ID (per cancellazione account GDPR).
@@ -322,7 +405,7 @@ class UserStore:
         else:
             print(f"[UserStore] Utente non trovato per eliminazione ID: {user_id}", file=sys.stderr)
         return deleted
-
+    
     async def update_user(self, user_id: str, updates: dict) -> bool:
         """
         Aggiorna utente.
@@ -17,8 +17,14 @@ from app.core.config import get_app_config, get_temperature_for_agent
 from app.utils.token_tracker import extract_token_usage
 from app.services.pdf_service import calculate_page_count
 import math
+import logging
 import httpx
 
+logger = logging.getLogger(__name__)
+
+# Intestazione Markdown su una riga (eventuali spazi iniziali, livello = numero di '#')
+_OUTLINE_HEADING_RE = re.compile(r"^[^\S\n]*(#+)(.*)$", re.MULTILINE)
+
 # Configurazione retry e timeout per robustezza contro errori di rete
 CHAPTER_GENERATION_MAX_RETRIES = 3  # Numero massimo di tentativi per generare un capitolo
 CHAPTER_GENERATION_RETRY_DELAY = 5  # Delay base in secondi tra tentativi (con backoff)
@@ -97,6 +103,95 @@ def _coerce_llm_content_to_text(content: Any) -> str:
     return str(content)
 
 
+def _is_outline_document_title(level: int, title: str, sections_found: int) -> bool:
+    """Riconosce il titolo principale del documento (livello 1 all'inizio), da ignorare."""
+    title_lower = title.lower()
+    return level == 1 and sections_found == 0 and ('struttura' in title_lower or 'indice' in title_lower or 'outline' in title_lower)
+
+
+def _select_writable_sections(sections: List[Dict[str, Any]]) -> List[Dict[str, Any]]:
+    """
+    Filtra le sezioni dell'outline tenendo solo quelle da scrivere (capitoli, non contenitori strutturali).
+    
+    Raises:
+        ValueError: Se nessuna sezione ha un livello appropriato
+    """
+    level2_sections = [s for s in sections if s['level'] == 2]
+    level3_sections = [s for s in sections if s['level'] == 3]
+    logger.debug(
+        "[PARSE OUTLINE] Trovate %s sezioni totali (livello 2: %s, livello 3: %s)",
+        len(sections), len(level2_sections), len(level3_sections),
+    )
+    
+    # Filtra solo le sezioni di livello 2 o 3 (capitoli, non contenitori strutturali)
+    # Keyword che identificano contenitori strutturali (livello 2 che contengono capitoli)
+    structural_keywords = [
+        'Parte', 'Part', 'Atto', 'Act', 
+        'Introduzione', 'Introduction', 
+        'Conclusione', 'Conclusion',
+        'Prologo', 'Prologue', 
+        'Epilogo', 'Epilogue',
+        'Sezione', 'Section'
+    ]
+    
+    # Verifica se ci sono contenitori strutturali di livello 2
+    structural_containers = [
+        s for s in sections 
+        if s['level'] == 2 and any(keyword.lower() in s['title'].lower() for keyword in structural_keywords)
+    ]
+    structural_container_count = len(structural_containers)
+    
+    # Verifica se ci sono capitoli espliciti di livello 2 (parola "Capitolo" o "Chapter")
+    explicit_chapters_level2 = [
+        s for s in sections 
+        if s['level'] == 2 and ('capitolo' in s['title'].lower() or 'chapter' in s['title'].lower())
+    ]
+    has_explicit_chapters_level2 = len(explicit_chapters_level2) > 0
+    
+    # Verifica se ci sono sezioni di livello 3
+    has_level3_sections = len(level3_sections) > 0
+    
+    logger.debug(
+        "[PARSE OUTLINE] Rilevamento: contenitori strutturali=%s, capitoli espliciti livello 2=%s, sezioni livello 3=%s",
+        structural_container_count, len(explicit_chapters_level2), has_level3_sections,
+    )
+    
+    # Logica migliorata: se ci sono sezioni di livello 3 E contenitori strutturali di livello 2, usa livello 3
+    # OPPURE se non ci sono capitoli espliciti di livello 2, usa livello 3 se disponibile
+    if (structural_container_count > 0 and has_level3_sections) or \
+       (not has_explicit_chapters_level2 and has_level3_sections):
+        # Prendi solo i capitoli (livello 3)
+        filtered_sections = level3_sections
+        logger.debug("[PARSE OUTLINE] DECISIONE: Struttura con contenitori + capitoli livello 3 -> filtrate %s sezioni di livello 3", len(filtered_sections))
+    elif has_explicit_chapters_level2:
+        # Prendi le sezioni di livello 2 (capitoli diretti)
+        filtered_sections = level2_sections
+        logger.debug("[PARSE OUTLINE] DECISIONE: Capitoli espliciti livello 2 -> filtrate %s sezioni di livello 2", len(filtered_sections))
+    else:
+        # Fallback: prova con livello 2
+        filtered_sections = level2_sections
+        logger.debug("[PARSE OUTLINE] DECISIONE: Fallback -> filtrate %s sezioni di livello 2", len(filtered_sections))
+    
+    # Se dopo il filtro non ci sono sezioni, prova a prendere tutte le sezioni di livello 2 o 3
+    if len(filtered_sections) == 0:
+        filtered_sections = [s for s in sections if s['level'] in [2, 3]]
+        logger.debug("[PARSE OUTLINE] Nessuna sezione dopo filtro, trovate %s sezioni di livello 2 o 3", len(filtered_sections))
+    
+    # Se ancora non ci sono sezioni, prova con qualsiasi livello > 1
+    if len(filtered_sections) == 0:
+        filtered_sections = [s for s in sections if s['level'] > 1]
+        logger.debug("[PARSE OUTLINE] Nessuna sezione di livello 2-3, trovate %s sezioni di livello > 1", len(filtered_sections))
+    
+    if len(filtered_sections) == 0:
+        raise ValueError(
+            f"Nessuna sezione scrivibile trovata nella struttura. "
+            f"Trovate {len(sections)} sezioni totali, ma nessuna di livello appropriato (2 o 3). "
+            f"Verifica che la struttura contenga capitoli con intestazioni Markdown (## o ###)."
+        )
+    
+    return filtered_sections
+
+
 def parse_outline_sections(outline_text: str) -> List[Dict[str, str]]:
     """
     Analizza il testo Markdown della struttura e estrae le sezioni (capitoli, introduzione, prologo, ecc.).
@@ -143,7 +238,7 @@ def parse_outline_sections(outline_text: str) -> List[Dict[str, str]]:
                 continue
             
             # Ignora il titolo principale del documento (livello 1 all'inizio)
-            if level == 1 and len(sections) == 0 and ('struttura' in title.lower() or 'indice' in title.lower() or 'outline' in title.lower()):
+            if _is_outline_document_title(level, title, len(sections)):
                 current_section = None
                 current_description = []
                 continue
@@ -165,97 +260,45 @@ def parse_outline_sections(outline_text: str) -> List[Dict[str, str]]:
         current_section['description'] = '\n'.join(current_description).strip()
         sections.append(current_section)
     
-    # Log per debug
-    level2_sections = [s for s in sections if s['level'] == 2]
-    level3_sections = [s for s in sections if s['level'] == 3]
-    print(f"[PARSE OUTLINE] Trovate {len(sections)} sezioni totali (prima del filtro)")
-    print(f"[PARSE OUTLINE] - Sezioni livello 2: {len(level2_sections)}")
-    print(f"[PARSE OUTLINE] - Sezioni livello 3: {len(level3_sections)}")
-    
-    # Mostra esempi di sezioni di livello 2 e 3
-    if level2_sections:
-        print(f"[PARSE OUTLINE] Esempi livello 2 (primi 3):")
-        for i, s in enumerate(level2_sections[:3]):
-            print(f"[PARSE OUTLINE]   {i+1}. {s['title'][:60]}")
-    if level3_sections:
-        print(f"[PARSE OUTLINE] Esempi livello 3 (primi 3):")
-        for i, s in enumerate(level3_sections[:3]):
-            print(f"[PARSE OUTLINE]   {i+1}. {s['title'][:60]}")
-    
-    # Filtra solo le sezioni di livello 2 o 3 (capitoli, non contenitori strutturali)
-    # Keyword che identificano contenitori strutturali (livello 2 che contengono capitoli)
-    structural_keywords = [
-        'Parte', 'Part', 'Atto', 'Act', 
-        'Introduzione', 'Introduction', 
-        'Conclusione', 'Conclusion',
-        'Prologo', 'Prologue', 
-        'Epilogo', 'Epilogue',
-        'Sezione', 'Section'
-    ]
-    
-    # Verifica se ci sono contenitori strutturali di livello 2
-    structural_containers = [
-        s for s in sections 
-        if s['level'] == 2 and any(keyword.lower() in s['title'].lower() for keyword in structural_keywords)
-    ]
-    structural_container_count = len(structural_containers)
-    
-    # Verifica se ci sono capitoli espliciti di livello 2 (parola "Capitolo" o "Chapter")
-    explicit_chapters_level2 = [
-        s for s in sections 
-        if s['level'] == 2 and ('capitolo' in s['title'].lower() or 'chapter' in s['title'].lower())
-    ]
-    has_explicit_chapters_level2 = len(explicit_chapters_level2) > 0
-    
-    # Verifica se ci sono sezioni di livello 3
-    has_level3_sections = len(level3_sections) > 0
+    filtered_sections = _select_writable_sections(sections)
+    logger.debug("[PARSE OUTLINE] Restituisco %s sezioni da scrivere", len(filtered_sections))
+    return filtered_sections
+
+
+def count_outline_sections(outline_text: str) -> int:
+    """
+    Conta le sezioni da scrivere dell'outline, con lo stesso risultato di len(parse_outline_sections(...)).
     
-    # Debug: stampa risultati del rilevamento
-    print(f"[PARSE OUTLINE] Rilevamento:")
-    print(f"[PARSE OUTLINE] - Contenitori strutturali (livello 2): {structural_container_count}")
-    if structural_containers:
-        for s in structural_containers[:3]:
-            print(f"[PARSE OUTLINE]   * {s['title'][:60]}")
-    print(f"[PARSE OUTLINE] - Capitoli espliciti (livello 2): {len(explicit_chapters_level2)}")
-    print(f"[PARSE OUTLINE] - Sezioni livello 3: {has_level3_sections}")
+    Scorre solo le intestazioni con una regex precompilata, senza costruire le descrizioni:
+    usato dove serve solo il numero di sezioni (es. total_steps nel polling del progresso).
     
-    # Logica migliorata: se ci sono sezioni di livello 3 E contenitori strutturali di livello 2, usa livello 3
-    # OPPURE se non ci sono capitoli espliciti di livello 2, usa livello 3 se disponibile
-    if (structural_container_count > 0 and has_level3_sections) or \
-       (not has_explicit_chapters_level2 and has_level3_sections):
-        # Prendi solo i capitoli (livello 3)
-        filtered_sections = [s for s in sections if s['level'] == 3]
-        print(f"[PARSE OUTLINE] DECISIONE: Struttura con contenitori + capitoli livello 3 -> filtrate {len(filtered_sections)} sezioni di livello 3")
-    elif has_explicit_chapters_level2:
-        # Prendi le sezioni di livello 2 (capitoli diretti)
-        filtered_sections = [s for s in sections if s['level'] == 2]
-        print(f"[PARSE OUTLINE] DECISIONE: Capitoli espliciti livello 2 -> filtrate {len(filtered_sections)} sezioni di livello 2")
-    else:
-        # Fallback: prova con livello 2
-        filtered_sections = [s for s in sections if s['level'] == 2]
-        print(f"[PARSE OUTLINE] DECISIONE: Fallback -> filtrate {len(filtered_sections)} sezioni di livello 2")
-    
-    # Se dopo il filtro non ci sono sezioni, prova a prendere tutte le sezioni di livello 2 o 3
-    if len(filtered_sections) == 0:
-        print(f"[PARSE OUTLINE] Nessuna sezione dopo filtro, provo con tutti i livelli 2 e 3...")
-        filtered_sections = [s for s in sections if s['level'] in [2, 3]]
-        print(f"[PARSE OUTLINE] Trovate {len(filtered_sections)} sezioni di livello 2 o 3")
+    Raises:
+        ValueError: Se l'outline è vuoto o non contiene sezioni valide
+    """
+    if not outline_text or not outline_text.strip():
+        raise ValueError("L'outline è vuoto. Genera prima la struttura del romanzo.")
     
-    # Se ancora non ci sono sezioni, prova con qualsiasi livello > 1
-    if len(filtered_sections) == 0:
-        print(f"[PARSE OUTLINE] Nessuna sezione di livello 2-3, provo con tutti i livelli > 1...")
-        filtered_sections = [s for s in sections if s['level'] > 1]
-        print(f"[PARSE OUTLINE] Trovate {len(filtered_sections)} sezioni di livello > 1")
+    sections = []
+    current_section = None
+    for match in _OUTLINE_HEADING_RE.finditer(outline_text):
+        if current_section:
+            sections.append(current_section)
+        
+        level = len(match.group(1))
+        title = match.group(2).strip()
+        if not title:
+            continue
+        
+        if _is_outline_document_title(level, title, len(sections)):
+            current_section = None
+            continue
+        
+        current_section = {'title': title, 'level': level}
     
-    if len(filtered_sections) == 0:
-        raise ValueError(
-            f"Nessuna sezione scrivibile trovata nella struttura. "
-            f"Trovate {len(sections)} sezioni totali, ma nessuna di livello appropriato (2 o 3). "
-            f"Verifica che la struttura contenga capitoli con intestazioni Markdown (## o ###)."
-        )
+    if current_section:
+        sections.append(current_section)
     
-    print(f"[PARSE OUTLINE] Restituisco {len(filtered_sections)} sezioni da scrivere")
-    return filtered_sections
+    return len(_select_writable_sections(sections))
 
 
 def regenerate_outline_markdown(sections: List[Dict[str, Any]]) -> str:
@@ -1,46 +1,90 @@
 """Router per gli endpoint amministrativi."""
 import os
 import sys
-from collections import defaultdict
+import asyncio
+import logging
+from collections import Counter, OrderedDict, defaultdict
+from datetime import datetime
 from pathlib import Path
 from typing import Optional
-from fastapi import APIRouter, HTTPException, Depends
+from fastapi import APIRouter, HTTPException, Depends, Query
 
 from app.models import UsersStats, UserBookCount
 from app.agent.session_store import get_session_store
-from app.agent.session_store_helpers import get_all_sessions_async, delete_session_async
+from app.agent.session_store_helpers import (
+    get_all_sessions_async,
+    get_sessions_by_model_async,
+    delete_session_async,
+)
 from app.agent.user_store import get_user_store
 from app.agent.book_share_store import get_book_share_store
-from app.middleware.auth import require_admin
+from app.middleware.auth import invalidate_cached_auth_user, require_admin
 from app.services.stats_service import (
     get_cached_stats,
     set_cached_stats,
+    invalidate_cache,
+    get_library_data_version,
+    get_session_pdf_location,
+    LIBRARY_ENTRY_FIELDS,
     session_to_library_entry,
-    get_model_abbreviation,
 )
-from app.services.storage_service import get_storage_service
+from app.services.storage_service import get_storage_service, existing_local_paths, remove_local_file, BOOKS_DIR
+from app.services.pdf_service import get_expected_pdf_filename, index_local_pdfs, locate_pdf_for_session
+
+logger = logging.getLogger(__name__)
 
 router = APIRouter(prefix="/api/admin", tags=["admin"])
 
 
-def is_gemini_2_5(model_name: Optional[str]) -> bool:
-    """Verifica se un modello è una versione 2.5 di Gemini."""
-    if not model_name:
-        return False
-    return "gemini-2.5" in model_name.lower()
+# I libri Gemini 2.5 sono quelli il cui modello contiene questa sottostringa (case-insensitive)
+GEMINI_2_5_MODEL_MARKER = "gemini-2.5"
+
+# Sessioni Gemini 2.5 condivise da statistiche, preview ed eliminazione (flusso tipico: preview -> delete).
+# La chiave è la versione dei dati: qualsiasi scrittura sulle sessioni la rende obsoleta.
+# Cache propria e limitata (poche versioni, TTL breve): le versioni superate escono dalla LRU
+_gemini_2_5_sessions_cache: "OrderedDict[tuple, tuple[dict, datetime]]" = OrderedDict()
+_GEMINI_2_5_SESSIONS_CACHE_MAX_ENTRIES = 4
+_GEMINI_2_5_SESSIONS_TTL = 30  # secondi
+
+
+async def _load_gemini_2_5_sessions(session_store) -> dict:
+    """
+    Sessioni Gemini 2.5 (filtrate dallo store), riusate tra gli endpoint finché i dati non cambiano.
+    Solo i campi delle entry della libreria: niente capitoli né outline.
+    """
+    cache_key = get_library_data_version(None)
+    cached = _gemini_2_5_sessions_cache.get(cache_key)
+    if cached is not None:
+        sessions, timestamp = cached
+        if (datetime.now() - timestamp).total_seconds() < _GEMINI_2_5_SESSIONS_TTL:
+            _gemini_2_5_sessions_cache.move_to_end(cache_key)
+            return sessions
+        del _gemini_2_5_sessions_cache[cache_key]
+    
+    sessions = await get_sessions_by_model_async(session_store, GEMINI_2_5_MODEL_MARKER, fields=LIBRARY_ENTRY_FIELDS)
+    _gemini_2_5_sessions_cache[cache_key] = (sessions, datetime.now())
+    if len(_gemini_2_5_sessions_cache) > _GEMINI_2_5_SESSIONS_CACHE_MAX_ENTRIES:
+        _gemini_2_5_sessions_cache.popitem(last=False)
+    return sessions
 
 
 @router.get("/users/stats", response_model=UsersStats)
 async def get_users_stats_endpoint(
+    limit: int = Query(10000, ge=1, le=10000, description="Numero massimo di utenti da restituire"),
+    offset: int = Query(0, ge=0, description="Numero di utenti da saltare (per paginazione)"),
     current_user = Depends(require_admin),
 ):
-    """Restituisce statistiche sugli utenti: totale utenti e conteggio libri per utente (solo admin)."""
+    """
+    Restituisce statistiche sugli utenti: totale utenti e conteggio libri per utente (solo admin).
+    
+    users_with_books è ordinato per numero di libri decrescente e paginato con limit/offset;
+    total_users conta sempre tutti gli utenti.
+    """
     try:
-        cache_key = "admin_users_stats"
-        cached = get_cached_stats(cache_key)
+        # Solo la lista completa (default) è in cache: è quella invalidata all'eliminazione di un utente
+        cache_key = "admin_users_stats" if (limit, offset) == (10000, 0) else None
+        cached = get_cached_stats(cache_key) if cache_key else None
         if cached is not None:
-            if isinstance(cached, dict):
-                return UsersStats(**cached)
             return cached
         
         session_store = get_session_store()
@@ -49,93 +93,77 @@ async def get_users_stats_endpoint(
         if user_store.client is None or user_store.users_collection is None:
             await user_store.connect()
         
-        try:
-            all_users = await user_store.get_all_users(skip=0, limit=10000)
-            total_users = len(all_users)
-        except Exception as e:
-            print(f"[USERS STATS] Errore nel recupero utenti: {e}", file=sys.stderr)
-            import traceback
-            traceback.print_exc()
-            raise HTTPException(
-                status_code=500,
-                detail=f"Errore nel recupero degli utenti: {str(e)}"
-            )
-        
-        books_per_user = defaultdict(int)
-        
-        mongo_uri = os.getenv("MONGODB_URI")
-        if mongo_uri:
-            from motor.motor_asyncio import AsyncIOMotorClient
-            client = AsyncIOMotorClient(mongo_uri)
+        if hasattr(session_store, 'connect'):
+            # MongoSessionStore: utenti e conteggio libri in un'unica aggregazione ($lookup
+            # sulle sessioni), senza scaricare gli utenti e poi unirli in Python
             try:
-                db = client["narrai"]
-                sessions_collection = db["sessions"]
-                
-                pipeline = [
-                    {"$match": {"user_id": {"$ne": None, "$exists": True}}},
-                    {"$group": {
-                        "_id": "$user_id",
-                        "count": {"$sum": 1}
-                    }}
-                ]
-                
-                async for result in sessions_collection.aggregate(pipeline):
-                    user_id = result["_id"]
-                    count = result["count"]
-                    books_per_user[user_id] = count
-                
-                print(f"[USERS STATS] Contati {sum(books_per_user.values())} libri totali da aggregazione MongoDB", file=sys.stderr)
+                total_users, user_docs = await asyncio.gather(
+                    user_store.count_users(),
+                    user_store.get_users_with_book_counts(skip=offset, limit=limit),
+                )
             except Exception as e:
-                print(f"[USERS STATS] Errore nell'aggregazione MongoDB: {e}")
-                import traceback
-                traceback.print_exc()
-            finally:
-                client.close()
+                logger.exception("[USERS STATS] Errore nell'aggregazione utenti/libri: %s", e)
+                raise HTTPException(
+                    status_code=500,
+                    detail=f"Errore nel recupero degli utenti: {str(e)}"
+                )
+            # Valori già convertiti ai tipi del modello: model_construct evita di rivalidare ogni utente
+            users_with_books = [
+                UserBookCount.model_construct(
+                    user_id=str(doc["_id"]) if doc.get("_id") else "N/A",
+                    name=str(doc["name"]) if doc.get("name") else "N/A",
+                    email=str(doc["email"]) if doc.get("email") else "N/A",
+                    books_count=int(doc.get("books_count") or 0),
+                    created_at=doc.get("created_at") or None,
+                )
+                for doc in user_docs
+            ]
+            print(f"[USERS STATS] Contati {sum(user.books_count for user in users_with_books)} libri totali da aggregazione MongoDB", file=sys.stderr)
         else:
             print(f"[USERS STATS] WARNING: MONGODB_URI non configurato, uso fallback")
             all_sessions = await get_all_sessions_async(session_store, user_id=None)
-            for session in all_sessions.values():
-                if session.user_id:
-                    books_per_user[session.user_id] += 1
+            books_per_user = Counter(session.user_id for session in all_sessions.values() if session.user_id)
             print(f"[USERS STATS] Contati {len(all_sessions)} sessioni totali (fallback)")
-        
-        users_with_books = []
-        for user in all_users:
+            
+            # Utenti letti a batch dal cursore: ogni utente diventa subito un UserBookCount
+            total_users = 0
+            users_with_books = []
             try:
-                books_count = books_per_user.get(user.id, 0)
-                users_with_books.append({
-                    "user_id": str(user.id) if user.id else "N/A",
-                    "name": str(user.name) if user.name else "N/A",
-                    "email": str(user.email) if user.email else "N/A",
-                    "books_count": int(books_count) if books_count else 0,
-                    "created_at": user.created_at.isoformat() if user.created_at else None,
-                })
+                async for user in user_store.iter_all_users():
+                    total_users += 1
+                    try:
+                        users_with_books.append(UserBookCount.model_construct(
+                            user_id=str(user.id) if user.id else "N/A",
+                            name=str(user.name) if user.name else "N/A",
+                            email=str(user.email) if user.email else "N/A",
+                            books_count=books_per_user.get(user.id, 0),
+                            created_at=user.created_at or None,
+                        ))
+                    except Exception as e:
+                        print(f"[USERS STATS] Errore nel processare utente {getattr(user, 'id', 'unknown')}: {e}", file=sys.stderr)
+                        continue
             except Exception as e:
-                print(f"[USERS STATS] Errore nel processare utente {getattr(user, 'id', 'unknown')}: {e}", file=sys.stderr)
-                continue
-        
-        if "__unassigned__" in books_per_user:
-            unassigned_count = books_per_user["__unassigned__"]
-            print(f"[USERS STATS] Sessioni senza user_id (non assegnate): {unassigned_count}")
-        
-        users_with_books.sort(key=lambda x: x["books_count"], reverse=True)
+                logger.exception("[USERS STATS] Errore nel recupero utenti: %s", e)
+                raise HTTPException(
+                    status_code=500,
+                    detail=f"Errore nel recupero degli utenti: {str(e)}"
+                )
+            
+            if "__unassigned__" in books_per_user:
+                unassigned_count = books_per_user["__unassigned__"]
+                print(f"[USERS STATS] Sessioni senza user_id (non assegnate): {unassigned_count}")
+            
+            users_with_books.sort(key=lambda user: user.books_count, reverse=True)
+            users_with_books = users_with_books[offset:offset + limit]
         
-        try:
-            result = UsersStats(
-                total_users=int(total_users),
-                users_with_books=[UserBookCount(**user) for user in users_with_books],
-            )
-        except Exception as e:
-            print(f"[USERS STATS] Errore nella creazione UsersStats: {e}", file=sys.stderr)
-            import traceback
-            traceback.print_exc()
-            raise HTTPException(
-                status_code=500,
-                detail=f"Errore nella serializzazione dei dati: {str(e)}"
-            )
+        result = UsersStats.model_construct(
+            total_users=int(total_users),
+            users_with_books=users_with_books,
+        )
         
         try:
-            set_cached_stats(cache_key, result.model_dump())
+            if cache_key:
+                set_cached_stats(cache_key, result)
         except Exception as e:
             print(f"[USERS STATS] Errore nel salvare cache: {e}", file=sys.stderr)
         
@@ -144,9 +172,7 @@ async def get_users_stats_endpoint(
         # Mantieni status code originali (es. 401/403) invece di convertirli in 500
         raise
     except Exception as e:
-        print(f"[USERS STATS] Errore nel calcolo statistiche utenti: {e}")
-        import traceback
-        traceback.print_exc()
+        logger.exception("[USERS STATS] Errore nel calcolo statistiche utenti: %s", e)
         raise HTTPException(
             status_code=500,
             detail=f"Errore nel calcolo delle statistiche utenti: {str(e)}"
@@ -161,17 +187,17 @@ async def delete_user_endpoint(
     """Elimina un utente per email (solo admin). Elimina anche i libri non condivisi."""
     try:
         user_store = get_user_store()
-
+        
         if user_store.client is None or user_store.users_collection is None:
             await user_store.connect()
-
+        
         # Non permettere di eliminare se stessi
         if current_user.email.lower() == email.lower():
             raise HTTPException(
                 status_code=400,
                 detail="Non puoi eliminare il tuo stesso account"
             )
-
+        
         # 1. Trova l'utente per ottenere l'ID
         user = await user_store.get_user_by_email(email)
         if not user:
@@ -179,7 +205,7 @@ async def delete_user_endpoint(
                 status_code=404,
                 detail=f"Utente con email {email} non trovato"
             )
-
+        
         # 2. Trova tutti i libri dell'utente
         session_store = get_session_store()
         user_sessions = await get_all_sessions_async(session_store, user_id=user.id)
@@ -199,31 +225,30 @@ async def delete_user_endpoint(
             else:
                 kept_books += 1
                 print(f"[DELETE USER] Libro {session_id} mantenuto: condiviso con {len(shares)} utenti", file=sys.stderr)
-
+        
         # 4. Elimina l'utente
         deleted = await user_store.delete_user_by_email(email)
-
+        invalidate_cached_auth_user(user.id)
+        
         if not deleted:
             raise HTTPException(
                 status_code=500,
                 detail=f"Errore nell'eliminazione dell'utente {email}"
             )
-
+        
         # Invalida la cache delle statistiche utenti
-        set_cached_stats("admin_users_stats", None)
-
+        invalidate_cache("admin_users_stats")
+        
         message = f"Utente {email} eliminato con successo. Libri eliminati: {deleted_books}"
         if kept_books > 0:
             message += f", libri mantenuti (condivisi): {kept_books}"
         
         return {"success": True, "message": message, "deleted_books": deleted_books, "kept_books": kept_books}
-
+    
     except HTTPException:
         raise
     except Exception as e:
-        print(f"[DELETE USER] Errore: {e}", file=sys.stderr)
-        import traceback
-        traceback.print_exc()
+        logger.exception("[DELETE USER] Errore: %s", e)
         raise HTTPException(
             status_code=500,
             detail=f"Errore nell'eliminazione dell'utente: {str(e)}"
@@ -237,66 +262,41 @@ async def get_gemini_2_5_stats_endpoint(
     """Restituisce statistiche sui libri generati con Gemini 2.5 (solo admin)."""
     try:
         session_store = get_session_store()
-        all_sessions = await get_all_sessions_async(session_store, user_id=None)
-        
-        gemini_2_5_sessions = {}
-        for session_id, session in all_sessions.items():
-            if session.form_data and is_gemini_2_5(session.form_data.llm_model):
-                gemini_2_5_sessions[session_id] = session
+        # Filtro sul modello eseguito dallo store: non servono tutte le sessioni
+        gemini_2_5_sessions = await _load_gemini_2_5_sessions(session_store)
         
-        by_model = defaultdict(int)
-        by_status = defaultdict(int)
-        with_pdf = 0
-        with_cover = 0
+        by_model = Counter(session.form_data.llm_model for session in gemini_2_5_sessions.values())
         books_list = []
         
-        books_dir = Path(__file__).parent.parent.parent / "books"
+        # Una sola scansione della cartella dei PDF invece di un exists() per libro (in un thread)
+        local_pdfs = await asyncio.to_thread(index_local_pdfs, BOOKS_DIR) if BOOKS_DIR.exists() else {}
+        # Copertine locali verificate in un thread, in un solo passaggio
+        local_covers = await asyncio.to_thread(
+            existing_local_paths, [session.cover_image_path for session in gemini_2_5_sessions.values()]
+        )
         
         for session_id, session in gemini_2_5_sessions.items():
-            model = session.form_data.llm_model
-            by_model[model] += 1
-            
             try:
                 entry = session_to_library_entry(session, skip_cost_calculation=True)
                 status = entry.status
-                by_status[status] += 1
                 
                 has_pdf = False
                 if entry.pdf_filename:
                     has_pdf = True
-                elif status == "complete" and books_dir.exists():
-                    date_prefix = session.created_at.strftime("%Y-%m-%d")
-                    model_abbrev = get_model_abbreviation(session.form_data.llm_model)
-                    title_sanitized = "".join(c for c in (session.current_title or "Romanzo") if c.isalnum() or c in (' ', '-', '_')).rstrip()
-                    title_sanitized = title_sanitized.replace(" ", "_")
-                    if not title_sanitized:
-                        title_sanitized = f"Libro_{session.session_id[:8]}"
-                    expected_filename = f"{date_prefix}_{model_abbrev}_{title_sanitized}.pdf"
-                    expected_path = books_dir / expected_filename
-                    if expected_path.exists():
+                elif status == "complete" and local_pdfs:
+                    if get_expected_pdf_filename(session) in local_pdfs:
                         has_pdf = True
                     elif entry.pdf_path and entry.pdf_path.startswith("gs://"):
                         has_pdf = True
                 
-                if has_pdf:
-                    with_pdf += 1
-                
-                has_cover = False
-                if session.cover_image_path:
-                    if session.cover_image_path.startswith("gs://"):
-                        has_cover = True
-                    else:
-                        cover_path = Path(session.cover_image_path)
-                        if cover_path.exists():
-                            has_cover = True
-                
-                if has_cover:
-                    with_cover += 1
+                # Copertina su GCS, oppure locale ed esistente (local_covers esclude già i path gs://)
+                cover_path = session.cover_image_path
+                has_cover = bool(cover_path) and (cover_path in local_covers or cover_path.startswith("gs://"))
                 
                 books_list.append({
                     "session_id": session_id,
                     "title": entry.title,
-                    "model": model,
+                    "model": session.form_data.llm_model,
                     "status": status,
                     "has_pdf": has_pdf,
                     "has_cover": has_cover,
@@ -306,25 +306,36 @@ async def get_gemini_2_5_stats_endpoint(
                 print(f"[GEMINI-2.5-STATS] Errore nel processare sessione {session_id}: {e}")
                 continue
         
+        # Aggregati calcolati in un solo passaggio sulla lista dei libri
+        by_status = Counter(book["status"] for book in books_list)
+        
         return {
             "total_books": len(gemini_2_5_sessions),
             "by_model": dict(by_model),
             "by_status": dict(by_status),
-            "with_pdf": with_pdf,
-            "with_cover": with_cover,
+            "with_pdf": sum(1 for book in books_list if book["has_pdf"]),
+            "with_cover": sum(1 for book in books_list if book["has_cover"]),
             "books": books_list,
         }
     
     except Exception as e:
-        print(f"[GEMINI-2.5-STATS] Errore: {e}")
-        import traceback
-        traceback.print_exc()
+        logger.exception("[GEMINI-2.5-STATS] Errore: %s", e)
         raise HTTPException(
             status_code=500,
             detail=f"Errore nel calcolo delle statistiche Gemini 2.5: {str(e)}"
         )
 
 
+def _gemini_2_5_book_info(session) -> tuple[str, str, Optional[str]]:
+    """
+    (titolo, stato, path del PDF) di un libro: i soli campi usati da preview ed eliminazione,
+    senza costruire l'intera LibraryEntry (pagine, tempi di scrittura, modalità).
+    """
+    status = session.get_status()
+    pdf_path, _ = get_session_pdf_location(session, status)
+    return session.current_title or "Romanzo", status, pdf_path
+
+
 @router.get("/books/gemini-2.5/preview")
 async def preview_gemini_2_5_books_endpoint(
     current_user = Depends(require_admin),
@@ -332,52 +343,46 @@ async def preview_gemini_2_5_books_endpoint(
     """Restituisce lista dettagliata di tutti i libri Gemini 2.5 da eliminare (solo admin)."""
     try:
         session_store = get_session_store()
-        all_sessions = await get_all_sessions_async(session_store, user_id=None)
+        gemini_2_5_sessions = await _load_gemini_2_5_sessions(session_store)
         
         gemini_2_5_books = []
-        books_dir = Path(__file__).parent.parent.parent / "books"
         
-        for session_id, session in all_sessions.items():
-            if session.form_data and is_gemini_2_5(session.form_data.llm_model):
-                try:
-                    entry = session_to_library_entry(session, skip_cost_calculation=True)
-                    
-                    pdf_path = None
-                    cover_path = None
-                    
-                    if entry.pdf_path:
-                        pdf_path = entry.pdf_path
-                    elif entry.status == "complete" and books_dir.exists():
-                        date_prefix = session.created_at.strftime("%Y-%m-%d")
-                        model_abbrev = get_model_abbreviation(session.form_data.llm_model)
-                        title_sanitized = "".join(c for c in (session.current_title or "Romanzo") if c.isalnum() or c in (' ', '-', '_')).rstrip()
-                        title_sanitized = title_sanitized.replace(" ", "_")
-                        if not title_sanitized:
-                            title_sanitized = f"Libro_{session.session_id[:8]}"
-                        expected_filename = f"{date_prefix}_{model_abbrev}_{title_sanitized}.pdf"
-                        expected_path = books_dir / expected_filename
-                        if expected_path.exists():
-                            pdf_path = str(expected_path)
-                    
-                    if session.cover_image_path:
-                        cover_path = session.cover_image_path
-                    
-                    gemini_2_5_books.append({
-                        "session_id": session_id,
-                        "title": entry.title,
-                        "author": entry.author,
-                        "model": session.form_data.llm_model,
-                        "status": entry.status,
-                        "created_at": session.created_at.isoformat(),
-                        "updated_at": session.updated_at.isoformat(),
-                        "pdf_path": pdf_path,
-                        "cover_path": cover_path,
-                        "has_pdf": pdf_path is not None,
-                        "has_cover": cover_path is not None,
-                    })
-                except Exception as e:
-                    print(f"[GEMINI-2.5-PREVIEW] Errore nel processare sessione {session_id}: {e}")
-                    continue
+        # Una sola scansione della cartella dei PDF invece di un exists() per libro (in un thread)
+        local_pdfs = await asyncio.to_thread(index_local_pdfs, BOOKS_DIR) if BOOKS_DIR.exists() else {}
+        
+        for session_id, session in gemini_2_5_sessions.items():
+            try:
+                title, status, entry_pdf_path = _gemini_2_5_book_info(session)
+                
+                pdf_path = None
+                cover_path = None
+                
+                if entry_pdf_path:
+                    pdf_path = entry_pdf_path
+                elif status == "complete" and local_pdfs:
+                    expected_pdf = local_pdfs.get(get_expected_pdf_filename(session))
+                    if expected_pdf:
+                        pdf_path = str(expected_pdf)
+                
+                if session.cover_image_path:
+                    cover_path = session.cover_image_path
+                
+                gemini_2_5_books.append({
+                    "session_id": session_id,
+                    "title": title,
+                    "author": session.form_data.user_name or "Autore",
+                    "model": session.form_data.llm_model,
+                    "status": status,
+                    "created_at": session.created_at.isoformat(),
+                    "updated_at": session.updated_at.isoformat(),
+                    "pdf_path": pdf_path,
+                    "cover_path": cover_path,
+                    "has_pdf": pdf_path is not None,
+                    "has_cover": cover_path is not None,
+                })
+            except Exception as e:
+                print(f"[GEMINI-2.5-PREVIEW] Errore nel processare sessione {session_id}: {e}")
+                continue
         
         return {
             "total_books": len(gemini_2_5_books),
@@ -385,15 +390,95 @@ async def preview_gemini_2_5_books_endpoint(
         }
     
     except Exception as e:
-        print(f"[GEMINI-2.5-PREVIEW] Errore: {e}")
-        import traceback
-        traceback.print_exc()
+        logger.exception("[GEMINI-2.5-PREVIEW] Errore: %s", e)
         raise HTTPException(
             status_code=500,
             detail=f"Errore nel preview dei libri Gemini 2.5: {str(e)}"
         )
 
 
+# Eliminazioni concorrenti massime per la pulizia dei libri Gemini 2.5
+_GEMINI_2_5_DELETE_CONCURRENCY = 16
+
+
+async def _delete_gemini_2_5_book(
+    session_store,
+    session_id: str,
+    session,
+    book_info: Optional[tuple[str, str, Optional[str]]],
+    local_pdfs: dict[str, Path],
+    gcs_results: dict[str, tuple[bool, Optional[str]]],
+    semaphore: asyncio.Semaphore,
+) -> tuple[Optional[dict], list[str]]:
+    """
+    Elimina un libro Gemini 2.5 (PDF, copertina e sessione).
+    Le operazioni bloccanti sul file system girano in un thread.
+    
+    local_pdfs è l'indice dei PDF locali condiviso tra le eliminazioni concorrenti:
+    ogni PDF viene tolto dall'indice prima di cancellarlo, così nessun altro libro lo abbina.
+    gcs_results è l'esito (path -> (eliminato, errore)) dei file GCS già eliminati in blocco: la prima
+    passata ha già classificato i path gs://, quindi qui basta verificarne la presenza nel dict.
+    book_info è il (titolo, stato, path del PDF) già calcolato dai passaggi precedenti, se disponibile.
+    
+    Returns:
+        Tupla (dettaglio dell'eliminazione o None se il libro non è processabile, errori)
+    """
+    errors = []
+    async with semaphore:
+        try:
+            title, status, pdf_path = book_info or _gemini_2_5_book_info(session)
+            
+            pdf_deleted = False
+            try:
+                if pdf_path:
+                    if pdf_path in gcs_results:
+                        pdf_deleted, gcs_error = gcs_results[pdf_path]
+                        if gcs_error:
+                            errors.append(f"Errore eliminazione PDF GCS {pdf_path}: {gcs_error}")
+                    else:
+                        local_pdfs.pop(os.path.basename(pdf_path), None)
+                        pdf_deleted = await asyncio.to_thread(remove_local_file, pdf_path)
+                elif status == "complete" and local_pdfs:
+                    pdf_name = locate_pdf_for_session(local_pdfs, session)
+                    if pdf_name:
+                        await asyncio.to_thread(local_pdfs.pop(pdf_name).unlink)
+                        pdf_deleted = True
+            except Exception as e:
+                errors.append(f"Errore eliminazione PDF per {title}: {e}")
+            
+            cover_deleted = False
+            try:
+                cover_path = session.cover_image_path
+                if cover_path:
+                    if cover_path in gcs_results:
+                        cover_deleted, gcs_error = gcs_results[cover_path]
+                        if gcs_error:
+                            errors.append(f"Errore eliminazione copertina GCS {cover_path}: {gcs_error}")
+                    else:
+                        cover_deleted = await asyncio.to_thread(remove_local_file, cover_path)
+            except Exception as e:
+                errors.append(f"Errore eliminazione copertina per {title}: {e}")
+            
+            session_deleted = await delete_session_async(session_store, session_id)
+            if not session_deleted:
+                errors.append(f"Errore eliminazione sessione {session_id}")
+            
+            # Dettaglio costruito una sola volta a partire dagli esiti
+            return {
+                "session_id": session_id,
+                "title": title,
+                "model": session.form_data.llm_model,
+                "status": status,
+                "pdf_deleted": pdf_deleted,
+                "cover_deleted": cover_deleted,
+                "session_deleted": bool(session_deleted),
+            }, errors
+        except Exception as e:
+            errors.append(f"Errore durante eliminazione {session_id}: {e}")
+            logger.exception("[GEMINI-2.5-DELETE] Errore eliminando %s: %s", session_id, e)
+            return None, errors
+
+
 @router.post("/books/gemini-2.5/delete")
 async def delete_gemini_2_5_books_endpoint(
     dry_run: bool = False,
@@ -411,135 +496,89 @@ async def delete_gemini_2_5_books_endpoint(
     """
     try:
         session_store = get_session_store()
-        all_sessions = await get_all_sessions_async(session_store, user_id=None)
+        model_sessions = await _load_gemini_2_5_sessions(session_store)
         
         gemini_2_5_sessions = {}
-        for session_id, session in all_sessions.items():
-            if session.form_data and is_gemini_2_5(session.form_data.llm_model):
-                if model_filter and session.form_data.llm_model != model_filter:
+        # (titolo, stato, path del PDF) calcolati dal filtro per stato, riusati poi per l'eliminazione
+        book_infos: dict[str, tuple[str, str, Optional[str]]] = {}
+        for session_id, session in model_sessions.items():
+            if model_filter and session.form_data.llm_model != model_filter:
+                continue
+            if status_filter:
+                book_info = _gemini_2_5_book_info(session)
+                if book_info[1] != status_filter:
                     continue
-                if status_filter:
-                    entry = session_to_library_entry(session, skip_cost_calculation=True)
-                    if entry.status != status_filter:
-                        continue
-                gemini_2_5_sessions[session_id] = session
-        
-        deleted_sessions = 0
-        deleted_pdfs = 0
-        deleted_covers = 0
-        errors = []
-        details = []
+                book_infos[session_id] = book_info
+            gemini_2_5_sessions[session_id] = session
         
-        books_dir = Path(__file__).parent.parent.parent / "books"
         storage_service = get_storage_service()
         
-        for session_id, session in gemini_2_5_sessions.items():
-            try:
-                entry = session_to_library_entry(session, skip_cost_calculation=True)
-                detail = {
-                    "session_id": session_id,
-                    "title": entry.title,
-                    "model": session.form_data.llm_model,
-                    "status": entry.status,
-                    "pdf_deleted": False,
-                    "cover_deleted": False,
-                    "session_deleted": False,
-                }
-                
-                if not dry_run:
-                    pdf_deleted = False
-                    try:
-                        if entry.pdf_path:
-                            if entry.pdf_path.startswith("gs://"):
-                                try:
-                                    storage_service.delete_file(entry.pdf_path)
-                                    pdf_deleted = True
-                                except Exception as e:
-                                    errors.append(f"Errore eliminazione PDF GCS {entry.pdf_path}: {e}")
-                            else:
-                                pdf_path = Path(entry.pdf_path)
-                                if pdf_path.exists():
-                                    pdf_path.unlink()
-                                    pdf_deleted = True
-                        elif entry.status == "complete" and books_dir.exists():
-                            date_prefix = session.created_at.strftime("%Y-%m-%d")
-                            model_abbrev = get_model_abbreviation(session.form_data.llm_model)
-                            title_sanitized = "".join(c for c in (session.current_title or "Romanzo") if c.isalnum() or c in (' ', '-', '_')).rstrip()
-                            title_sanitized = title_sanitized.replace(" ", "_")
-                            if not title_sanitized:
-                                title_sanitized = f"Libro_{session.session_id[:8]}"
-                            expected_filename = f"{date_prefix}_{model_abbrev}_{title_sanitized}.pdf"
-                            expected_path = books_dir / expected_filename
-                            
-                            if expected_path.exists():
-                                expected_path.unlink()
-                                pdf_deleted = True
-                            else:
-                                for pdf_file in books_dir.glob("*.pdf"):
-                                    if session.session_id[:8] in pdf_file.stem or (title_sanitized and title_sanitized.lower() in pdf_file.stem.lower()):
-                                        pdf_file.unlink()
-                                        pdf_deleted = True
-                                        break
-                        
-                        if pdf_deleted:
-                            deleted_pdfs += 1
-                            detail["pdf_deleted"] = True
-                    except Exception as e:
-                        errors.append(f"Errore eliminazione PDF per {entry.title}: {e}")
-                    
-                    cover_deleted = False
-                    try:
-                        if session.cover_image_path:
-                            if session.cover_image_path.startswith("gs://"):
-                                try:
-                                    storage_service.delete_file(session.cover_image_path)
-                                    cover_deleted = True
-                                except Exception as e:
-                                    errors.append(f"Errore eliminazione copertina GCS {session.cover_image_path}: {e}")
-                            else:
-                                cover_path = Path(session.cover_image_path)
-                                if cover_path.exists():
-                                    cover_path.unlink()
-                                    cover_deleted = True
-                            
-                            if cover_deleted:
-                                deleted_covers += 1
-                                detail["cover_deleted"] = True
-                    except Exception as e:
-                        errors.append(f"Errore eliminazione copertina per {entry.title}: {e}")
-                    
-                    if await delete_session_async(session_store, session_id):
-                        deleted_sessions += 1
-                        detail["session_deleted"] = True
-                    else:
-                        errors.append(f"Errore eliminazione sessione {session_id}")
-                else:
-                    detail["pdf_deleted"] = entry.pdf_path is not None or (entry.status == "complete" and books_dir.exists())
-                    detail["cover_deleted"] = session.cover_image_path is not None
-                    detail["session_deleted"] = True
-                
-                details.append(detail)
-            except Exception as e:
-                errors.append(f"Errore durante eliminazione {session_id}: {e}")
-                print(f"[GEMINI-2.5-DELETE] Errore eliminando {session_id}: {e}")
-                import traceback
-                traceback.print_exc()
+        if dry_run:
+            details = []
+            errors = []
+            for session_id, session in gemini_2_5_sessions.items():
+                try:
+                    title, status, pdf_path = book_infos.get(session_id) or _gemini_2_5_book_info(session)
+                    details.append({
+                        "session_id": session_id,
+                        "title": title,
+                        "model": session.form_data.llm_model,
+                        "status": status,
+                        "pdf_deleted": pdf_path is not None or (status == "complete" and BOOKS_DIR.exists()),
+                        "cover_deleted": session.cover_image_path is not None,
+                        "session_deleted": True,
+                    })
+                except Exception as e:
+                    errors.append(f"Errore durante eliminazione {session_id}: {e}")
+                    print(f"[GEMINI-2.5-DELETE] Errore eliminando {session_id}: {e}")
+        else:
+            # Prima passata: tutti i PDF e le copertine su GCS eliminati in parallelo
+            gcs_to_delete = []
+            for session_id, session in gemini_2_5_sessions.items():
+                try:
+                    book_info = book_infos.get(session_id) or _gemini_2_5_book_info(session)
+                except Exception:
+                    # L'errore viene riportato dall'eliminazione del libro
+                    continue
+                book_infos[session_id] = book_info
+                for path in (book_info[2], session.cover_image_path):
+                    if path and path.startswith("gs://"):
+                        gcs_to_delete.append(path)
+            gcs_results = await asyncio.to_thread(storage_service.delete_files, gcs_to_delete) if gcs_to_delete else {}
+            
+            # Una sola scansione della cartella dei PDF per tutti i libri da eliminare (in un thread)
+            local_pdfs = await asyncio.to_thread(index_local_pdfs, BOOKS_DIR) if BOOKS_DIR.exists() else {}
+            
+            # Libri eliminati in parallelo, limitati dal semaforo (file system e store)
+            semaphore = asyncio.Semaphore(_GEMINI_2_5_DELETE_CONCURRENCY)
+            results = await asyncio.gather(*(
+                _delete_gemini_2_5_book(
+                    session_store, session_id, session, book_infos.get(session_id), local_pdfs, gcs_results, semaphore
+                )
+                for session_id, session in gemini_2_5_sessions.items()
+            ))
+            details = [detail for detail, _ in results if detail is not None]
+            errors = [error for _, book_errors in results for error in book_errors]
+            # Le sessioni in cache non esistono più
+            _gemini_2_5_sessions_cache.clear()
+        
+        deleted_sessions = sum(1 for d in details if d["session_deleted"])
+        deleted_pdfs = sum(1 for d in details if d["pdf_deleted"])
+        deleted_covers = sum(1 for d in details if d["cover_deleted"])
         
         return {
             "success": True,
             "dry_run": dry_run,
             "total_found": len(gemini_2_5_sessions),
             "deleted_sessions": deleted_sessions if not dry_run else len(gemini_2_5_sessions),
-            "deleted_pdfs": deleted_pdfs if not dry_run else sum(1 for d in details if d["pdf_deleted"]),
-            "deleted_covers": deleted_covers if not dry_run else sum(1 for d in details if d["cover_deleted"]),
+            "deleted_pdfs": deleted_pdfs,
+            "deleted_covers": deleted_covers,
             "errors": errors if errors else None,
             "details": details,
         }
     
     except Exception as e:
-        print(f"[GEMINI-2.5-DELETE] Errore: {e}")
-        import traceback
-        traceback.print_exc()
+        logger.exception("[GEMINI-2.5-DELETE] Errore: %s", e)
         raise HTTPException(
             status_code=500,
             detail=f"Errore nell'eliminazione dei libri Gemini 2.5: {str(e)}"
@@ -631,9 +670,7 @@ async def get_pending_books_endpoint(
         }
     
     except Exception as e:
-        print(f"[PENDING BOOKS] Errore: {e}")
-        import traceback
-        traceback.print_exc()
+        logger.exception("[PENDING BOOKS] Errore: %s", e)
         raise HTTPException(
             status_code=500,
             detail=f"Errore nel recupero libri in sospeso: {str(e)}"
@@ -669,9 +706,7 @@ async def run_retention_cleanup(
             "results": results
         }
     except Exception as e:
-        print(f"[RETENTION CLEANUP] Errore: {e}", file=sys.stderr)
-        import traceback
-        traceback.print_exc()
+        logger.exception("[RETENTION CLEANUP] Errore: %s", e)
         raise HTTPException(
             status_code=500,
             detail=f"Errore durante la pulizia: {str(e)}"
@@ -17,14 +17,19 @@ from app.models import (
     ResetPasswordRequest,
     UserResponse,
     User,
+    UserCreditsResponse,
+    ModeCredits,
 )
 from app.agent.user_store import get_user_store
+from app.agent.referral_store import get_referral_store
+from app.services.audit_service import get_audit_service
 from app.services.email_service import get_email_service
 from app.middleware.auth import (
     create_session,
     delete_session,
     get_current_user,
     get_current_user_optional,
+    invalidate_cached_auth_user,
     require_admin,
 )
 
@@ -128,7 +133,6 @@ async def register(request: RegisterRequest):
         
         # Audit log registrazione
         try:
-            from app.services.audit_service import get_audit_service
             audit_service = get_audit_service()
             await audit_service.log_account_created(
                 user_id=user.id,
@@ -141,7 +145,6 @@ async def register(request: RegisterRequest):
         # Tracking referral (se presente token)
         if request.ref_token:
             try:
-                from app.agent.referral_store import get_referral_store
                 referral_store = get_referral_store()
                 await referral_store.connect()
                 
@@ -322,7 +325,6 @@ async def login(request: LoginRequest, response: Response):
         
         # Audit log login
         try:
-            from app.services.audit_service import get_audit_service
             audit_service = get_audit_service()
             await audit_service.log_login(
                 user_id=user.id,
@@ -401,8 +403,6 @@ async def get_user_credits(current_user: User = Depends(get_current_user_optiona
     Ottiene i crediti disponibili per le modalità di generazione.
     I crediti si resettano automaticamente ogni lunedì.
     """
-    from app.models import UserCreditsResponse, ModeCredits
-    
     # Se l'utente non è autenticato, ritorna crediti default
     if not current_user:
         return UserCreditsResponse(
@@ -520,6 +520,8 @@ async def verify_email(request: VerifyEmailRequest):
     
     # Verifica e attiva utente
     user = await user_store.verify_email(request.token)
+    if user:
+        invalidate_cached_auth_user(user.id)
     
     if not user:
         raise HTTPException(
@@ -655,6 +657,7 @@ async def reset_password(request: ResetPasswordRequest):
     
     # Aggiorna password
     success = await user_store.update_password(user.id, password_hash)
+    invalidate_cached_auth_user(user.id)
     if not success:
         raise HTTPException(
             status_code=status.HTTP_500_INTERNAL_SERVER_ERROR,
@@ -701,6 +704,7 @@ async def update_user_role(
     
     # Aggiorna ruolo
     success = await user_store.update_user(user_id, {"role": request.role})
+    invalidate_cached_auth_user(user_id)
     if not success:
         raise HTTPException(
             status_code=status.HTTP_500_INTERNAL_SERVER_ERROR,
@@ -1,16 +1,17 @@
 """Router per gli endpoint dei libri."""
+import asyncio
+import logging
 import os
-import sys
+import tempfile
 from pathlib import Path
-from typing import Optional
+from typing import BinaryIO
 from io import BytesIO
 from datetime import datetime
-from fastapi import APIRouter, HTTPException, BackgroundTasks, Depends
+from fastapi import APIRouter, HTTPException, BackgroundTasks, Depends, Request
 from fastapi.responses import Response
 from PIL import Image as PILImage
 import markdown
 import base64
-import math
 from xhtml2pdf import pisa
 
 from app.models import (
@@ -18,28 +19,39 @@ from app.models import (
     BookGenerationResponse,
     BookProgress,
     BookResponse,
-    Chapter,
     LiteraryCritique,
 )
 from app.agent.writer_generator import parse_outline_sections
 from app.agent.session_store import get_session_store
+from app.agent.book_share_store import get_book_share_store
 from app.agent.session_store_helpers import (
     get_session_async,
+    get_session_with_access_async,
     update_writing_progress_async,
     update_critique_async,
     update_critique_status_async,
     update_token_usage_async,
 )
-from app.middleware.auth import get_current_user_optional
-from app.services.pdf_service import generate_complete_book_pdf, calculate_page_count
+from app.middleware.auth import get_current_user_optional, invalidate_cached_auth_user
+from app.services.pdf_service import (
+    generate_complete_book_pdf,
+    build_chapters_fast,
+    calculate_total_pages,
+    sanitize_title_for_filename,
+)
 from app.services.export_service import generate_epub, generate_docx
 from app.services.storage_service import get_storage_service
 from app.services.book_generation_service import (
     background_book_generation,
     background_resume_book_generation,
 )
-from app.core.config import get_app_config
 from app.services.stats_service import llm_model_to_mode
+from app.services.book_progress_builder import build_book_progress, get_book_progress_etag
+
+logger = logging.getLogger(__name__)
+
+# Foglio di stile del PDF completo (app/static), risolto una sola volta
+_BOOK_CSS_PATH = Path(__file__).resolve().parent.parent.parent / "static" / "book_styles.css"
 
 # Helper functions (temporarily defined here, will be moved to utils later)
 def get_model_abbreviation(model_name: str) -> str:
@@ -76,138 +88,11 @@ def markdown_to_html(text: str) -> str:
     return html
 
 
-def calculate_generation_cost(session, total_pages: Optional[int]) -> Optional[float]:
-    """Calcola il costo stimato di generazione dei capitoli del libro."""
-    if not total_pages or total_pages <= 0:
-        return None
-    
-    try:
-        from app.core.config import (
-            get_tokens_per_page,
-            get_model_pricing,
-            get_exchange_rate_usd_to_eur,
-        )
-        from app.agent.writer_generator import map_model_name
-        
-        tokens_per_page = get_tokens_per_page()
-        model_name = session.form_data.llm_model if session.form_data else None
-        if not model_name:
-            return None
-        
-        gemini_model = map_model_name(model_name)
-        pricing = get_model_pricing(gemini_model)
-        input_cost_per_million = pricing["input_cost_per_million"]
-        output_cost_per_million = pricing["output_cost_per_million"]
-        
-        from app.core.config import get_token_estimates
-        token_estimates = get_token_estimates()
-        context_base_tokens = token_estimates.get("context_base", 8000)
-        
-        # Calcola usando formula chiusa O(1)
-        chapters = session.book_chapters or []
-        num_chapters = len(chapters)
-        if num_chapters == 0:
-            return None
-        
-        avg_pages_per_chapter = total_pages / num_chapters if num_chapters > 0 else 0
-        chapters_pages = total_pages - 1  # Escludi copertina
-        
-        # Formula chiusa: sum(i=1 to N) di (i-1) = N * (N-1) / 2
-        cumulative_pages_sum = (num_chapters * (num_chapters - 1) / 2) * avg_pages_per_chapter
-        
-        chapters_input = num_chapters * context_base_tokens
-        chapters_input += cumulative_pages_sum * tokens_per_page
-        
-        chapters_output = chapters_pages * tokens_per_page
-        
-        cost_usd = (chapters_input * input_cost_per_million / 1_000_000) + (chapters_output * output_cost_per_million / 1_000_000)
-        
-        exchange_rate = get_exchange_rate_usd_to_eur()
-        cost_eur = cost_usd * exchange_rate
-        
-        return round(cost_eur, 4)
-    except Exception as e:
-        print(f"[CALCULATE_COST] Errore nel calcolo costo: {e}")
-        return None
-
-
-async def calculate_estimated_time(session_id: str, current_step: int, total_steps: int) -> tuple[Optional[float], Optional[str]]:
-    """Calcola la stima del tempo rimanente per completare il libro usando modello lineare."""
-    try:
-        try:
-            current_step = int(current_step)
-        except (ValueError, TypeError):
-            print(f"[CALCULATE_ESTIMATED_TIME] WARNING: current_step non è un numero valido ({current_step}), uso 0")
-            current_step = 0
-        
-        try:
-            total_steps = int(total_steps)
-        except (ValueError, TypeError):
-            print(f"[CALCULATE_ESTIMATED_TIME] WARNING: total_steps non è un numero valido ({total_steps}), uso 0")
-            total_steps = 0
-        
-        if total_steps <= 0:
-            return None, None
-        
-        remaining_chapters = total_steps - current_step
-        if remaining_chapters <= 0:
-            return None, None
-        
-        app_config = get_app_config()
-        session_store = get_session_store()
-        session = await get_session_async(session_store, session_id)
-        
-        current_model = session.form_data.llm_model if session and session.form_data else None
-        
-        from app.utils.stats_utils import get_generation_method, get_linear_params_for_method, calculate_residual_time_linear
-        method = get_generation_method(current_model)
-        a, b = get_linear_params_for_method(method, app_config)
-        
-        k = current_step + 1
-        N = total_steps
-        
-        estimated_seconds = calculate_residual_time_linear(k, N, a, b)
-        estimated_minutes = estimated_seconds / 60
-        
-        return round(estimated_minutes, 1), None
-        
-    except Exception as e:
-        print(f"[CALCULATE_ESTIMATED_TIME] ERRORE nel calcolo stima tempo: {e}")
-        import traceback
-        traceback.print_exc()
-        return None, None
-
 router = APIRouter(prefix="/api/book", tags=["book"])
 
 
-async def generate_book_pdf(session_id: str, current_user=None) -> Response:
-    """
-    Helper function per generare PDF del libro.
-    Può essere chiamata sia dall'endpoint che dal service.
-    """
-    from app.agent.book_share_store import get_book_share_store
-    
-    session_store = get_session_store()
-    session = await get_session_async(session_store, session_id, user_id=None)
-    
-    if not session:
-        raise HTTPException(status_code=404, detail=f"Sessione {session_id} non trovata")
-    
-    # Verifica accesso se current_user è fornito
-    if current_user and session.user_id and session.user_id != current_user.id:
-        book_share_store = get_book_share_store()
-        await book_share_store.connect()
-        has_access = await book_share_store.check_user_has_access(
-            book_session_id=session_id,
-            user_id=current_user.id,
-            owner_id=session.user_id,
-        )
-        if not has_access:
-            raise HTTPException(
-                status_code=403,
-                detail="Accesso negato: questa sessione appartiene a un altro utente o non hai accesso"
-            )
-    
+def _ensure_book_ready_for_pdf(session) -> None:
+    """Verifica che il libro sia completo e abbia capitoli prima di generare il PDF."""
     if not session.writing_progress or not session.writing_progress.get('is_complete'):
         raise HTTPException(
             status_code=400,
@@ -216,39 +101,47 @@ async def generate_book_pdf(session_id: str, current_user=None) -> Response:
     
     if not session.book_chapters or len(session.book_chapters) == 0:
         raise HTTPException(status_code=400, detail="Nessun capitolo trovato nel libro.")
+
+
+def _render_book_pdf(session, dest: BinaryIO) -> str:
+    """
+    Renderizza il PDF del libro (copertina, indice, capitoli) scrivendolo su dest.
     
+    Returns:
+        Nome file del PDF (data, modello e titolo)
+    """
     book_title = session.current_title or "Romanzo"
     book_author = session.form_data.user_name or "Autore"
     
-    print(f"[BOOK PDF] Generazione PDF con WeasyPrint per: {book_title}")
+    logger.info("[BOOK PDF] Generazione PDF con WeasyPrint per: %s", book_title)
     
     # Leggi il file CSS
-    css_path = Path(__file__).parent.parent.parent / "static" / "book_styles.css"
+    css_path = _BOOK_CSS_PATH
     if not css_path.exists():
         raise Exception(f"File CSS non trovato: {css_path}")
     
     with open(css_path, 'r', encoding='utf-8') as f:
         css_content = f.read()
     
-    print(f"[BOOK PDF] CSS caricato da: {css_path}")
+    logger.info("[BOOK PDF] CSS caricato da: %s", css_path)
     
     # Prepara immagine copertina
     cover_image_data = None
     cover_image_mime = None
     cover_image_style = None
     
-    print(f"[BOOK PDF] Verifica copertina - cover_image_path nella sessione: {session.cover_image_path}")
+    logger.info("[BOOK PDF] Verifica copertina - cover_image_path nella sessione: %s", session.cover_image_path)
     
     if session.cover_image_path:
         try:
             storage_service = get_storage_service()
-            print(f"[BOOK PDF] Caricamento copertina da: {session.cover_image_path}")
+            logger.info("[BOOK PDF] Caricamento copertina da: %s", session.cover_image_path)
             image_bytes = storage_service.download_file(session.cover_image_path)
-            print(f"[BOOK PDF] Immagine copertina caricata: {len(image_bytes)} bytes")
+            logger.info("[BOOK PDF] Immagine copertina caricata: %s bytes", len(image_bytes))
             
             with PILImage.open(BytesIO(image_bytes)) as img:
                 cover_image_width, cover_image_height = img.size
-                print(f"[BOOK PDF] Dimensioni originali immagine: {cover_image_width} x {cover_image_height}")
+                logger.info("[BOOK PDF] Dimensioni originali immagine: %s x %s", cover_image_width, cover_image_height)
             
             cover_path_str = session.cover_image_path.lower()
             if '.png' in cover_path_str:
@@ -269,11 +162,9 @@ async def generate_book_pdf(session_id: str, current_user=None) -> Response:
                 cover_image_style = "width: 100%; height: auto;"
             
             cover_image_data = base64.b64encode(image_bytes).decode('utf-8')
-            print(f"[BOOK PDF] Immagine copertina caricata, MIME: {cover_image_mime}")
+            logger.info("[BOOK PDF] Immagine copertina caricata, MIME: %s", cover_image_mime)
         except Exception as e:
-            print(f"[BOOK PDF] Errore nel caricamento copertina: {e}")
-            import traceback
-            traceback.print_exc()
+            logger.exception("[BOOK PDF] Errore nel caricamento copertina: %s", e)
     
     # Ordina i capitoli per section_index
     sorted_chapters = sorted(session.book_chapters, key=lambda x: x.get('section_index', 0))
@@ -313,7 +204,7 @@ async def generate_book_pdf(session_id: str, current_user=None) -> Response:
         <img src="data:{cover_image_mime};base64,{cover_image_data}" class="cover-image" alt="Copertina" style="{image_style} margin: 0; padding: 0; display: block;">
     </div>
     <div style="page-break-after: always;"></div>'''
-        print(f"[BOOK PDF] Copertina aggiunta con base64, stile: {image_style}")
+        logger.info("[BOOK PDF] Copertina aggiunta con base64, stile: %s", image_style)
     
     html_content = f'''<!DOCTYPE html>
 <html lang="it">
@@ -343,56 +234,124 @@ async def generate_book_pdf(session_id: str, current_user=None) -> Response:
 </body>
 </html>'''
     
-    print(f"[BOOK PDF] HTML generato, lunghezza: {len(html_content)} caratteri")
+    logger.info("[BOOK PDF] HTML generato, lunghezza: %s caratteri", len(html_content))
     
     # Genera PDF con xhtml2pdf
-    print(f"[BOOK PDF] Generazione PDF con xhtml2pdf...")
-    buffer = BytesIO()
-    
+    logger.info("[BOOK PDF] Generazione PDF con xhtml2pdf...")
     try:
         result = pisa.CreatePDF(
             src=html_content,
-            dest=buffer,
+            dest=dest,
             encoding='utf-8'
         )
         
         if result.err:
             raise Exception(f"Errore nella generazione PDF: {result.err}")
         
-        print(f"[BOOK PDF] PDF generato con successo")
+        logger.info("[BOOK PDF] PDF generato con successo")
     except Exception as e:
-        print(f"[BOOK PDF] Errore nella generazione PDF con xhtml2pdf: {e}")
-        import traceback
-        traceback.print_exc()
+        logger.exception("[BOOK PDF] Errore nella generazione PDF con xhtml2pdf: %s", e)
         raise
     
-    buffer.seek(0)
-    pdf_content = buffer.getvalue()
-    
     # Nome file con data, modello e titolo
     date_prefix = datetime.now().strftime("%Y-%m-%d")
     model_abbrev = get_model_abbreviation(session.form_data.llm_model)
-    title_sanitized = "".join(c for c in book_title if c.isalnum() or c in (' ', '-', '_')).rstrip()
-    title_sanitized = title_sanitized.replace(" ", "_")
+    title_sanitized = sanitize_title_for_filename(book_title)
     if not title_sanitized:
-        title_sanitized = f"Libro_{session_id[:8]}"
+        title_sanitized = f"Libro_{session.session_id[:8]}"
     filename = f"{date_prefix}_{model_abbrev}_{title_sanitized}.pdf"
-    
-    # Salva PDF su GCS o locale tramite StorageService
+    return filename
+
+
+def _save_book_pdf(session, pdf_content: bytes | Path, filename: str) -> None:
+    """
+    Salva il PDF del libro su GCS o locale tramite StorageService.
+    pdf_content può essere il contenuto in memoria o il path di un file già su disco.
+    """
     try:
         storage_service = get_storage_service()
         user_id = session.user_id if hasattr(session, 'user_id') else None
-        gcs_path = storage_service.upload_file(
-            data=pdf_content,
-            destination_path=f"books/{filename}",
-            content_type="application/pdf",
-            user_id=user_id,
-        )
-        print(f"[BOOK PDF] PDF salvato: {gcs_path}")
+        if isinstance(pdf_content, Path):
+            gcs_path = storage_service.upload_local_file(
+                source_path=pdf_content,
+                destination_path=f"books/{filename}",
+                content_type="application/pdf",
+                user_id=user_id,
+            )
+        else:
+            gcs_path = storage_service.upload_file(
+                data=pdf_content,
+                destination_path=f"books/{filename}",
+                content_type="application/pdf",
+                user_id=user_id,
+            )
+        logger.info("[BOOK PDF] PDF salvato: %s", gcs_path)
     except Exception as e:
-        print(f"[BOOK PDF] Errore nel salvataggio PDF: {e}")
-        import traceback
-        traceback.print_exc()
+        logger.exception("[BOOK PDF] Errore nel salvataggio PDF: %s", e)
+
+
+def _build_book_pdf_file(session) -> Path:
+    """
+    Genera il PDF in un file temporaneo e lo carica su storage direttamente dal file.
+    Se la generazione fallisce il file temporaneo viene rimosso.
+    """
+    tmp = tempfile.NamedTemporaryFile(suffix=".pdf", delete=False)
+    pdf_path = Path(tmp.name)
+    try:
+        with tmp:
+            filename = _render_book_pdf(session, tmp)
+    except BaseException:
+        pdf_path.unlink(missing_ok=True)
+        raise
+    _save_book_pdf(session, pdf_path, filename)
+    return pdf_path
+
+
+async def build_book_pdf_to_path(session) -> Path:
+    """
+    Genera il PDF finale del libro in un file temporaneo e lo salva su storage.
+    
+    Usata dal flusso di critica: il PDF viene passato al critico come path,
+    senza passare per una Response né copiare il contenuto in memoria più volte.
+    Il chiamante è responsabile della rimozione del file temporaneo.
+    """
+    _ensure_book_ready_for_pdf(session)
+    
+    # Rendering (xhtml2pdf, download della copertina) e upload sono bloccanti: in un thread
+    return await asyncio.to_thread(_build_book_pdf_file, session)
+
+
+async def generate_book_pdf(session_id: str, current_user=None) -> Response:
+    """
+    Helper function per generare PDF del libro.
+    Usata dall'endpoint di download: verifica accesso e restituisce il PDF come Response.
+    """
+    session_store = get_session_store()
+    session = await get_session_async(session_store, session_id, user_id=None)
+    
+    if not session:
+        raise HTTPException(status_code=404, detail=f"Sessione {session_id} non trovata")
+    
+    # Verifica accesso se current_user è fornito
+    if current_user and session.user_id and session.user_id != current_user.id:
+        book_share_store = get_book_share_store()
+        has_access = await book_share_store.check_user_has_access(
+            book_session_id=session_id,
+            user_id=current_user.id,
+            owner_id=session.user_id,
+        )
+        if not has_access:
+            raise HTTPException(
+                status_code=403,
+                detail="Accesso negato: questa sessione appartiene a un altro utente o non hai accesso"
+            )
+    
+    _ensure_book_ready_for_pdf(session)
+    
+    buffer = BytesIO()
+    filename = _render_book_pdf(session, buffer)
+    pdf_content = buffer.getvalue()
+    _save_book_pdf(session, pdf_content, filename)
     
     return Response(
         content=pdf_content,
@@ -456,14 +415,16 @@ async def generate_book_endpoint(
             llm_model = session.form_data.llm_model if session.form_data and session.form_data.llm_model else "gemini-3-flash"
             mode = llm_model_to_mode(llm_model).lower()  # flash, pro, ultra
             
-            print(f"[BOOK GENERATION] Tentativo consumo credito {mode} per utente {current_user.id}")
+            logger.info("[BOOK GENERATION] Tentativo consumo credito %s per utente %s", mode, current_user.id)
             
             # Verifica crediti disponibili e consuma (admin ha crediti illimitati)
             user_store = get_user_store()
             is_admin = current_user.role == "admin"
             success, message, updated_credits = await user_store.consume_credit(current_user.id, mode, is_admin=is_admin)
+            # I crediti dell'utente in cache non sono più aggiornati
+            invalidate_cached_auth_user(current_user.id)
             
-            print(f"[BOOK GENERATION] Risultato consumo credito: success={success}, message={message}, credits={updated_credits}")
+            logger.info("[BOOK GENERATION] Risultato consumo credito: success=%s, message=%s, credits=%s", success, message, updated_credits)
             
             if not success:
                 # Crediti esauriti - ritorna errore HTTP
@@ -478,11 +439,11 @@ async def generate_book_endpoint(
                     }
                 )
         else:
-            print(f"[BOOK GENERATION] ATTENZIONE: Utente non autenticato, crediti NON consumati")
+            logger.warning("[BOOK GENERATION] ATTENZIONE: Utente non autenticato, crediti NON consumati")
         
         # Parsa l'outline e inizializza il progresso IMMEDIATAMENTE
         try:
-            print(f"[BOOK GENERATION] Parsing outline per sessione {request.session_id}...")
+            logger.info("[BOOK GENERATION] Parsing outline per sessione %s...", request.session_id)
             sections = parse_outline_sections(session.current_outline)
             total_sections = len(sections)
             
@@ -502,15 +463,13 @@ async def generate_book_endpoint(
                 is_complete=False,
                 is_paused=False,
             )
-            print(f"[BOOK GENERATION] Progresso inizializzato: {total_sections} sezioni da scrivere")
+            logger.info("[BOOK GENERATION] Progresso inizializzato: %s sezioni da scrivere", total_sections)
             
         except ValueError as e:
-            print(f"[BOOK GENERATION] Errore nel parsing outline: {e}")
+            logger.error("[BOOK GENERATION] Errore nel parsing outline: %s", e)
             raise HTTPException(status_code=400, detail=str(e))
         except Exception as e:
-            print(f"[BOOK GENERATION] Errore imprevisto durante l'inizializzazione: {e}")
-            import traceback
-            traceback.print_exc()
+            logger.exception("[BOOK GENERATION] Errore imprevisto durante l'inizializzazione: %s", e)
             raise HTTPException(
                 status_code=500,
                 detail=f"Errore durante l'inizializzazione della scrittura: {str(e)}"
@@ -526,10 +485,10 @@ async def generate_book_endpoint(
             draft_title=session.current_title,
             outline_text=session.current_outline,
             api_key=api_key,
-            generate_pdf_callback=lambda sid: generate_book_pdf(sid, current_user=None),
+            generate_pdf_callback=build_book_pdf_to_path,
         )
         
-        print(f"[BOOK GENERATION] Task di generazione avviato per sessione {request.session_id}")
+        logger.info("[BOOK GENERATION] Task di generazione avviato per sessione %s", request.session_id)
         
         return BookGenerationResponse(
             success=True,
@@ -540,9 +499,7 @@ async def generate_book_endpoint(
     except HTTPException:
         raise
     except Exception as e:
-        print(f"[ERROR] Errore nell'avvio generazione libro: {e}")
-        import traceback
-        traceback.print_exc()
+        logger.exception("[ERROR] Errore nell'avvio generazione libro: %s", e)
         raise HTTPException(
             status_code=500,
             detail=f"Errore nell'avvio della generazione del libro: {str(e)}"
@@ -599,10 +556,10 @@ async def resume_book_generation_endpoint(
             background_resume_book_generation,
             session_id=session_id,
             api_key=api_key,
-            generate_pdf_callback=lambda sid: generate_book_pdf(sid, current_user=None),
+            generate_pdf_callback=build_book_pdf_to_path,
         )
         
-        print(f"[BOOK GENERATION] Task di ripresa generazione avviato per sessione {session_id}")
+        logger.info("[BOOK GENERATION] Task di ripresa generazione avviato per sessione %s", session_id)
         
         return BookGenerationResponse(
             success=True,
@@ -613,9 +570,7 @@ async def resume_book_generation_endpoint(
     except HTTPException:
         raise
     except Exception as e:
-        print(f"[ERROR] Errore nell'avvio ripresa generazione libro: {e}")
-        import traceback
-        traceback.print_exc()
+        logger.exception("[ERROR] Errore nell'avvio ripresa generazione libro: %s", e)
         raise HTTPException(
             status_code=500,
             detail=f"Errore nell'avvio della ripresa generazione: {str(e)}"
@@ -625,13 +580,21 @@ async def resume_book_generation_endpoint(
 @router.get("/progress/{session_id}", response_model=BookProgress)
 async def get_book_progress_endpoint(
     session_id: str,
+    request: Request,
+    response: Response,
     current_user = Depends(get_current_user_optional),
 ):
-    """Recupera lo stato di avanzamento della scrittura del libro."""
+    """
+    Recupera lo stato di avanzamento della scrittura del libro.
+    Supporta If-None-Match: se lo stato non è cambiato risponde 304 senza ricostruire il progresso.
+    """
     try:
-        session_store = get_session_store()
-        # Recupera sessione senza filtro user_id per permettere accesso a libri condivisi
-        session = await get_session_async(session_store, session_id, user_id=None)
+        # Sessione (senza filtro user_id, per i libri condivisi) e accesso recuperati in parallelo
+        session, access = await get_session_with_access_async(
+            get_session_store(),
+            session_id,
+            current_user.id if current_user else None,
+        )
         
         if not session:
             raise HTTPException(
@@ -640,174 +603,19 @@ async def get_book_progress_endpoint(
             )
         
         # Verifica accesso: ownership o condivisione accettata
-        if current_user and session.user_id and session.user_id != current_user.id:
-            from app.agent.book_share_store import get_book_share_store
-            book_share_store = get_book_share_store()
-            await book_share_store.connect()
-            has_access = await book_share_store.check_user_has_access(
-                book_session_id=session_id,
-                user_id=current_user.id,
-                owner_id=session.user_id,
-            )
-            if not has_access:
-                raise HTTPException(
-                    status_code=403,
-                    detail="Accesso negato: questa sessione appartiene a un altro utente o non hai accesso"
-                )
-        
-        # Costruisci la risposta dal progresso salvato
-        progress = session.writing_progress or {}
-        chapters = session.book_chapters or []
-        
-        # Converti i capitoli in oggetti Chapter
-        completed_chapters = []
-        for ch_dict in chapters:
-            content = ch_dict.get('content', '')
-            page_count = calculate_page_count(content)
-            completed_chapters.append(Chapter(
-                title=ch_dict.get('title', ''),
-                content=content,
-                section_index=ch_dict.get('section_index', 0),
-                page_count=page_count,
-            ))
-        
-        # Calcola total_pages se il libro è completato
-        total_pages = None
-        is_complete = progress.get('is_complete', False)
-        if is_complete and len(completed_chapters) > 0:
-            chapters_pages = sum(ch.page_count for ch in completed_chapters)
-            cover_pages = 1
-            app_config = get_app_config()
-            toc_chapters_per_page = app_config.get("validation", {}).get("toc_chapters_per_page", 30)
-            toc_pages = math.ceil(len(completed_chapters) / toc_chapters_per_page)
-            total_pages = chapters_pages + cover_pages + toc_pages
-        
-        # Calcola writing_time_minutes se disponibile o calcolabile
-        writing_time_minutes = progress.get('writing_time_minutes')
-        if writing_time_minutes is None and is_complete:
-            if session.writing_start_time and session.writing_end_time:
-                delta = session.writing_end_time - session.writing_start_time
-                writing_time_minutes = delta.total_seconds() / 60
-        
-        # Usa il costo reale basato sui token effettivi (None per libri vecchi senza tracking)
-        estimated_cost = getattr(session, 'real_cost_eur', None)
-        
-        # Recupera la valutazione critica se disponibile
-        critique = None
-        if session.literary_critique:
-            try:
-                critique = LiteraryCritique(**session.literary_critique)
-            except Exception as e:
-                print(f"[GET BOOK PROGRESS] Errore nel parsing critique: {e}")
-
-        # Backward-compat: sessioni vecchie potrebbero avere critique senza critique_status
-        critique_status = session.critique_status
-        critique_error = session.critique_error
-        if critique_status is None:
-            if critique is not None:
-                critique_status = "completed"
-            elif is_complete:
-                critique_status = "pending"
-        
-        # Calcola stima tempo se il libro non è completato
-        estimated_time_minutes = None
-        estimated_time_confidence = None
-        calculated_total_steps = None
-        if not is_complete:
-            raw_current = progress.get('current_step', 0)
-            raw_total = progress.get('total_steps', 0)
-            
-            try:
-                current_step = int(raw_current)
-            except (ValueError, TypeError):
-                print(f"[GET BOOK PROGRESS] WARNING: current_step non è un numero valido ({raw_current}), uso 0")
-                current_step = 0
-            
-            try:
-                total_steps = int(raw_total)
-            except (ValueError, TypeError):
-                print(f"[GET BOOK PROGRESS] WARNING: total_steps non è un numero valido ({raw_total}), uso 0")
-                total_steps = 0
-            
-            if current_step < 0:
-                print(f"[GET BOOK PROGRESS] WARNING: current_step negativo ({current_step}), correggo a 0")
-                current_step = 0
-            
-            # FALLBACK: Se total_steps è 0 ma is_complete è False, prova a calcolarlo dall'outline
-            if total_steps == 0:
-                print(f"[GET BOOK PROGRESS] WARNING: total_steps è 0 nel progress dict, provo a calcolarlo dall'outline")
-                if session.current_outline:
-                    try:
-                        sections = parse_outline_sections(session.current_outline)
-                        total_steps = len(sections)
-                        calculated_total_steps = total_steps
-                        print(f"[GET BOOK PROGRESS] Calcolato total_steps dall'outline: {total_steps}")
-                    except Exception as e:
-                        print(f"[GET BOOK PROGRESS] Errore nel parsing outline per calcolare total_steps: {e}")
-                        total_steps = 0
-                if total_steps == 0:
-                    print(f"[GET BOOK PROGRESS] total_steps ancora 0, uso default 1 per permettere calcolo")
-                    total_steps = 1
-                    calculated_total_steps = 1
-            
-            print(f"[GET BOOK PROGRESS] Calcolo stima tempo: current_step={current_step}, total_steps={total_steps}")
-            print(f"[GET BOOK PROGRESS] chapter_timings: {session.chapter_timings}")
-            
-            if total_steps <= 0:
-                print(f"[GET BOOK PROGRESS] WARNING: total_steps è ancora <= 0 dopo fallback, uso 1 come ultimo resort")
-                total_steps = 1
-                calculated_total_steps = 1
-            
-            # Calcola sempre la stima
-            estimated_time_minutes, estimated_time_confidence = await calculate_estimated_time(
-                session_id, current_step, total_steps
+        if access == "denied":
+            raise HTTPException(
+                status_code=403,
+                detail="Accesso negato: questa sessione appartiene a un altro utente o non hai accesso"
             )
-            print(f"[GET BOOK PROGRESS] estimated_time_minutes: {estimated_time_minutes}, confidence: {estimated_time_confidence}")
-            
-            # Fallback finale
-            if estimated_time_minutes is None:
-                remaining = total_steps - current_step
-                if remaining > 0:
-                    print(f"[GET BOOK PROGRESS] WARNING: calculate_estimated_time ha restituito None, uso fallback finale")
-                    app_config = get_app_config()
-                    time_config = app_config.get("time_estimation", {})
-                    fallback_seconds = time_config.get("fallback_seconds_per_chapter", 45)
-                    estimated_time_minutes = (remaining * fallback_seconds) / 60
-                    estimated_time_confidence = "low"
-                    print(f"[GET BOOK PROGRESS] Fallback finale applicato: {estimated_time_minutes:.1f} minuti")
-        
-        # Assicuriamoci che total_steps sia valido nel BookProgress
-        if not is_complete and calculated_total_steps is not None and calculated_total_steps > 0:
-            final_total_steps = calculated_total_steps
-            print(f"[GET BOOK PROGRESS] Usando total_steps calcolato: {final_total_steps}")
-        else:
-            final_total_steps = progress.get('total_steps', 0)
-        
-        # Ultima garanzia
-        if not is_complete and final_total_steps <= 0:
-            print(f"[GET BOOK PROGRESS] SAFETY: final_total_steps è {final_total_steps}, uso 1 come minimo")
-            final_total_steps = 1
         
-        print(f"[GET BOOK PROGRESS] Valori finali: total_steps={final_total_steps}, estimated_time_minutes={estimated_time_minutes}, estimated_time_confidence={estimated_time_confidence}")
+        # Revalidazione del polling: 304 prima di ricostruire capitoli, costi e stima tempo
+        etag = get_book_progress_etag(session, session_id)
+        if request.headers.get("If-None-Match") == etag:
+            return Response(status_code=304, headers={"ETag": etag})
+        response.headers["ETag"] = etag
         
-        return BookProgress(
-            session_id=session_id,
-            current_step=progress.get('current_step', 0),
-            total_steps=final_total_steps,
-            current_section_name=progress.get('current_section_name'),
-            completed_chapters=completed_chapters,
-            is_complete=is_complete,
-            is_paused=progress.get('is_paused', False),
-            error=progress.get('error'),
-            total_pages=total_pages,
-            writing_time_minutes=writing_time_minutes,
-            estimated_cost=estimated_cost,
-            critique=critique,
-            critique_status=critique_status,
-            critique_error=critique_error,
-            estimated_time_minutes=estimated_time_minutes,
-            estimated_time_confidence=estimated_time_confidence,
-        )
+        return await build_book_progress(session, session_id)
     
     except HTTPException:
         raise
@@ -825,66 +633,50 @@ async def get_complete_book_endpoint(
 ):
     """Restituisce il libro completo con tutti i capitoli."""
     try:
-        print(f"[GET BOOK] Richiesta libro completo per sessione: {session_id}")
-        session_store = get_session_store()
-        session = await get_session_async(session_store, session_id, user_id=None)
+        logger.info("[GET BOOK] Richiesta libro completo per sessione: %s", session_id)
+        session, access = await get_session_with_access_async(
+            get_session_store(),
+            session_id,
+            current_user.id if current_user else None,
+        )
         
         if not session:
-            print(f"[GET BOOK] Sessione {session_id} non trovata")
+            logger.info("[GET BOOK] Sessione %s non trovata", session_id)
             raise HTTPException(
                 status_code=404,
                 detail=f"Sessione {session_id} non trovata"
             )
         
         # Verifica accesso: ownership o condivisione accettata
-        if current_user and session.user_id and session.user_id != current_user.id:
-            from app.agent.book_share_store import get_book_share_store
-            book_share_store = get_book_share_store()
-            await book_share_store.connect()
-            has_access = await book_share_store.check_user_has_access(
-                book_session_id=session_id,
-                user_id=current_user.id,
-                owner_id=session.user_id,
+        if access == "denied":
+            raise HTTPException(
+                status_code=403,
+                detail="Accesso negato: questa sessione appartiene a un altro utente o non hai accesso"
             )
-            if not has_access:
-                raise HTTPException(
-                    status_code=403,
-                    detail="Accesso negato: questa sessione appartiene a un altro utente o non hai accesso"
-                )
         
-        print(f"[GET BOOK] Sessione trovata. Progresso: {session.writing_progress}, Capitoli: {len(session.book_chapters) if session.book_chapters else 0}")
+        logger.debug("[GET BOOK] Sessione trovata. Progresso: %s, Capitoli: %s", session.writing_progress, len(session.book_chapters) if session.book_chapters else 0)
         
         if not session.writing_progress or not session.writing_progress.get('is_complete'):
-            print(f"[GET BOOK] Libro non ancora completo. Progresso: {session.writing_progress}")
+            logger.info("[GET BOOK] Libro non ancora completo. Progresso: %s", session.writing_progress)
             raise HTTPException(
                 status_code=400,
                 detail="Il libro non è ancora completo. Attendi il completamento della scrittura."
             )
         
         if not session.book_chapters or len(session.book_chapters) == 0:
-            print(f"[GET BOOK] Nessun capitolo trovato nella sessione")
+            logger.warning("[GET BOOK] Nessun capitolo trovato nella sessione")
             raise HTTPException(
                 status_code=400,
                 detail="Nessun capitolo trovato nel libro. La scrittura potrebbe non essere stata completata correttamente."
             )
         
-        # Converti i capitoli in oggetti Chapter
-        chapters = []
-        for idx, ch_dict in enumerate(session.book_chapters):
-            try:
-                content = ch_dict.get('content', '')
-                page_count = calculate_page_count(content)
-                chapter = Chapter(
-                    title=ch_dict.get('title', f'Capitolo {idx + 1}'),
-                    content=content,
-                    section_index=ch_dict.get('section_index', idx),
-                    page_count=page_count,
-                )
-                chapters.append(chapter)
-                print(f"[GET BOOK] Capitolo {idx + 1}: '{chapter.title}' - {len(chapter.content)} caratteri - {page_count} pagine")
-            except Exception as e:
-                print(f"[GET BOOK] Errore nel processare capitolo {idx}: {e}")
-                continue
+        # Converti i capitoli in oggetti Chapter (conteggio pagine in un solo passaggio)
+        chapters = build_chapters_fast(session.book_chapters)
+        if logger.isEnabledFor(logging.DEBUG):
+            logger.debug(
+                "[GET BOOK] Capitoli: %s",
+                "; ".join(f"{idx + 1}: '{ch.title}' {len(ch.content)} caratteri, {ch.page_count} pagine" for idx, ch in enumerate(chapters)),
+            )
         
         if len(chapters) == 0:
             raise HTTPException(
@@ -895,13 +687,8 @@ async def get_complete_book_endpoint(
         # Ordina per section_index
         chapters.sort(key=lambda x: x.section_index)
         
-        # Calcola total_pages
-        chapters_pages = sum(ch.page_count for ch in chapters)
-        cover_pages = 1
-        app_config = get_app_config()
-        toc_chapters_per_page = app_config.get("validation", {}).get("toc_chapters_per_page", 30)
-        toc_pages = math.ceil(len(chapters) / toc_chapters_per_page)
-        total_pages = chapters_pages + cover_pages + toc_pages
+        # Calcola total_pages dai page_count già calcolati
+        total_pages = calculate_total_pages(chapters)
         
         # Calcola writing_time_minutes
         writing_time_minutes = None
@@ -916,9 +703,9 @@ async def get_complete_book_endpoint(
         critique = None
         if session.literary_critique:
             try:
-                critique = LiteraryCritique(**session.literary_critique)
+                critique = LiteraryCritique.from_stored(session.literary_critique)
             except Exception as e:
-                print(f"[GET BOOK] Errore nel parsing critique: {e}")
+                logger.error("[GET BOOK] Errore nel parsing critique: %s", e)
 
         critique_status = session.critique_status
         critique_error = session.critique_error
@@ -936,15 +723,13 @@ async def get_complete_book_endpoint(
             critique_error=critique_error,
         )
         
-        print(f"[GET BOOK] Libro restituito: {book_response.title} di {book_response.author}, {len(chapters)} capitoli, {total_pages} pagine totali")
+        logger.debug("[GET BOOK] Libro restituito: %s di %s, %s capitoli, %s pagine totali", book_response.title, book_response.author, len(chapters), total_pages)
         return book_response
     
     except HTTPException:
         raise
     except Exception as e:
-        print(f"[GET BOOK] ERRORE nel recupero del libro completo: {e}")
-        import traceback
-        traceback.print_exc()
+        logger.exception("[GET BOOK] ERRORE nel recupero del libro completo: %s", e)
         raise HTTPException(
             status_code=500,
             detail=f"Errore nel recupero del libro completo: {str(e)}"
@@ -977,7 +762,7 @@ async def export_book_endpoint(
         File Response con il libro nel formato richiesto
     """
     try:
-        print(f"[BOOK EXPORT] Richiesta export {format} per sessione: {session_id}")
+        logger.info("[BOOK EXPORT] Richiesta export %s per sessione: %s", format, session_id)
         session_store = get_session_store()
         session = await get_session_async(session_store, session_id, user_id=None)
         
@@ -989,9 +774,7 @@ async def export_book_endpoint(
         
         # Verifica accesso: ownership o condivisione accettata
         if current_user and session.user_id and session.user_id != current_user.id:
-            from app.agent.book_share_store import get_book_share_store
             book_share_store = get_book_share_store()
-            await book_share_store.connect()
             has_access = await book_share_store.check_user_has_access(
                 book_session_id=session_id,
                 user_id=current_user.id,
@@ -1033,7 +816,7 @@ async def export_book_endpoint(
                 detail=f"Formato non supportato: {format}. Formati supportati: pdf, epub, docx"
             )
         
-        print(f"[BOOK EXPORT] File {format} generato con successo: {filename}")
+        logger.info("[BOOK EXPORT] File %s generato con successo: %s", format, filename)
         
         return Response(
             content=file_content,
@@ -1046,9 +829,7 @@ async def export_book_endpoint(
     except HTTPException:
         raise
     except Exception as e:
-        print(f"[BOOK EXPORT] ERRORE nella generazione del file {format}: {e}")
-        import traceback
-        traceback.print_exc()
+        logger.exception("[BOOK EXPORT] ERRORE nella generazione del file %s: %s", format, e)
         raise HTTPException(
             status_code=500,
             detail=f"Errore nella generazione del file {format}: {str(e)}"
@@ -1071,9 +852,7 @@ async def regenerate_book_critique_endpoint(
     
     # Verifica accesso: ownership o condivisione accettata
     if current_user and session.user_id and session.user_id != current_user.id:
-        from app.agent.book_share_store import get_book_share_store
         book_share_store = get_book_share_store()
-        await book_share_store.connect()
         has_access = await book_share_store.check_user_has_access(
             book_session_id=session_id,
             user_id=current_user.id,
@@ -1088,13 +867,13 @@ async def regenerate_book_critique_endpoint(
     if not session.writing_progress or not session.writing_progress.get("is_complete"):
         raise HTTPException(status_code=400, detail="Il libro non è ancora completo.")
 
-    # Genera/recupera PDF
+    # Genera il PDF dalla sessione già caricata (niente secondo fetch né Response intermedia)
     try:
         await update_critique_status_async(session_store, session_id, "running", error=None)
-        pdf_response = await generate_book_pdf(session_id, current_user=None)
-        pdf_bytes = getattr(pdf_response, "body", None) or getattr(pdf_response, "content", None)
-        if not isinstance(pdf_bytes, (bytes, bytearray)) or len(pdf_bytes) == 0:
-            raise ValueError("PDF bytes non disponibili.")
+        pdf_path = await build_book_pdf_to_path(session)
+        if pdf_path.stat().st_size == 0:
+            pdf_path.unlink(missing_ok=True)
+            raise ValueError("PDF vuoto, non disponibile per la critica.")
     except Exception as e:
         await update_critique_status_async(session_store, session_id, "failed", error=str(e))
         raise HTTPException(status_code=500, detail=f"Errore nel generare il PDF per la critica: {e}")
@@ -1107,20 +886,22 @@ async def regenerate_book_critique_endpoint(
     critic_cfg = get_literary_critic_config()
     model_name = normalize_critic_model_name(critic_cfg.get("default_model", "gemini-3-pro-preview"))
     provider = detect_critic_provider(model_name)
-    print(f"[REGENERATE_CRITIQUE] Endpoint chiamato per sessione {session_id}", file=sys.stderr)
-    print(f"[REGENERATE_CRITIQUE] Configurazione critico: modello={model_name}, provider={provider.upper()}", file=sys.stderr)
+    logger.info("[REGENERATE_CRITIQUE] Endpoint chiamato per sessione %s", session_id)
+    logger.info("[REGENERATE_CRITIQUE] Configurazione critico: modello=%s, provider=%s", model_name, provider.upper())
     
     api_key = None  # Passiamo None, la funzione leggerà da env appropriato
     try:
         critique, token_usage = await generate_literary_critique_from_pdf(
             title=session.current_title or "Romanzo",
             author=session.form_data.user_name or "Autore",
-            pdf_bytes=bytes(pdf_bytes),
+            pdf_path=pdf_path,
             api_key=api_key,  # None = auto-detect da env
         )
     except Exception as e:
         await update_critique_status_async(session_store, session_id, "failed", error=str(e))
         raise HTTPException(status_code=500, detail=f"Errore nella generazione della critica: {e}")
+    finally:
+        pdf_path.unlink(missing_ok=True)
 
     await update_critique_async(session_store, session_id, critique)
     await update_critique_status_async(session_store, session_id, "completed", error=None)
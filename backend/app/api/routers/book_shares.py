@@ -17,6 +17,7 @@ from app.agent.user_store import get_user_store
 from app.agent.session_store import get_session_store
 from app.agent.session_store_helpers import get_session_async, get_all_sessions_async
 from app.middleware.auth import get_current_user
+from app.services.stats_service import invalidate_library_cache
 
 
 router = APIRouter(prefix="/api/books", tags=["book-shares"])
@@ -439,6 +440,9 @@ async def update_share_status(
                 detail="Errore nell'aggiornamento della condivisione",
             )
         
+        # La libreria del destinatario include i libri condivisi accettati
+        invalidate_library_cache(current_user.id)
+        
         # Se accettata, crea notifica per l'owner originale
         if new_status == "accepted":
             await user_store.connect()
@@ -508,6 +512,9 @@ async def revoke_share(
                 detail="Condivisione non trovata o non autorizzata",
             )
         
+        # Il destinatario non è noto qui: invalida le librerie in cache di tutti gli utenti
+        invalidate_library_cache()
+        
         print(f"[BOOK SHARES API] Condivisione revocata: {share_id} da {current_user.id}", file=sys.stderr)
         
         return {"success": True, "message": "Condivisione revocata"}
@@ -1,7 +1,7 @@
 """Router per gli endpoint delle critiche letterarie."""
-import sys
+import logging
 from typing import Optional
-from fastapi import APIRouter, HTTPException, Depends, UploadFile, File, Form
+from fastapi import APIRouter, HTTPException, Depends, UploadFile, File, Form, Request
 from fastapi.responses import Response
 
 from app.models import LiteraryCritique
@@ -11,12 +11,102 @@ from app.agent.book_share_store import get_book_share_store
 from app.middleware.auth import get_current_user_optional
 from app.services.critique_service import (
     generate_critique_audio,
+    get_critique_audio_etag,
     analyze_pdf_from_bytes,
 )
 
+logger = logging.getLogger(__name__)
+
 router = APIRouter(prefix="/api/critique", tags=["critique"])
 
 
+async def _critique_audio_response(
+    session_id: str,
+    voice_name: Optional[str],
+    current_user,
+    if_none_match: Optional[str] = None,
+    conditional: bool = False,
+) -> Response:
+    """
+    Audio MP3 della critica come Response, dopo la verifica di accesso.
+    
+    Con conditional=True (solo GET) la risposta porta l'ETag e, se If-None-Match coincide,
+    è un 304 senza sintesi vocale.
+    """
+    session_store = get_session_store()
+    session = await get_session_async(session_store, session_id, user_id=None)
+    
+    if not session:
+        raise HTTPException(status_code=404, detail=f"Sessione {session_id} non trovata")
+    
+    # Verifica accesso: ownership o condivisione accettata
+    if current_user and session.user_id and session.user_id != current_user.id:
+        book_share_store = get_book_share_store()
+        has_access = await book_share_store.check_user_has_access(
+            book_session_id=session_id,
+            user_id=current_user.id,
+            owner_id=session.user_id,
+        )
+        if not has_access:
+            raise HTTPException(
+                status_code=403,
+                detail="Accesso negato: questa sessione appartiene a un altro utente o non hai accesso"
+            )
+    
+    cache_headers = {"Cache-Control": "public, max-age=3600"}
+    if conditional and session.literary_critique:
+        # ETag derivato da SSML + voce: la revalidazione non richiede la sintesi vocale.
+        # L'audio dipende dall'utente che ha accesso: cache solo nel browser
+        critique = session.literary_critique
+        if isinstance(critique, dict):
+            critique = LiteraryCritique(**critique)
+        etag = get_critique_audio_etag(critique, voice_name)
+        if etag:
+            cache_headers = {"Cache-Control": "private, max-age=3600", "ETag": etag}
+            if if_none_match == etag:
+                return Response(status_code=304, headers=cache_headers)
+    
+    audio_content = await generate_critique_audio(session_id, voice_name)
+    
+    return Response(
+        content=audio_content,
+        media_type="audio/mpeg",
+        headers={
+            "Content-Disposition": f'attachment; filename="critique_{session_id}.mp3"',
+            **cache_headers,
+        }
+    )
+
+
+@router.get("/audio/{session_id}")
+async def get_critique_audio_endpoint(
+    session_id: str,
+    request: Request,
+    voice_name: Optional[str] = None,
+    current_user = Depends(get_current_user_optional),
+):
+    """
+    Restituisce l'audio MP3 della critica letteraria (Google Cloud Text-to-Speech).
+    Supporta If-None-Match: se l'ETag coincide risponde 304 senza sintetizzare l'audio.
+    """
+    try:
+        return await _critique_audio_response(
+            session_id,
+            voice_name,
+            current_user,
+            if_none_match=request.headers.get("If-None-Match"),
+            conditional=True,
+        )
+    except HTTPException:
+        raise
+    except Exception as e:
+        logger.exception("[CRITIQUE AUDIO] Errore generico: %s", e)
+        raise HTTPException(
+            status_code=500,
+            detail=f"Errore nella generazione audio: {str(e)}"
+        )
+
+
 @router.post("/audio/{session_id}")
 async def generate_critique_audio_endpoint(
     session_id: str,
@@ -26,46 +116,14 @@ async def generate_critique_audio_endpoint(
     """
     Genera audio MP3 della critica letteraria usando Google Cloud Text-to-Speech.
     Restituisce un file MP3 che può essere riprodotto nel browser.
+    Non supporta richieste condizionali: per la revalidazione con ETag usare GET.
     """
     try:
-        session_store = get_session_store()
-        session = await get_session_async(session_store, session_id, user_id=None)
-        
-        if not session:
-            raise HTTPException(status_code=404, detail=f"Sessione {session_id} non trovata")
-        
-        # Verifica accesso: ownership o condivisione accettata
-        if current_user and session.user_id and session.user_id != current_user.id:
-            book_share_store = get_book_share_store()
-            await book_share_store.connect()
-            has_access = await book_share_store.check_user_has_access(
-                book_session_id=session_id,
-                user_id=current_user.id,
-                owner_id=session.user_id,
-            )
-            if not has_access:
-                raise HTTPException(
-                    status_code=403,
-                    detail="Accesso negato: questa sessione appartiene a un altro utente o non hai accesso"
-                )
-        
-        audio_content = await generate_critique_audio(session_id, voice_name)
-        
-        return Response(
-            content=audio_content,
-            media_type="audio/mpeg",
-            headers={
-                "Content-Disposition": f'attachment; filename="critique_{session_id}.mp3"',
-                "Cache-Control": "public, max-age=3600",
-            }
-        )
-        
+        return await _critique_audio_response(session_id, voice_name, current_user)
     except HTTPException:
         raise
     except Exception as e:
-        print(f"[CRITIQUE AUDIO] Errore generico: {e}", file=sys.stderr)
-        import traceback
-        traceback.print_exc()
+        logger.exception("[CRITIQUE AUDIO] Errore generico: %s", e)
         raise HTTPException(
             status_code=500,
             detail=f"Errore nella generazione audio: {str(e)}"
@@ -114,23 +172,21 @@ async def analyze_external_pdf(
         book_title = title or (file.filename and file.filename.replace(".pdf", "") or "Libro")
         book_author = author or "Autore Sconosciuto"
         
-        print(f"[EXTERNAL PDF CRITIQUE] Analisi PDF: {file.filename}, Titolo: {book_title}, Autore: {book_author}")
-        print(f"[EXTERNAL PDF CRITIQUE] Dimensione PDF: {len(pdf_bytes) / (1024 * 1024):.2f} MB")
+        logger.info("[EXTERNAL PDF CRITIQUE] Analisi PDF: %s, Titolo: %s, Autore: %s", file.filename, book_title, book_author)
+        logger.info("[EXTERNAL PDF CRITIQUE] Dimensione PDF: %.2f MB", len(pdf_bytes) / (1024 * 1024))
         
         # Genera la critica
         try:
-            print(f"[EXTERNAL PDF CRITIQUE] Avvio analisi con modello critico...")
+            logger.info("[EXTERNAL PDF CRITIQUE] Avvio analisi con modello critico...")
             critique_dict, token_usage = await analyze_pdf_from_bytes(
                 pdf_bytes=pdf_bytes,
                 title=book_title,
                 author=book_author,
             )
-            print(f"[EXTERNAL PDF CRITIQUE] Analisi modello completata")
-            print(f"[EXTERNAL PDF CRITIQUE] Token usage: {token_usage.get('input_tokens', 0)} input, {token_usage.get('output_tokens', 0)} output")
+            logger.info("[EXTERNAL PDF CRITIQUE] Analisi modello completata")
+            logger.info("[EXTERNAL PDF CRITIQUE] Token usage: %s input, %s output", token_usage.get('input_tokens', 0), token_usage.get('output_tokens', 0))
         except Exception as critique_error:
-            print(f"[EXTERNAL PDF CRITIQUE] ERRORE durante analisi modello: {critique_error}")
-            import traceback
-            traceback.print_exc()
+            logger.exception("[EXTERNAL PDF CRITIQUE] ERRORE durante analisi modello: %s", critique_error)
             raise HTTPException(
                 status_code=500,
                 detail=f"Errore durante l'analisi del PDF da parte del modello: {str(critique_error)}"
@@ -144,9 +200,9 @@ async def analyze_external_pdf(
                 cons=critique_dict.get("cons", []) if isinstance(critique_dict, dict) else critique_dict.cons,
                 summary=critique_dict.get("summary", "") if isinstance(critique_dict, dict) else critique_dict.summary,
             )
-            print(f"[EXTERNAL PDF CRITIQUE] Analisi completata: score={critique.score}")
+            logger.info("[EXTERNAL PDF CRITIQUE] Analisi completata: score=%s", critique.score)
         except Exception as validation_error:
-            print(f"[EXTERNAL PDF CRITIQUE] ERRORE nella validazione risposta: {validation_error}")
+            logger.error("[EXTERNAL PDF CRITIQUE] ERRORE nella validazione risposta: %s", validation_error)
             raise HTTPException(
                 status_code=500,
                 detail=f"Errore nella validazione della risposta del critico: {str(validation_error)}"
@@ -157,9 +213,7 @@ async def analyze_external_pdf(
     except HTTPException:
         raise
     except Exception as e:
-        print(f"[EXTERNAL PDF CRITIQUE] Errore nell'analisi: {e}")
-        import traceback
-        traceback.print_exc()
+        logger.exception("[EXTERNAL PDF CRITIQUE] Errore nell'analisi: %s", e)
         raise HTTPException(
             status_code=500,
             detail=f"Errore nell'analisi del PDF: {str(e)}"
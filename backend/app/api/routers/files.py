@@ -1,9 +1,8 @@
 """Router per l'accesso ai file (PDF libri e cover images)."""
-from pathlib import Path
 from fastapi import APIRouter, HTTPException
 from fastapi.responses import FileResponse, RedirectResponse
 
-from app.services.storage_service import get_storage_service
+from app.services.storage_service import get_storage_service, BOOKS_DIR, COVERS_DIR
 
 router = APIRouter(prefix="/api/files", tags=["files"])
 
@@ -35,9 +34,9 @@ async def get_file_endpoint(tipo: str, filename: str):
         else:
             # Fallback locale
             if tipo == "books":
-                local_path = Path(__file__).parent.parent.parent / "books" / filename
+                local_path = BOOKS_DIR / filename
             else:  # covers
-                local_path = Path(__file__).parent.parent.parent / "sessions" / filename
+                local_path = COVERS_DIR / filename
             
             if not local_path.exists():
                 raise HTTPException(
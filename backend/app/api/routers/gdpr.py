@@ -18,7 +18,7 @@ from app.agent.notification_store import get_notification_store
 from app.agent.connection_store import get_connection_store
 from app.agent.book_share_store import get_book_share_store
 from app.agent.referral_store import get_referral_store
-from app.middleware.auth import get_current_user, delete_session
+from app.middleware.auth import get_current_user, delete_session, invalidate_cached_auth_user
 from app.services.storage_service import get_storage_service
 
 
@@ -340,6 +340,7 @@ async def delete_account(
         
         # 6. Elimina account utente
         await user_store.delete_user(user_id)
+        invalidate_cached_auth_user(user_id)
         print(f"[GDPR] Account eliminato per utente {user_email}", file=sys.stderr)
         
         # Audit log cancellazione account
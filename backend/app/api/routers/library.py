@@ -1,13 +1,20 @@
 """Router per gli endpoint della libreria."""
+import logging
 import os
-import sys
-import math
+import re
+import stat
+import json
+import asyncio
+import functools
+import base64
+import binascii
 from pathlib import Path
-from typing import Optional
-from fastapi import APIRouter, HTTPException, BackgroundTasks, Depends
-from fastapi.responses import Response, FileResponse, RedirectResponse
+from typing import Optional, Any, Callable
+from fastapi import APIRouter, HTTPException, Depends
+from fastapi.responses import FileResponse, RedirectResponse, Response, StreamingResponse
 
 from app.models import (
+    LibraryEntry,
     LibraryResponse,
     LibraryStats,
     AdvancedStats,
@@ -16,14 +23,24 @@ from app.models import (
 from app.agent.session_store import get_session_store
 from app.agent.session_store_helpers import (
     get_all_sessions_async,
+    get_obsolete_sessions_async,
     get_session_async,
+    get_sessions_bulk_async,
     delete_session_async,
-    update_writing_progress_async,
+    delete_sessions_async,
     update_cover_image_path_async,
 )
+from app.agent.book_share_store import get_book_share_store
+from app.agent.user_store import get_user_store
 from app.agent.cover_generator import generate_book_cover
 from app.middleware.auth import get_current_user_optional, require_admin
-from app.services.storage_service import get_storage_service
+from app.services.storage_service import get_storage_service, existing_local_paths, remove_local_file, BOOKS_DIR
+from app.services.pdf_service import (
+    get_expected_pdf_filename,
+    index_local_pdfs,
+    locate_pdf_for_session,
+    find_local_pdf,
+)
 from app.services.stats_service import (
     get_cached_stats,
     set_cached_stats,
@@ -32,94 +49,96 @@ from app.services.stats_service import (
     calculate_library_stats,
     calculate_advanced_stats,
     scan_pdf_directory,
-    calculate_page_count,
-    get_model_abbreviation,
+    get_library_cache_key,
+    get_cached_library,
+    get_cached_library_stats,
+    set_cached_library_stats,
+    get_library_data_version,
+    set_cached_library,
     llm_model_to_mode,
     mode_to_llm_models,
     LIBRARY_ENTRY_FIELDS,
 )
-from app.core.config import get_app_config
+
+logger = logging.getLogger(__name__)
 
 router = APIRouter(prefix="/api/library", tags=["library"])
 
 
+# Parole chiave del plot usate per il riassunto della copertina: (categoria, etichetta, parole cercate).
+# Le parole sono cercate come sottostringhe del plot in minuscolo
+_COVER_PLOT_TAGS = [
+    ("places", "villa", ("villa",)),
+    ("places", "Vienna", ("vienna",)),
+    ("places", "New York", ("new york", "newyork")),
+    ("places", "Roma", ("roma",)),
+    ("places", "Parigi", ("parigi", "paris")),
+    ("places", "costa ligure", ("ligure", "liguria")),
+    ("atmosphere", "estate", ("estate",)),
+    ("atmosphere", "neve", ("neve",)),
+    ("atmosphere", "mare", ("mare",)),
+    ("atmosphere", "caldo opprimente", ("caldo",)),
+    ("atmosphere", "luce del tramonto", ("luce", "tramonto")),
+    ("themes", "architettura", ("architettura",)),
+    ("themes", "musica", ("musica", "violoncello")),
+    ("themes", "tempo e memoria", ("tempo", "memoria")),
+    ("themes", "spazio", ("spazio",)),
+    ("visual_elements", "serra", ("serra",)),
+    ("visual_elements", "giardino", ("giardino",)),
+    ("visual_elements", "stanza", ("stanza", "camera")),
+]
+# Etichette massime per categoria nel riassunto della copertina
+_COVER_TAGS_PER_CATEGORY = 3
+# Fallback senza parole chiave: prime frasi del plot, escluse quelle con parole da evitare in copertina
+_COVER_SENTENCE_SPLIT_RE = re.compile(r'[.!?]')
+_COVER_FALLBACK_SENTENCES = 3
+_COVER_UNSAFE_WORDS = ('amore', 'bacio', 'corpo', 'intim', 'fisic', 'nud')
+
+
 def sanitize_plot_for_cover(plot: str) -> str:
     """Sanitizza il plot creando un riassunto molto generico con solo elementi atmosferici e visivi."""
     if not plot:
         return ""
     
-    import re
-    
     plot_lower = plot.lower()
     
-    places = []
-    if 'villa' in plot_lower:
-        places.append('villa')
-    if 'vienna' in plot_lower:
-        places.append('Vienna')
-    if 'new york' in plot_lower or 'newyork' in plot_lower:
-        places.append('New York')
-    if 'roma' in plot_lower:
-        places.append('Roma')
-    if 'parigi' in plot_lower or 'paris' in plot_lower:
-        places.append('Parigi')
-    if 'ligure' in plot_lower or 'liguria' in plot_lower:
-        places.append('costa ligure')
-    
-    atmosphere = []
-    if 'estate' in plot_lower:
-        atmosphere.append('estate')
-    if 'neve' in plot_lower:
-        atmosphere.append('neve')
-    if 'mare' in plot_lower:
-        atmosphere.append('mare')
-    if 'caldo' in plot_lower:
-        atmosphere.append('caldo opprimente')
-    if 'luce' in plot_lower or 'tramonto' in plot_lower:
-        atmosphere.append('luce del tramonto')
-    
-    themes = []
-    if 'architettura' in plot_lower:
-        themes.append('architettura')
-    if 'musica' in plot_lower or 'violoncello' in plot_lower:
-        themes.append('musica')
-    if 'tempo' in plot_lower or 'memoria' in plot_lower:
-        themes.append('tempo e memoria')
-    if 'spazio' in plot_lower:
-        themes.append('spazio')
-    
-    visual_elements = []
-    if 'serra' in plot_lower:
-        visual_elements.append('serra')
-    if 'giardino' in plot_lower:
-        visual_elements.append('giardino')
-    if 'stanza' in plot_lower or 'camera' in plot_lower:
-        visual_elements.append('stanza')
+    # Una sola passata sulla tabella: ogni etichetta compare al massimo una volta, nell'ordine della tabella.
+    # Una categoria già piena non viene più cercata nel plot (le etichette in eccesso verrebbero scartate)
+    tags_by_category = {"places": [], "atmosphere": [], "themes": [], "visual_elements": []}
+    for category, label, words in _COVER_PLOT_TAGS:
+        tags = tags_by_category[category]
+        if len(tags) < _COVER_TAGS_PER_CATEGORY and any(word in plot_lower for word in words):
+            tags.append(label)
+    places = tags_by_category["places"]
+    atmosphere = tags_by_category["atmosphere"]
+    themes = tags_by_category["themes"]
+    visual_elements = tags_by_category["visual_elements"]
     
     sanitized_parts = []
     
     if places:
-        sanitized_parts.append(f"Ambientato in {', '.join(set(places[:3]))}")
+        sanitized_parts.append(f"Ambientato in {', '.join(places)}")
     
     if atmosphere:
-        sanitized_parts.append(f"Atmosfera: {', '.join(set(atmosphere[:3]))}")
+        sanitized_parts.append(f"Atmosfera: {', '.join(atmosphere)}")
     
     if themes:
-        sanitized_parts.append(f"Temi: {', '.join(set(themes[:3]))}")
+        sanitized_parts.append(f"Temi: {', '.join(themes)}")
     
     if visual_elements:
-        sanitized_parts.append(f"Elementi visivi: {', '.join(set(visual_elements[:3]))}")
+        sanitized_parts.append(f"Elementi visivi: {', '.join(visual_elements)}")
     
     if sanitized_parts:
         sanitized = "Romanzo " + ". ".join(sanitized_parts) + "."
     else:
-        sentences = re.split(r'[.!?]', plot)
+        # maxsplit: servono solo le prime frasi, il resto del plot non viene diviso
+        sentences = _COVER_SENTENCE_SPLIT_RE.split(plot, maxsplit=_COVER_FALLBACK_SENTENCES)
         first_safe_sentences = []
-        for sent in sentences[:3]:
+        for sent in sentences[:_COVER_FALLBACK_SENTENCES]:
             sent_clean = sent.strip()
             if len(sent_clean) > 20 and len(sent_clean) < 200:
                 sent_lower = sent_clean.lower()
-                if not any(word in sent_lower for word in ['amore', 'bacio', 'corpo', 'intim', 'fisic', 'nud']):
+                if not any(word in sent_lower for word in _COVER_UNSAFE_WORDS):
                     first_safe_sentences.append(sent_clean)
         if first_safe_sentences:
             sanitized = ". ".join(first_safe_sentences) + "."
@@ -132,6 +151,194 @@ def sanitize_plot_for_cover(plot: str) -> str:
     return sanitized
 
 
+# Chiavi di ordinamento della libreria: sort_by -> (chiave asc, chiave desc dedicata o None).
+# Le chiavi sono valori JSON-serializzabili (date come timestamp) così da poter essere salvate
+# nel cursore di paginazione. Costo e pagine hanno una chiave desc con il segno già invertito,
+# così i None restano in fondo in entrambi i versi; le altre chiavi usano reverse.
+_LIBRARY_SORT_KEYS: dict[str, tuple[Callable[[LibraryEntry], Any], Optional[Callable[[LibraryEntry], Any]]]] = {
+    "title": (lambda e: e.title.lower(), None),
+    "score": (lambda e: e.critique_score or 0, None),
+    "cost": (
+        lambda e: (e.estimated_cost is None, e.estimated_cost or float('inf')),
+        lambda e: (e.estimated_cost is None, -(e.estimated_cost or float('inf'))),
+    ),
+    "total_pages": (
+        lambda e: (e.total_pages is None, e.total_pages or float('inf')),
+        lambda e: (e.total_pages is None, -(e.total_pages or 0)),
+    ),
+    "updated_at": (lambda e: e.updated_at.timestamp(), None),
+    "created_at": (lambda e: e.created_at.timestamp(), None),
+}
+
+
+def _library_sort_name(sort_by: Optional[str]) -> str:
+    """Ordinamento effettivo della libreria: sort_by se supportato, altrimenti created_at."""
+    return sort_by if sort_by in _LIBRARY_SORT_KEYS else "created_at"
+
+
+def _library_sort_spec(sort_by: Optional[str], sort_order: Optional[str]) -> tuple[Callable[[LibraryEntry], Any], bool]:
+    """Restituisce (chiave di ordinamento, reverse) per la libreria; default created_at."""
+    asc_key, desc_key = _LIBRARY_SORT_KEYS[_library_sort_name(sort_by)]
+    if sort_order != "desc":
+        return asc_key, False
+    if desc_key is not None:
+        return desc_key, False
+    return asc_key, True
+
+
+# Oltre questa soglia il sort della libreria viene eseguito in un thread
+_LIBRARY_THREAD_SORT_THRESHOLD = 1000
+
+
+def _library_sort_order(sort_order: Optional[str]) -> str:
+    """Verso effettivo dell'ordinamento della libreria (asc se non è desc)."""
+    return "desc" if sort_order == "desc" else "asc"
+
+
+def _is_cursor_number(value: Any) -> bool:
+    """Valore numerico di un cursore (i bool di JSON non valgono come numeri)."""
+    return isinstance(value, (int, float)) and not isinstance(value, bool)
+
+
+def _is_valid_cursor_sort_value(sort_name: str, sort_value: Any) -> bool:
+    """Verifica che il valore di ordinamento del cursore abbia il tipo prodotto dalla chiave di sort_name."""
+    if sort_name == "title":
+        return isinstance(sort_value, str)
+    if sort_name in ("cost", "total_pages"):
+        # (valore mancante, numero): vedi _LIBRARY_SORT_KEYS
+        return (
+            isinstance(sort_value, list) and len(sort_value) == 2
+            and isinstance(sort_value[0], bool) and _is_cursor_number(sort_value[1])
+        )
+    return _is_cursor_number(sort_value)
+
+
+def _encode_library_cursor(sort_by: Optional[str], sort_order: Optional[str], sort_value: Any, session_id: str) -> str:
+    """
+    Codifica il cursore di paginazione in base64 url-safe: ordinamento per cui è stato emesso,
+    valore di ordinamento dell'ultimo libro e session_id.
+    """
+    payload = json.dumps(
+        [_library_sort_name(sort_by), _library_sort_order(sort_order), sort_value, session_id],
+        separators=(",", ":"),
+    )
+    return base64.urlsafe_b64encode(payload.encode("utf-8")).decode("ascii")
+
+
+def _decode_library_cursor(cursor: str, sort_by: Optional[str], sort_order: Optional[str]) -> tuple[Any, str]:
+    """
+    Decodifica il cursore di paginazione per l'ordinamento richiesto.
+    Solleva HTTPException 400 se il cursore non è valido o è stato emesso per un altro ordinamento.
+    """
+    try:
+        cursor_sort_by, cursor_sort_order, sort_value, session_id = json.loads(
+            base64.urlsafe_b64decode(cursor.encode("ascii"))
+        )
+    except (ValueError, TypeError, binascii.Error):
+        raise HTTPException(status_code=400, detail="Cursore di paginazione non valido")
+    
+    sort_name = _library_sort_name(sort_by)
+    if (cursor_sort_by, cursor_sort_order) != (sort_name, _library_sort_order(sort_order)):
+        raise HTTPException(
+            status_code=400,
+            detail="Cursore di paginazione non valido per l'ordinamento richiesto"
+        )
+    if not isinstance(session_id, str) or not _is_valid_cursor_sort_value(sort_name, sort_value):
+        raise HTTPException(status_code=400, detail="Cursore di paginazione non valido")
+    
+    if isinstance(sort_value, list):
+        sort_value = tuple(sort_value)
+    return sort_value, session_id
+
+
+async def _load_shared_library_entries(
+    session_store,
+    user_id: str,
+    status: Optional[str],
+    genre: Optional[str],
+    filter_llm_models: Optional[list[str]],
+    search: Optional[str],
+) -> list[LibraryEntry]:
+    """
+    Carica i libri completati condivisi con l'utente (condivisioni accettate) come LibraryEntry,
+    applicando gli stessi filtri della libreria. Indipendente dal caricamento dei libri propri,
+    così l'endpoint può eseguire i due caricamenti in parallelo.
+    """
+    shared_entries = []
+    try:
+        book_share_store = get_book_share_store()
+        user_store_shared = get_user_store()
+        await book_share_store.connect()
+        shared_books = await book_share_store.get_user_shared_books(
+            user_id=user_id,
+            status="accepted",
+            limit=100,
+            skip=0,
+        )
+        
+        await user_store_shared.connect()
+        # Libri condivisi e proprietari: una query ($in) ciascuno, eseguite in parallelo
+        shared_sessions, owners = await asyncio.gather(
+            get_sessions_bulk_async(
+                session_store,
+                [share.book_session_id for share in shared_books],
+                user_id=None,
+                fields=LIBRARY_ENTRY_FIELDS,
+            ),
+            user_store_shared.get_users_by_ids(list({share.owner_id for share in shared_books})),
+        )
+        for share in shared_books:
+            try:
+                shared_session = shared_sessions.get(share.book_session_id)
+                
+                if not shared_session:
+                    continue
+                
+                if not shared_session.writing_progress or not shared_session.writing_progress.get('is_complete', False):
+                    continue
+                
+                # Applica filtri anche ai libri condivisi
+                if status and status != "all":
+                    session_status = shared_session.get_status()
+                    if session_status != status:
+                        continue
+                
+                if genre and shared_session.form_data:
+                    if shared_session.form_data.genre != genre:
+                        continue
+                
+                if filter_llm_models is not None:
+                    if not filter_llm_models:
+                        continue
+                    if shared_session.form_data and shared_session.form_data.llm_model not in filter_llm_models:
+                        continue
+                
+                shared_entry = session_to_library_entry(shared_session, skip_cost_calculation=True)
+                
+                # La ricerca sui libri propri è già nella query; sui condivisi (pochi) resta in Python
+                if search:
+                    search_lower = search.lower()
+                    if search_lower not in shared_entry.title.lower() and search_lower not in (shared_entry.author or "").lower():
+                        continue
+                
+                owner = owners.get(share.owner_id)
+                
+                # Entry immutabile: copia con i soli campi della condivisione (senza rivalidare)
+                shared_entry = shared_entry.model_copy(update={
+                    "is_shared": True,
+                    "shared_by_id": share.owner_id,
+                    "shared_by_name": owner.name if owner else None,
+                })
+                
+                shared_entries.append(shared_entry)
+            except Exception as e:
+                logger.warning("[LIBRARY] Errore nel processare libro condiviso %s: %s", share.book_session_id, e)
+                continue
+    except Exception as e:
+        logger.error("[LIBRARY] Errore nel recupero libri condivisi: %s", e)
+    return shared_entries
+
+
 @router.get("", response_model=LibraryResponse)
 async def get_library_endpoint(
     status: Optional[str] = None,
@@ -143,322 +350,226 @@ async def get_library_endpoint(
     sort_order: Optional[str] = "desc",
     skip: int = 0,
     limit: int = 20,
+    cursor: Optional[str] = None,
     current_user = Depends(get_current_user_optional),
-    background_tasks: BackgroundTasks = BackgroundTasks(),
 ):
-    """Restituisce la lista dei libri nella libreria con filtri opzionali e paginazione."""
+    """
+    Restituisce la lista dei libri nella libreria con filtri opzionali e paginazione.
+    
+    La paginazione usa il cursore restituito in next_cursor (valore di ordinamento +
+    session_id come tiebreaker), stabile anche se nel frattempo vengono aggiunti libri.
+    skip è deprecato e resta solo per retrocompatibilità quando cursor non è fornito.
+    """
     try:
         session_store = get_session_store()
         user_id = current_user.id if current_user else None
+        cursor_key = None
+        if cursor:
+            cursor_key = _decode_library_cursor(cursor, sort_by, sort_order)
+        
+        # Cache breve per utente + filtri (le ricerche testuali libere non vengono memorizzate)
+        library_cache_key = None
+        if not search:
+            library_cache_key = get_library_cache_key(
+                user_id, status=status, mode=mode, llm_model=llm_model, genre=genre,
+                sort_by=sort_by, sort_order=sort_order, skip=skip, limit=limit, cursor=cursor,
+            )
+            cached_body = get_cached_library(library_cache_key)
+            if cached_body is not None:
+                return Response(content=cached_body, media_type="application/json")
         
-        # Determina il filtro per modello
-        filter_llm_model = None
+        # Determina il filtro per modello: una modalità (o il modello richiesto) diventa
+        # la lista dei modelli corrispondenti, filtrata con $in direttamente nella query
+        filter_llm_models = None
         if mode:
-            models_for_mode = mode_to_llm_models(mode)
-            if models_for_mode:
-                filter_llm_model = None  # Filtriamo dopo
-            else:
-                filter_llm_model = None
+            filter_llm_models = list(mode_to_llm_models(mode))
         elif llm_model:
-            detected_mode = llm_model_to_mode(llm_model)
-            models_for_mode = mode_to_llm_models(detected_mode)
-            if models_for_mode:
-                filter_llm_model = None
-            else:
-                filter_llm_model = llm_model
+            models_for_mode = mode_to_llm_models(llm_model_to_mode(llm_model))
+            filter_llm_models = list(models_for_mode) or [llm_model]
         
         # Filtri vengono applicati nella query MongoDB
-        all_sessions = await get_all_sessions_async(
+        owned_sessions_load = get_all_sessions_async(
             session_store, 
             user_id=user_id, 
             fields=LIBRARY_ENTRY_FIELDS,
             status=status,
-            llm_model=filter_llm_model,
-            genre=genre
+            genre=genre,
+            llm_models=filter_llm_models,
+            search=search,
+            sort_by=sort_by,
+            sort_order=sort_order,
         )
         
-        # Filtra per modalità se necessario
-        if mode:
-            models_for_mode = mode_to_llm_models(mode)
-            if models_for_mode:
-                all_sessions = {
-                    sid: sess for sid, sess in all_sessions.items()
-                    if sess.form_data and sess.form_data.llm_model in models_for_mode
-                }
-            else:
-                all_sessions = {}
-        elif llm_model and not filter_llm_model:
-            detected_mode = llm_model_to_mode(llm_model)
-            models_for_mode = mode_to_llm_models(detected_mode)
-            if models_for_mode:
-                all_sessions = {
-                    sid: sess for sid, sess in all_sessions.items()
-                    if sess.form_data and sess.form_data.llm_model in models_for_mode
-                }
+        # Libri propri e libri condivisi (se autenticato) sono indipendenti: caricati in parallelo
+        if current_user and user_id:
+            all_sessions, shared_entries = await asyncio.gather(
+                owned_sessions_load,
+                _load_shared_library_entries(session_store, user_id, status, genre, filter_llm_models, search),
+            )
+        else:
+            all_sessions = await owned_sessions_load
+            shared_entries = []
         
-        # Converti tutte le sessioni in LibraryEntry
+        # Converti tutte le sessioni in LibraryEntry: total_pages e conteggio capitoli sono
+        # pre-calcolati al completamento della scrittura (libri vecchi: scripts/migrate_library_performance.py)
         entries = []
-        sessions_to_backfill = []
+        missing_pages_count = 0
         
         for session in all_sessions.values():
             try:
                 entry = session_to_library_entry(session)
-                
-                # Backfill solo per total_pages mancanti (il costo reale viene dalla sessione)
                 if entry.status == "complete" and entry.total_pages is None:
-                    try:
-                        full_session = await get_session_async(session_store, session.session_id, user_id=user_id)
-                        if full_session and full_session.book_chapters:
-                            chapters_pages = sum(calculate_page_count(ch.get('content', '')) for ch in full_session.book_chapters)
-                            cover_pages = 1
-                            app_config = get_app_config()
-                            toc_chapters_per_page = app_config.get("validation", {}).get("toc_chapters_per_page", 30)
-                            toc_pages = math.ceil(len(full_session.book_chapters) / toc_chapters_per_page)
-                            calculated_pages = chapters_pages + cover_pages + toc_pages
-                            calculated_chapters_count = len(full_session.book_chapters)
-                            
-                            entry.total_pages = calculated_pages
-                            sessions_to_backfill.append((session.session_id, calculated_pages, calculated_chapters_count))
-                    except Exception as e:
-                        print(f"[LIBRARY] Errore nel caricare sessione completa per backfill {session.session_id}: {e}")
-                
+                    missing_pages_count += 1
                 entries.append(entry)
             except Exception as e:
-                print(f"[LIBRARY] Errore nel convertire sessione {session.session_id}: {e}")
+                logger.warning("[LIBRARY] Errore nel convertire sessione %s: %s", session.session_id, e)
                 continue
         
-        # Salva dati backfillati in background (solo total_pages)
-        if sessions_to_backfill:
-            async def backfill_library_data():
-                """Salva total_pages calcolati in background."""
-                store = get_session_store()
-                uid = user_id
-                
-                for session_id, total_pages, completed_chapters_count in sessions_to_backfill:
-                    try:
-                        full_session = await get_session_async(store, session_id, user_id=uid)
-                        if full_session and full_session.writing_progress:
-                            current_step = full_session.writing_progress.get('current_step', 0)
-                            total_steps = full_session.writing_progress.get('total_steps', 0)
-                            current_section_name = full_session.writing_progress.get('current_section_name')
-                            is_complete = full_session.writing_progress.get('is_complete', False)
-                            is_paused = full_session.writing_progress.get('is_paused', False)
-                            error = full_session.writing_progress.get('error')
-                            final_chapters_count = completed_chapters_count if completed_chapters_count is not None else full_session.writing_progress.get('completed_chapters_count')
-                            
-                            await update_writing_progress_async(
-                                store,
-                                session_id,
-                                current_step=current_step,
-                                total_steps=total_steps,
-                                current_section_name=current_section_name,
-                                is_complete=is_complete,
-                                is_paused=is_paused,
-                                error=error,
-                                total_pages=total_pages,
-                                completed_chapters_count=final_chapters_count,
-                            )
-                    except Exception as e:
-                        print(f"[LIBRARY] Errore nel backfill per sessione {session_id}: {e}")
-                
-                # Invalida cache stats dopo il backfill
-                invalidate_cache("library_stats")
-                invalidate_cache("library_stats_advanced")
-            
-            background_tasks.add_task(backfill_library_data)
+        if missing_pages_count:
+            logger.warning("[LIBRARY] %s libri completati senza total_pages: eseguire scripts/migrate_library_performance.py", missing_pages_count)
         
-        # Recupera anche libri condivisi con l'utente (se autenticato)
-        shared_entries = []
-        if current_user and user_id:
-            from app.agent.book_share_store import get_book_share_store
-            from app.agent.user_store import get_user_store
-            book_share_store = get_book_share_store()
-            user_store_shared = get_user_store()
-            
-            try:
-                await book_share_store.connect()
-                shared_books = await book_share_store.get_user_shared_books(
+        # Combina libri propri e condivisi (filtri già applicati nella query MongoDB)
+        filtered_entries = entries + shared_entries
+        
+        # Ordina (session_id come tiebreaker: ordine totale, necessario per il cursore).
+        # I libri propri arrivano già ordinati da MongoDB, quindi il sort in Python si riduce
+        # a fondere le run già ordinate; serve per i condivisi e per i None in fondo su costo e pagine
+        sort_key, reverse_order = _library_sort_spec(sort_by, sort_order)
+        sort_entries = functools.partial(
+            filtered_entries.sort, key=lambda e: (sort_key(e), e.session_id), reverse=reverse_order
+        )
+        if len(filtered_entries) > _LIBRARY_THREAD_SORT_THRESHOLD:
+            # Librerie molto grandi: il sort non blocca l'event loop
+            await asyncio.to_thread(sort_entries)
+        else:
+            sort_entries()
+        
+        # Calcola statistiche solo sui libri propri: dipendono dai filtri ma non dalla ricerca
+        # testuale, dall'ordinamento e dalla paginazione, quindi restano valide per tutte le
+        # pagine e per tutte le ricerche finché i dati non cambiano
+        stats_filters = dict(status=status, genre=genre, llm_models=filter_llm_models)
+        stats = get_cached_library_stats(user_id, **stats_filters)
+        if stats is None:
+            stats_entries = entries
+            if search:
+                # La ricerca è già applicata nella query: per le statistiche servono i libri
+                # propri con i soli filtri strutturali
+                stats_sessions = await get_all_sessions_async(
+                    session_store,
                     user_id=user_id,
-                    status="accepted",
-                    limit=100,
-                    skip=0,
+                    fields=LIBRARY_ENTRY_FIELDS,
+                    status=status,
+                    genre=genre,
+                    llm_models=filter_llm_models,
                 )
-                
-                await user_store_shared.connect()
-                for share in shared_books:
+                stats_entries = []
+                for session in stats_sessions.values():
                     try:
-                        shared_session = await get_session_async(session_store, share.book_session_id, user_id=None)
-                        
-                        if not shared_session:
-                            continue
-                        
-                        if not shared_session.writing_progress or not shared_session.writing_progress.get('is_complete', False):
-                            continue
-                        
-                        # Applica filtri anche ai libri condivisi
-                        if status and status != "all":
-                            session_status = shared_session.get_status()
-                            if session_status != status:
-                                continue
-                        
-                        if genre and shared_session.form_data:
-                            if shared_session.form_data.genre != genre:
-                                continue
-                        
-                        if mode:
-                            models_for_mode = mode_to_llm_models(mode)
-                            if models_for_mode and shared_session.form_data:
-                                if shared_session.form_data.llm_model not in models_for_mode:
-                                    continue
-                            elif not models_for_mode:
-                                continue
-                        elif llm_model and not filter_llm_model:
-                            detected_mode = llm_model_to_mode(llm_model)
-                            models_for_mode = mode_to_llm_models(detected_mode)
-                            if models_for_mode and shared_session.form_data:
-                                if shared_session.form_data.llm_model not in models_for_mode:
-                                    continue
-                        
-                        shared_entry = session_to_library_entry(shared_session, skip_cost_calculation=True)
-                        
-                        owner = await user_store_shared.get_user_by_id(share.owner_id)
-                        
-                        from app.models import LibraryEntry
-                        shared_entry = LibraryEntry(
-                            session_id=shared_entry.session_id,
-                            title=shared_entry.title,
-                            author=shared_entry.author,
-                            llm_model=shared_entry.llm_model,
-                            genre=shared_entry.genre,
-                            created_at=shared_entry.created_at,
-                            updated_at=shared_entry.updated_at,
-                            status=shared_entry.status,
-                            total_chapters=shared_entry.total_chapters,
-                            completed_chapters=shared_entry.completed_chapters,
-                            total_pages=shared_entry.total_pages,
-                            critique_score=shared_entry.critique_score,
-                            critique_status=shared_entry.critique_status,
-                            pdf_path=shared_entry.pdf_path,
-                            pdf_filename=shared_entry.pdf_filename,
-                            pdf_url=shared_entry.pdf_url,
-                            cover_image_path=shared_entry.cover_image_path,
-                            cover_url=shared_entry.cover_url,
-                            writing_time_minutes=shared_entry.writing_time_minutes,
-                            estimated_cost=shared_entry.estimated_cost,
-                            is_shared=True,
-                            shared_by_id=share.owner_id,
-                            shared_by_name=owner.name if owner else None,
-                        )
-                        
-                        shared_entries.append(shared_entry)
+                        stats_entries.append(session_to_library_entry(session))
                     except Exception as e:
-                        print(f"[LIBRARY] Errore nel processare libro condiviso {share.book_session_id}: {e}")
-                        continue
-            except Exception as e:
-                print(f"[LIBRARY] Errore nel recupero libri condivisi: {e}")
-        
-        # Combina libri propri e condivisi
-        all_entries = entries + shared_entries
-        
-        # Filtri già applicati nella query MongoDB, manteniamo solo search
-        filtered_entries = all_entries
+                        logger.warning("[LIBRARY] Errore nel convertire sessione %s: %s", session.session_id, e)
+            # Aggregazione pure-Python: eseguita in un thread per non bloccare le altre richieste
+            stats = await asyncio.to_thread(calculate_library_stats, stats_entries)
+            set_cached_library_stats(stats, user_id, **stats_filters)
         
-        if search:
-            search_lower = search.lower()
-            filtered_entries = [
-                e for e in filtered_entries
-                if search_lower in e.title.lower() or search_lower in (e.author or "").lower()
-            ]
-        
-        # Ordina
-        reverse_order = sort_order == "desc"
-        if sort_by == "title":
-            filtered_entries.sort(key=lambda e: e.title.lower(), reverse=reverse_order)
-        elif sort_by == "score":
-            filtered_entries.sort(key=lambda e: e.critique_score or 0, reverse=reverse_order)
-        elif sort_by == "cost":
-            if reverse_order:
-                filtered_entries.sort(
-                    key=lambda e: (e.estimated_cost is None, -(e.estimated_cost or float('inf')))
-                )
-            else:
-                filtered_entries.sort(
-                    key=lambda e: (e.estimated_cost is None, e.estimated_cost or float('inf'))
-                )
-        elif sort_by == "total_pages":
+        # Applica paginazione DOPO l'ordinamento
+        total_filtered = len(filtered_entries)
+        if cursor_key is not None:
+            # Range pagination: riparte dal primo libro successivo all'ultimo già restituito
             if reverse_order:
-                filtered_entries.sort(
-                    key=lambda e: (e.total_pages is None, -(e.total_pages or 0))
-                )
+                page_source = [e for e in filtered_entries if (sort_key(e), e.session_id) < cursor_key]
             else:
-                filtered_entries.sort(
-                    key=lambda e: (e.total_pages is None, e.total_pages or float('inf'))
-                )
-        elif sort_by == "updated_at":
-            filtered_entries.sort(key=lambda e: e.updated_at, reverse=reverse_order)
-        else:  # created_at default
-            filtered_entries.sort(key=lambda e: e.created_at, reverse=reverse_order)
-        
-        # Calcola statistiche solo sui libri propri
-        stats = calculate_library_stats(entries)
+                page_source = [e for e in filtered_entries if (sort_key(e), e.session_id) > cursor_key]
+        else:
+            page_source = filtered_entries[skip:]
+        paginated_entries = page_source[:limit]
+        has_more = len(page_source) > limit
         
-        # Applica paginazione DOPO l'ordinamento
-        total_filtered = len(filtered_entries)
-        start_index = skip
-        end_index = skip + limit
-        paginated_entries = filtered_entries[start_index:end_index]
-        has_more = end_index < total_filtered
+        next_cursor = None
+        if has_more and paginated_entries:
+            last_entry = paginated_entries[-1]
+            next_cursor = _encode_library_cursor(sort_by, sort_order, sort_key(last_entry), last_entry.session_id)
         
-        return LibraryResponse(
+        library_response = LibraryResponse(
             books=paginated_entries,
             total=total_filtered,
             has_more=has_more,
             stats=stats,
+            next_cursor=next_cursor,
         )
+        # Serializzazione JSON nel core Rust di pydantic, una sola volta: in cache va il corpo
+        # già serializzato, così le risposte dalla cache non ripetono la codifica delle entry
+        body = library_response.model_dump_json()
+        if library_cache_key is not None:
+            set_cached_library(library_cache_key, body)
+        return Response(content=body, media_type="application/json")
     
+    except HTTPException:
+        raise
     except Exception as e:
-        print(f"[LIBRARY] Errore nel recupero libreria: {e}")
-        import traceback
-        traceback.print_exc()
+        logger.exception("[LIBRARY] Errore nel recupero libreria: %s", e)
         raise HTTPException(
             status_code=500,
             detail=f"Errore nel recupero della libreria: {str(e)}"
         )
 
 
+# Statistiche admin: un solo caricamento delle sessioni alimenta sia /stats sia /stats/advanced
+_ADMIN_STATS_FILTERS = dict(status=None, genre=None, llm_models=None)
+_ADVANCED_STATS_CACHE_KEY = "library_stats_advanced"
+_admin_stats_task: Optional["asyncio.Task[tuple[LibraryStats, AdvancedStats]]"] = None
+
+
+async def _compute_admin_stats() -> tuple[LibraryStats, AdvancedStats]:
+    """
+    Carica tutte le sessioni una sola volta e calcola entrambe le aggregazioni admin.
+    
+    Le due statistiche vengono salvate in cache insieme: la dashboard chiama /stats e
+    /stats/advanced in sequenza e la seconda richiesta trova già il risultato.
+    """
+    session_store = get_session_store()
+    all_sessions = await get_all_sessions_async(session_store, user_id=None, fields=LIBRARY_ENTRY_FIELDS)
+    
+    entries = []
+    for session in all_sessions.values():
+        try:
+            entries.append(session_to_library_entry(session))
+        except Exception as e:
+            logger.error("[LIBRARY STATS] Errore nel convertire sessione %s: %s", session.session_id, e)
+    
+    # Stessa voce di cache della libreria senza filtri e senza utente (dati globali)
+    # Aggregazioni pure-Python su tutte le sessioni: eseguite in un thread per non bloccare l'event loop
+    stats = await asyncio.to_thread(calculate_library_stats, entries)
+    set_cached_library_stats(stats, None, **_ADMIN_STATS_FILTERS)
+    advanced_stats = await asyncio.to_thread(calculate_advanced_stats, entries)
+    set_cached_stats(_ADVANCED_STATS_CACHE_KEY, advanced_stats)
+    return stats, advanced_stats
+
+
+async def _load_admin_stats() -> tuple[LibraryStats, AdvancedStats]:
+    """Calcola le statistiche admin condividendo il calcolo tra richieste concorrenti."""
+    global _admin_stats_task
+    if _admin_stats_task is None or _admin_stats_task.done():
+        _admin_stats_task = asyncio.ensure_future(_compute_admin_stats())
+    # shield: se un client si disconnette il calcolo continua per le altre richieste in attesa
+    return await asyncio.shield(_admin_stats_task)
+
+
 @router.get("/stats", response_model=LibraryStats)
 async def get_library_stats_endpoint(
     current_user = Depends(require_admin),
-    background_tasks: BackgroundTasks = BackgroundTasks(),
 ):
     """Restituisce statistiche aggregate della libreria (solo admin, dati globali)."""
     try:
-        cache_key = "library_stats"
-        cached = get_cached_stats(cache_key)
+        cached = get_cached_library_stats(None, **_ADMIN_STATS_FILTERS)
         if cached is not None:
             return cached
         
-        session_store = get_session_store()
-        all_sessions = await get_all_sessions_async(session_store, user_id=None, fields=LIBRARY_ENTRY_FIELDS)
-        
-        entries = []
-        
-        for session in all_sessions.values():
-            try:
-                entry = session_to_library_entry(session)
-                entries.append(entry)
-            except Exception as e:
-                print(f"[LIBRARY STATS] Errore nel convertire sessione {session.session_id}: {e}")
-                continue
-        
-        stats = calculate_library_stats(entries)
-        set_cached_stats(cache_key, stats)
+        stats, _ = await _load_admin_stats()
         return stats
     
     except Exception as e:
-        print(f"[LIBRARY STATS] Errore nel calcolo statistiche: {e}")
-        import traceback
-        traceback.print_exc()
+        logger.exception("[LIBRARY STATS] Errore nel calcolo statistiche: %s", e)
         raise HTTPException(
             status_code=500,
             detail=f"Errore nel calcolo delle statistiche: {str(e)}"
@@ -468,42 +579,53 @@ async def get_library_stats_endpoint(
 @router.get("/stats/advanced", response_model=AdvancedStats)
 async def get_advanced_stats_endpoint(
     current_user = Depends(require_admin),
-    background_tasks: BackgroundTasks = BackgroundTasks(),
 ):
     """Restituisce statistiche avanzate con analisi temporali e confronto modelli (solo admin, dati globali)."""
     try:
-        cache_key = "library_stats_advanced"
-        cached = get_cached_stats(cache_key)
+        cached = get_cached_stats(_ADVANCED_STATS_CACHE_KEY)
         if cached is not None:
             return cached
         
-        session_store = get_session_store()
-        all_sessions = await get_all_sessions_async(session_store, user_id=None, fields=LIBRARY_ENTRY_FIELDS)
-        
-        entries = []
-        
-        for session in all_sessions.values():
-            try:
-                entry = session_to_library_entry(session)
-                entries.append(entry)
-            except Exception as e:
-                print(f"[ADVANCED STATS] Errore nel convertire sessione {session.session_id}: {e}")
-                continue
-        
-        advanced_stats = calculate_advanced_stats(entries)
-        set_cached_stats(cache_key, advanced_stats)
+        _, advanced_stats = await _load_admin_stats()
         return advanced_stats
     
     except Exception as e:
-        print(f"[ADVANCED STATS] Errore nel calcolo statistiche avanzate: {e}")
-        import traceback
-        traceback.print_exc()
+        logger.exception("[ADVANCED STATS] Errore nel calcolo statistiche avanzate: %s", e)
         raise HTTPException(
             status_code=500,
             detail=f"Errore nel calcolo delle statistiche avanzate: {str(e)}"
         )
 
 
+def _delete_book_files(session) -> list[str]:
+    """
+    Elimina PDF locale e copertina di un libro (I/O bloccante: eseguita in un thread).
+    
+    Returns:
+        Descrizione dei file eliminati
+    """
+    deleted_files = []
+    try:
+        if session.get_status() == "complete" and BOOKS_DIR.exists():
+            expected_filename = get_expected_pdf_filename(session)
+            expected_path = os.path.join(str(BOOKS_DIR), expected_filename)
+            
+            if remove_local_file(expected_path):
+                deleted_files.append(f"PDF: {expected_filename}")
+            else:
+                pdf_path = find_local_pdf(BOOKS_DIR, session)
+                if pdf_path:
+                    deleted_files.append(f"PDF: {pdf_path.name}")
+                    pdf_path.unlink()
+        
+        cover_str = session.cover_image_path
+        if cover_str and remove_local_file(cover_str):
+            deleted_files.append(f"Copertina: {os.path.basename(cover_str)}")
+    except Exception as file_error:
+        logger.error("[LIBRARY DELETE] Errore nell'eliminazione file per %s: %s", session.session_id, file_error)
+    return deleted_files
+
+
 @router.delete("/{session_id}")
 async def delete_library_entry_endpoint(
     session_id: str,
@@ -529,7 +651,6 @@ async def delete_library_entry_endpoint(
             )
         
         # Elimina anche tutte le condivisioni correlate
-        from app.agent.book_share_store import get_book_share_store
         book_share_store = get_book_share_store()
         try:
             await book_share_store.connect()
@@ -538,42 +659,12 @@ async def delete_library_entry_endpoint(
                 owner_id=current_user.id if current_user else session.user_id,
             )
             if deleted_shares_count > 0:
-                print(f"[LIBRARY DELETE] Eliminate {deleted_shares_count} condivisioni per libro {session_id}", file=sys.stderr)
+                logger.info("[LIBRARY DELETE] Eliminate %s condivisioni per libro %s", deleted_shares_count, session_id)
         except Exception as e:
-            print(f"[LIBRARY DELETE] Avviso: errore nell'eliminazione condivisioni: {e}", file=sys.stderr)
+            logger.warning("[LIBRARY DELETE] Avviso: errore nell'eliminazione condivisioni: %s", e)
         
-        # Elimina file associati (PDF e copertina)
-        deleted_files = []
-        try:
-            books_dir = Path(__file__).parent.parent.parent / "books"
-            status = session.get_status()
-            if status == "complete" and books_dir.exists():
-                date_prefix = session.created_at.strftime("%Y-%m-%d")
-                model_abbrev = get_model_abbreviation(session.form_data.llm_model)
-                title_sanitized = "".join(c for c in (session.current_title or "Romanzo") if c.isalnum() or c in (' ', '-', '_')).rstrip()
-                title_sanitized = title_sanitized.replace(" ", "_")
-                if not title_sanitized:
-                    title_sanitized = f"Libro_{session.session_id[:8]}"
-                expected_filename = f"{date_prefix}_{model_abbrev}_{title_sanitized}.pdf"
-                expected_path = books_dir / expected_filename
-                
-                if expected_path.exists():
-                    expected_path.unlink()
-                    deleted_files.append(f"PDF: {expected_filename}")
-                else:
-                    for pdf_file in books_dir.glob("*.pdf"):
-                        if session.session_id[:8] in pdf_file.stem or (title_sanitized and title_sanitized.lower() in pdf_file.stem.lower()):
-                            deleted_files.append(f"PDF: {pdf_file.name}")
-                            pdf_file.unlink()
-                            break
-            
-            if session.cover_image_path:
-                cover_path = Path(session.cover_image_path)
-                if cover_path.exists():
-                    cover_path.unlink()
-                    deleted_files.append(f"Copertina: {cover_path.name}")
-        except Exception as file_error:
-            print(f"[LIBRARY DELETE] Errore nell'eliminazione file per {session_id}: {file_error}")
+        # Elimina file associati (PDF e copertina) senza bloccare l'event loop
+        deleted_files = await asyncio.to_thread(_delete_book_files, session)
         
         deleted = await delete_session_async(session_store, session_id)
         if deleted:
@@ -590,9 +681,7 @@ async def delete_library_entry_endpoint(
     except HTTPException:
         raise
     except Exception as e:
-        print(f"[LIBRARY DELETE] Errore nell'eliminazione: {e}")
-        import traceback
-        traceback.print_exc()
+        logger.exception("[LIBRARY DELETE] Errore nell'eliminazione: %s", e)
         raise HTTPException(
             status_code=500,
             detail=f"Errore nell'eliminazione del progetto: {str(e)}"
@@ -607,9 +696,7 @@ async def get_available_pdfs_endpoint():
         return pdf_entries
     
     except Exception as e:
-        print(f"[LIBRARY PDFS] Errore nello scan PDF: {e}")
-        import traceback
-        traceback.print_exc()
+        logger.exception("[LIBRARY PDFS] Errore nello scan PDF: %s", e)
         raise HTTPException(
             status_code=500,
             detail=f"Errore nel recupero dei PDF: {str(e)}"
@@ -634,9 +721,7 @@ async def get_cover_image_endpoint(
         
         # Verifica accesso: ownership o condivisione accettata
         if current_user and session.user_id and session.user_id != current_user.id:
-            from app.agent.book_share_store import get_book_share_store
             book_share_store = get_book_share_store()
-            await book_share_store.connect()
             has_access = await book_share_store.check_user_has_access(
                 book_session_id=session_id,
                 user_id=current_user.id,
@@ -665,20 +750,20 @@ async def get_cover_image_endpoint(
                 return RedirectResponse(url=signed_url)
             
             try:
-                cover_data = storage_service.download_file(cover_path_str)
-                if cover_data:
-                    suffix = Path(cover_path_str).suffix.lower()
-                    media_type = 'image/png' if suffix == '.png' else 'image/jpeg'
-                    return Response(content=cover_data, media_type=media_type)
+                # Immagine inviata a blocchi: in memoria c'è al più un blocco alla volta
+                cover_chunks = await asyncio.to_thread(storage_service.open_stream, cover_path_str)
+                suffix = Path(cover_path_str).suffix.lower()
+                media_type = 'image/png' if suffix == '.png' else 'image/jpeg'
+                return StreamingResponse(cover_chunks, media_type=media_type)
             except FileNotFoundError as download_err:
                 error_msg = str(download_err)
-                print(f"[COVER IMAGE] Errore download da GCS: {error_msg}")
+                logger.error("[COVER IMAGE] Errore download da GCS: %s", error_msg)
                 raise HTTPException(
                     status_code=404,
                     detail=error_msg
                 )
             except Exception as download_err:
-                print(f"[COVER IMAGE] Errore download da GCS: {download_err}")
+                logger.error("[COVER IMAGE] Errore download da GCS: %s", download_err)
                 raise HTTPException(
                     status_code=500,
                     detail=f"Errore nel recupero della copertina: {str(download_err)}"
@@ -703,9 +788,7 @@ async def get_cover_image_endpoint(
     except HTTPException:
         raise
     except Exception as e:
-        print(f"[COVER IMAGE] Errore nel recupero copertina: {e}")
-        import traceback
-        traceback.print_exc()
+        logger.exception("[COVER IMAGE] Errore nel recupero copertina: %s", e)
         raise HTTPException(
             status_code=500,
             detail=f"Errore nel recupero della copertina: {str(e)}"
@@ -749,11 +832,11 @@ async def regenerate_cover_endpoint(
                 detail="GOOGLE_API_KEY non configurata. Verifica il file .env nella root del progetto."
             )
         
-        print(f"[REGENERATE COVER] Avvio rigenerazione copertina per sessione {session_id}")
+        logger.info("[REGENERATE COVER] Avvio rigenerazione copertina per sessione %s", session_id)
         
         original_plot = session.current_draft or ""
         sanitized_plot = sanitize_plot_for_cover(original_plot)
-        print(f"[REGENERATE COVER] Plot sanitizzato: {len(original_plot)} -> {len(sanitized_plot)} caratteri")
+        logger.info("[REGENERATE COVER] Plot sanitizzato: %s -> %s caratteri", len(original_plot), len(sanitized_plot))
         
         cover_path = await generate_book_cover(
             session_id=session_id,
@@ -778,20 +861,18 @@ async def regenerate_cover_endpoint(
                 user_id=user_id,
             )
             await update_cover_image_path_async(session_store, session_id, gcs_path)
-            print(f"[REGENERATE COVER] Copertina rigenerata e caricata su GCS: {gcs_path}")
+            logger.info("[REGENERATE COVER] Copertina rigenerata e caricata su GCS: %s", gcs_path)
             return {"success": True, "cover_path": gcs_path}
         except Exception as e:
-            print(f"[REGENERATE COVER] ERRORE nel caricamento copertina su GCS: {e}, uso path locale")
+            logger.error("[REGENERATE COVER] ERRORE nel caricamento copertina su GCS: %s, uso path locale", e)
             await update_cover_image_path_async(session_store, session_id, str(cover_path))
-            print(f"[REGENERATE COVER] Copertina rigenerata con successo: {cover_path}")
+            logger.info("[REGENERATE COVER] Copertina rigenerata con successo: %s", cover_path)
             return {"success": True, "cover_path": str(cover_path)}
     
     except HTTPException:
         raise
     except Exception as e:
-        print(f"[REGENERATE COVER] Errore nella rigenerazione copertina: {e}")
-        import traceback
-        traceback.print_exc()
+        logger.exception("[REGENERATE COVER] Errore nella rigenerazione copertina: %s", e)
         raise HTTPException(
             status_code=500,
             detail=f"Errore nella rigenerazione della copertina: {str(e)}"
@@ -805,70 +886,98 @@ async def get_missing_covers_endpoint():
         session_store = get_session_store()
         all_sessions = await get_all_sessions_async(session_store)
         
-        missing_covers = []
+        complete_sessions = {
+            session_id: session for session_id, session in all_sessions.items()
+            if session.get_status() == "complete"
+        }
+        # Verifica delle copertine su disco in un thread, con un solo passaggio
+        existing_covers = await asyncio.to_thread(
+            existing_local_paths, [session.cover_image_path for session in complete_sessions.values()]
+        )
         
-        for session_id, session in all_sessions.items():
-            status = session.get_status()
-            if status == "complete":
-                has_cover = False
-                if session.cover_image_path:
-                    cover_path = Path(session.cover_image_path)
-                    if cover_path.exists():
-                        has_cover = True
-                
-                if not has_cover:
-                    entry = session_to_library_entry(session)
-                    missing_covers.append({
-                        "session_id": session_id,
-                        "title": entry.title,
-                        "author": entry.author,
-                        "created_at": entry.created_at.isoformat(),
-                    })
+        missing_covers = []
+        for session_id, session in complete_sessions.items():
+            if session.cover_image_path not in existing_covers:
+                entry = session_to_library_entry(session)
+                missing_covers.append({
+                    "session_id": session_id,
+                    "title": entry.title,
+                    "author": entry.author,
+                    "created_at": entry.created_at.isoformat(),
+                })
         
         return {"missing_covers": missing_covers, "count": len(missing_covers)}
     
     except Exception as e:
-        print(f"[MISSING COVERS] Errore nel recupero libri senza copertina: {e}")
-        import traceback
-        traceback.print_exc()
+        logger.exception("[MISSING COVERS] Errore nel recupero libri senza copertina: %s", e)
         raise HTTPException(
             status_code=500,
             detail=f"Errore nel recupero dei libri senza copertina: {str(e)}"
         )
 
 
+# Candidati alla pulizia calcolati dalla preview, riusati dalla conferma successiva.
+# Una sola voce, sovrascritta a ogni preview, insieme alla versione dei dati a cui è stata
+# calcolata: qualsiasi scrittura sulle sessioni la rende obsoleta
+_CLEANUP_CANDIDATES_CACHE_KEY = "admin_cleanup_candidates"
+_CLEANUP_CANDIDATES_TTL = 120  # secondi
+
+
+def _set_cached_cleanup_candidates(obsolete_books: list[dict]):
+    """Salva i candidati alla pulizia alla versione corrente dei dati (sostituisce la voce precedente)."""
+    set_cached_stats(
+        _CLEANUP_CANDIDATES_CACHE_KEY,
+        (get_library_data_version(None), obsolete_books),
+        ttl=_CLEANUP_CANDIDATES_TTL,
+    )
+
+
+def _get_cached_cleanup_candidates() -> Optional[list[dict]]:
+    """Candidati alla pulizia in cache, se calcolati alla versione corrente dei dati."""
+    cached = get_cached_stats(_CLEANUP_CANDIDATES_CACHE_KEY)
+    if cached is None:
+        return None
+    version, obsolete_books = cached
+    if version != get_library_data_version(None):
+        invalidate_cache(_CLEANUP_CANDIDATES_CACHE_KEY)
+        return None
+    return obsolete_books
+
+
+async def _find_obsolete_books(session_store) -> list[dict]:
+    """
+    Libri obsoleti (senza valutazione, o completati senza copertina) con i dati mostrati nella preview.
+    Il filtro è eseguito dallo store: qui si formattano solo le sessioni già selezionate.
+    """
+    obsolete_sessions = await get_obsolete_sessions_async(session_store, fields=LIBRARY_ENTRY_FIELDS)
+    obsolete_books = []
+    for session_id, session in obsolete_sessions.items():
+        try:
+            entry = session_to_library_entry(session)
+            obsolete_books.append({
+                "session_id": session_id,
+                "title": entry.title,
+                "author": entry.author,
+                "status": entry.status,
+                "created_at": entry.created_at.isoformat(),
+                "updated_at": entry.updated_at.isoformat(),
+                "has_pdf": entry.pdf_filename is not None,
+                "has_cover": session.cover_image_path is not None,
+                "has_score": entry.critique_score is not None,
+            })
+        except Exception as e:
+            logger.error("[CLEANUP] Errore nel processare sessione %s: %s", session_id, e)
+            continue
+    return obsolete_books
+
+
 @router.get("/cleanup/preview")
 async def preview_obsolete_books_endpoint():
     """Restituisce la lista dei libri obsoleti che verrebbero eliminati dalla pulizia."""
     try:
         session_store = get_session_store()
-        all_sessions = await get_all_sessions_async(session_store)
-        
-        obsolete_books = []
-        
-        for session_id, session in all_sessions.items():
-            try:
-                entry = session_to_library_entry(session)
-                is_obsolete = (
-                    entry.critique_score is None
-                    or 
-                    (entry.status == "complete" and not session.cover_image_path)
-                )
-                if is_obsolete:
-                    obsolete_books.append({
-                        "session_id": session_id,
-                        "title": entry.title,
-                        "author": entry.author,
-                        "status": entry.status,
-                        "created_at": entry.created_at.isoformat(),
-                        "updated_at": entry.updated_at.isoformat(),
-                        "has_pdf": entry.pdf_filename is not None,
-                        "has_cover": session.cover_image_path is not None,
-                        "has_score": entry.critique_score is not None,
-                    })
-            except Exception as e:
-                print(f"[CLEANUP PREVIEW] Errore nel processare sessione {session_id}: {e}")
-                continue
+        obsolete_books = await _find_obsolete_books(session_store)
+        _set_cached_cleanup_candidates(obsolete_books)
         
         return {
             "obsolete_books": obsolete_books,
@@ -876,97 +985,89 @@ async def preview_obsolete_books_endpoint():
         }
     
     except Exception as e:
-        print(f"[CLEANUP PREVIEW] Errore: {e}")
-        import traceback
-        traceback.print_exc()
+        logger.exception("[CLEANUP PREVIEW] Errore: %s", e)
         raise HTTPException(
             status_code=500,
             detail=f"Errore nella preview dei libri obsoleti: {str(e)}"
         )
 
 
+# Eliminazioni concorrenti massime durante la pulizia dei libri obsoleti
+_CLEANUP_CONCURRENCY = 16
+
+
+async def _delete_obsolete_book_files(
+    session,
+    title: str,
+    local_pdfs: dict[str, Path],
+    semaphore: asyncio.Semaphore,
+) -> tuple[int, list[str]]:
+    """
+    Elimina i file di un libro obsoleto (PDF e copertina).
+    
+    Returns:
+        Tupla (file eliminati, errori)
+    """
+    files_deleted = 0
+    async with semaphore:
+        try:
+            if session.get_status() == "complete" and local_pdfs:
+                pdf_name = locate_pdf_for_session(local_pdfs, session)
+                if pdf_name:
+                    # pop prima dell'await: nessun'altra eliminazione concorrente può abbinare lo stesso file
+                    await asyncio.to_thread(local_pdfs.pop(pdf_name).unlink)
+                    files_deleted += 1
+            
+            if session.cover_image_path:
+                if await asyncio.to_thread(remove_local_file, session.cover_image_path):
+                    files_deleted += 1
+        except Exception as file_error:
+            return files_deleted, [f"Errore eliminazione file per {title}: {file_error}"]
+    return files_deleted, []
+
+
 @router.post("/cleanup")
 async def cleanup_obsolete_books_endpoint():
     """Elimina automaticamente tutti i libri obsoleti dalla libreria."""
     try:
         session_store = get_session_store()
-        all_sessions = await get_all_sessions_async(session_store)
         
-        obsolete_session_ids = []
-        books_dir = Path(__file__).parent.parent.parent / "books"
+        # Riusa i candidati della preview appena mostrata se nel frattempo nessuna sessione è cambiata
+        obsolete_session_ids = _get_cached_cleanup_candidates()
+        if obsolete_session_ids is None:
+            obsolete_session_ids = await _find_obsolete_books(session_store)
         
-        for session_id, session in all_sessions.items():
-            try:
-                entry = session_to_library_entry(session)
-                is_obsolete = (
-                    entry.critique_score is None
-                    or 
-                    (entry.status == "complete" and not session.cover_image_path)
-                )
-                if is_obsolete:
-                    obsolete_session_ids.append({
-                        "session_id": session_id,
-                        "title": entry.title,
-                        "status": entry.status,
-                        "has_pdf": entry.pdf_filename is not None,
-                        "has_cover": session.cover_image_path is not None,
-                    })
-            except Exception as e:
-                print(f"[CLEANUP] Errore nel processare sessione {session_id}: {e}")
-                continue
+        # Sessioni ricaricate con una sola query: quelle eliminate nel frattempo vengono saltate
+        sessions = await get_sessions_bulk_async(
+            session_store,
+            [book_info["session_id"] for book_info in obsolete_session_ids],
+            fields=LIBRARY_ENTRY_FIELDS,
+        )
+        books_to_delete = [book_info for book_info in obsolete_session_ids if book_info["session_id"] in sessions]
+        
+        # Una sola scansione della cartella dei PDF per tutti i libri da eliminare (in un thread)
+        local_pdfs = await asyncio.to_thread(index_local_pdfs, BOOKS_DIR) if BOOKS_DIR.exists() else {}
+        
+        # Eliminazione dei file in parallelo, limitata dal semaforo
+        semaphore = asyncio.Semaphore(_CLEANUP_CONCURRENCY)
+        file_results = await asyncio.gather(*(
+            _delete_obsolete_book_files(sessions[book_info["session_id"]], book_info["title"], local_pdfs, semaphore)
+            for book_info in books_to_delete
+        ))
+        deleted_files_count = sum(files_deleted for files_deleted, _ in file_results)
+        errors = [error for _, book_errors in file_results for error in book_errors]
         
-        # Elimina i libri obsoleti
-        deleted_count = 0
-        deleted_files_count = 0
-        errors = []
+        # Sessioni e relative condivisioni eliminate con una sola operazione ciascuna
+        delete_ids = [book_info["session_id"] for book_info in books_to_delete]
+        deleted_count = await delete_sessions_async(session_store, delete_ids)
+        if deleted_count < len(delete_ids):
+            errors.append(f"Errore eliminazione sessioni: {len(delete_ids) - deleted_count} di {len(delete_ids)} non eliminate")
         
-        for book_info in obsolete_session_ids:
-            session_id = book_info["session_id"]
+        if delete_ids:
             try:
-                session = await get_session_async(session_store, session_id)
-                if not session:
-                    continue
-                
-                files_deleted = 0
-                session_status = session.get_status()
-                try:
-                    if session_status == "complete" and books_dir.exists():
-                        date_prefix = session.created_at.strftime("%Y-%m-%d")
-                        model_abbrev = get_model_abbreviation(session.form_data.llm_model)
-                        title_sanitized = "".join(c for c in (session.current_title or "Romanzo") if c.isalnum() or c in (' ', '-', '_')).rstrip()
-                        title_sanitized = title_sanitized.replace(" ", "_")
-                        if not title_sanitized:
-                            title_sanitized = f"Libro_{session.session_id[:8]}"
-                        expected_filename = f"{date_prefix}_{model_abbrev}_{title_sanitized}.pdf"
-                        expected_path = books_dir / expected_filename
-                        
-                        if expected_path.exists():
-                            expected_path.unlink()
-                            files_deleted += 1
-                        else:
-                            for pdf_file in books_dir.glob("*.pdf"):
-                                if session.session_id[:8] in pdf_file.stem or (title_sanitized and title_sanitized.lower() in pdf_file.stem.lower()):
-                                    pdf_file.unlink()
-                                    files_deleted += 1
-                                    break
-                    
-                    if session.cover_image_path:
-                        cover_path = Path(session.cover_image_path)
-                        if cover_path.exists():
-                            cover_path.unlink()
-                            files_deleted += 1
-                except Exception as file_error:
-                    errors.append(f"Errore eliminazione file per {book_info['title']}: {file_error}")
-                
-                if await delete_session_async(session_store, session_id):
-                    deleted_count += 1
-                    deleted_files_count += files_deleted
-                else:
-                    errors.append(f"Errore eliminazione sessione {session_id}")
-                    
+                await get_book_share_store().delete_all_shares_for_books(delete_ids)
             except Exception as e:
-                errors.append(f"Errore durante eliminazione {book_info['title']}: {e}")
-                print(f"[CLEANUP] Errore eliminando {session_id}: {e}")
+                logger.warning("[CLEANUP] Avviso: errore nell'eliminazione condivisioni: %s", e)
         
         return {
             "deleted_count": deleted_count,
@@ -975,9 +1076,7 @@ async def cleanup_obsolete_books_endpoint():
         }
     
     except Exception as e:
-        print(f"[CLEANUP] Errore: {e}")
-        import traceback
-        traceback.print_exc()
+        logger.exception("[CLEANUP] Errore: %s", e)
         raise HTTPException(
             status_code=500,
             detail=f"Errore nella pulizia dei libri obsoleti: {str(e)}"
@@ -988,41 +1087,41 @@ async def cleanup_obsolete_books_endpoint():
 async def download_pdf_by_filename_endpoint(filename: str):
     """Scarica un PDF specifico per nome file."""
     try:
-        books_dir = Path(__file__).parent.parent.parent / "books"
-        pdf_path = books_dir / filename
+        pdf_path = BOOKS_DIR / filename
         
         # Validazione sicurezza
         try:
-            pdf_path.resolve().relative_to(books_dir.resolve())
+            pdf_path.resolve().relative_to(BOOKS_DIR.resolve())
         except ValueError:
             raise HTTPException(
                 status_code=403,
                 detail="Accesso non consentito a questo file"
             )
         
-        if not pdf_path.exists() or not pdf_path.is_file():
+        # Un solo stat (in un thread): esistenza e tipo verificati insieme, senza finestra tra due controlli
+        try:
+            pdf_stat = await asyncio.to_thread(os.stat, pdf_path)
+        except (FileNotFoundError, NotADirectoryError):
+            pdf_stat = None
+        if pdf_stat is None or not stat.S_ISREG(pdf_stat.st_mode):
             raise HTTPException(
                 status_code=404,
                 detail=f"PDF {filename} non trovato"
             )
         
-        with open(pdf_path, 'rb') as f:
-            pdf_content = f.read()
-        
-        return Response(
-            content=pdf_content,
+        # FileResponse invia il file a blocchi (sendfile dove disponibile) senza caricarlo in memoria;
+        # con stat_result riusa lo stat appena fatto per Content-Length/ETag invece di ripeterlo
+        return FileResponse(
+            path=pdf_path,
             media_type="application/pdf",
-            headers={
-                "Content-Disposition": f'attachment; filename="{filename}"'
-            }
+            filename=pdf_path.name,
+            stat_result=pdf_stat,
         )
     
     except HTTPException:
         raise
     except Exception as e:
-        print(f"[LIBRARY PDF DOWNLOAD] Errore nel download: {e}")
-        import traceback
-        traceback.print_exc()
+        logger.exception("[LIBRARY PDF DOWNLOAD] Errore nel download: %s", e)
         raise HTTPException(
             status_code=500,
             detail=f"Errore nel download del PDF: {str(e)}"
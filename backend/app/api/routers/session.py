@@ -1,17 +1,12 @@
 """Router per gli endpoint delle sessioni."""
-import math
 from typing import Literal
 from fastapi import APIRouter, HTTPException, Depends
 
-from app.models import SessionRestoreResponse, DraftResponse, BookProgress, Chapter, Question, LiteraryCritique
+from app.models import SessionRestoreResponse, DraftResponse, Question
 from app.agent.session_store import get_session_store
 from app.agent.session_store_helpers import get_session_async
 from app.middleware.auth import get_current_user_optional
-from app.services.stats_service import (
-    calculate_page_count,
-    calculate_generation_cost,
-)
-from app.core.config import get_app_config
+from app.services.book_progress_builder import build_book_progress
 
 router = APIRouter(prefix="/api/session", tags=["session"])
 
@@ -70,90 +65,7 @@ async def restore_session_endpoint(
         # Prepara writing_progress (se disponibile)
         writing_progress = None
         if session.writing_progress:
-            progress = session.writing_progress
-            chapters = session.book_chapters or []
-            
-            completed_chapters = []
-            for ch_dict in chapters:
-                content = ch_dict.get('content', '')
-                page_count = calculate_page_count(content)
-                completed_chapters.append(Chapter(
-                    title=ch_dict.get('title', ''),
-                    content=content,
-                    section_index=ch_dict.get('section_index', 0),
-                    page_count=page_count,
-                ))
-            
-            total_pages = None
-            is_complete = progress.get('is_complete', False)
-            if is_complete and len(completed_chapters) > 0:
-                chapters_pages = sum(ch.page_count for ch in completed_chapters)
-                cover_pages = 1
-                app_config = get_app_config()
-                toc_chapters_per_page = app_config.get("validation", {}).get("toc_chapters_per_page", 30)
-                toc_pages = math.ceil(len(completed_chapters) / toc_chapters_per_page)
-                total_pages = chapters_pages + cover_pages + toc_pages
-            
-            writing_time_minutes = progress.get('writing_time_minutes')
-            if writing_time_minutes is None and is_complete:
-                if session.writing_start_time and session.writing_end_time:
-                    delta = session.writing_end_time - session.writing_start_time
-                    writing_time_minutes = delta.total_seconds() / 60.0
-            
-            estimated_cost = calculate_generation_cost(session, total_pages)
-            
-            critique = None
-            critique_status = session.critique_status
-            critique_error = session.critique_error
-            if session.literary_critique:
-                if isinstance(session.literary_critique, dict):
-                    critique = LiteraryCritique(**session.literary_critique)
-                else:
-                    critique = session.literary_critique
-            
-            estimated_time_minutes = None
-            estimated_time_confidence = None
-            if not is_complete:
-                current_step_idx = progress.get('current_step', 0)
-                total_steps = progress.get('total_steps', 0)
-                
-                if total_steps > 0 and current_step_idx < total_steps:
-                    try:
-                        from app.main import calculate_estimated_time
-                        estimated_time_minutes, estimated_time_confidence = await calculate_estimated_time(
-                            session_id, current_step_idx, total_steps
-                        )
-                    except Exception as e:
-                        print(f"[RESTORE_SESSION] Errore nel calcolo stima tempo: {e}")
-                        remaining = total_steps - current_step_idx
-                        app_config = get_app_config()
-                        current_model = session.form_data.llm_model if session.form_data else None
-                        from app.analytics.estimate_linear_params import get_generation_method, get_linear_params_for_method, calculate_residual_time_linear
-                        method = get_generation_method(current_model)
-                        a, b = get_linear_params_for_method(method, app_config)
-                        k = current_step_idx + 1
-                        estimated_seconds = calculate_residual_time_linear(k, total_steps, a, b)
-                        estimated_time_minutes = estimated_seconds / 60
-                        estimated_time_confidence = None
-            
-            writing_progress = BookProgress(
-                session_id=session_id,
-                current_step=progress.get('current_step', 0),
-                total_steps=progress.get('total_steps', 0),
-                current_section_name=progress.get('current_section_name'),
-                completed_chapters=completed_chapters,
-                is_complete=is_complete,
-                is_paused=progress.get('is_paused', False),
-                error=progress.get('error'),
-                total_pages=total_pages,
-                writing_time_minutes=writing_time_minutes,
-                estimated_cost=estimated_cost,
-                critique=critique,
-                critique_status=critique_status,
-                critique_error=critique_error,
-                estimated_time_minutes=estimated_time_minutes,
-                estimated_time_confidence=estimated_time_confidence,
-            )
+            writing_progress = await build_book_progress(session, session_id)
         
         outline_text = session.current_outline if session.current_outline else None
         
@@ -10,6 +10,7 @@ class LiteraryCriticConfig(TypedDict, total=False):
     fallback_model: str
     temperature: float
     max_retries: int
+    max_concurrent_requests: int
     response_mime_type: str
     system_prompt: str
     user_prompt: str
@@ -113,6 +114,7 @@ def load_literary_critic_config() -> LiteraryCriticConfig:
         "fallback_model": data.get("fallback_model", "gemini-3-flash-preview"),
         "temperature": float(data.get("temperature", 0.3)),
         "max_retries": int(data.get("max_retries", 2)),
+        "max_concurrent_requests": int(data.get("max_concurrent_requests", 4)),
         "response_mime_type": data.get("response_mime_type"),
         "system_prompt": data.get("system_prompt", ""),
         "user_prompt": data.get("user_prompt", ""),
@@ -1,3 +1,4 @@
+import logging
 import os
 import sys
 from pathlib import Path
@@ -82,6 +83,7 @@ from app.agent.session_store_helpers import (
 from app.services.pdf_service import generate_complete_book_pdf
 from app.services.export_service import generate_epub, generate_docx
 from app.services.storage_service import get_storage_service
+from app.services.critique_service import setup_google_tts_credentials
 from app.services.stats_service import (
     calculate_page_count,
     get_model_abbreviation,
@@ -102,6 +104,12 @@ load_dotenv(dotenv_path=env_path)
 # Carica anche dalla directory corrente come fallback
 load_dotenv()
 
+# Configura una sola volta il logging applicativo (livello da LOG_LEVEL, default INFO)
+logging.basicConfig(
+    level=os.getenv("LOG_LEVEL", "INFO").upper(),
+    format="%(asctime)s %(levelname)s [%(name)s] %(message)s",
+)
+
 app = FastAPI(title="Scrittura Libro API", version="0.1.0")
 
 # CORS per sviluppo locale e produzione
@@ -161,6 +169,11 @@ async def startup_db():
         user_store = get_user_store()
         await user_store.connect()
         print("[STARTUP] MongoDB (users) connesso con successo")
+        
+        # Sessioni auth: stessa connessione del UserStore, pronta prima della prima richiesta
+        from app.middleware.auth import get_auth_sessions_collection
+        await get_auth_sessions_collection()
+        print("[STARTUP] MongoDB (sessions_auth) pronto")
 
         # Inizializza anche NotificationStore
         from app.agent.notification_store import get_notification_store
@@ -189,6 +202,12 @@ async def startup_db():
         print(f"[STARTUP] Avviso: MongoDB non disponibile: {e}")
 
 
+@app.on_event("startup")
+async def startup_google_credentials():
+    """Risolve le credenziali Google Cloud (Text-to-Speech) una sola volta all'avvio."""
+    setup_google_tts_credentials()
+
+
 @app.on_event("shutdown")
 async def shutdown_db():
     """Chiude la connessione MongoDB allo shutdown."""
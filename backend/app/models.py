@@ -162,6 +162,9 @@ class OutlineUpdateRequest(BaseModel):
 # Modelli per la scrittura del romanzo
 class Chapter(BaseModel):
     """Rappresenta un singolo capitolo/sezione del romanzo."""
+    # Immutabile: i capitoli sono condivisi dai BookProgress in cache
+    model_config = ConfigDict(frozen=True)
+    
     title: str
     content: str
     section_index: int  # Indice nella struttura (0-based)
@@ -208,9 +211,43 @@ class LiteraryCritique(BaseModel):
         s = str(v).strip()
         return [s] if s else []
 
+    @classmethod
+    def from_stored(cls, data: Any) -> "LiteraryCritique":
+        """
+        Ricostruisce la critica salvata nella sessione.
+        
+        Le critiche scritte dall'app hanno già pros/cons come liste di stringhe
+        (parse_critique_response li normalizza), quindi si salta la validazione
+        con model_construct, applicando comunque la stessa normalizzazione dei punti
+        del validatore (str, strip, niente None né stringhe vuote); i formati vecchi
+        (pros/cons come stringa) o valori fuori range passano dalla validazione completa.
+        """
+        if isinstance(data, cls):
+            return data
+        score = data.get("score")
+        pros = data.get("pros", [])
+        cons = data.get("cons", [])
+        summary = data.get("summary")
+        is_normalized = (
+            isinstance(score, (int, float)) and 0.0 <= score <= 10.0
+            and isinstance(summary, str)
+            and isinstance(pros, list) and isinstance(cons, list)
+        )
+        if not is_normalized:
+            return cls(**data)
+        return cls.model_construct(
+            score=float(score),
+            pros=cls._coerce_points(pros),
+            cons=cls._coerce_points(cons),
+            summary=summary,
+        )
+
 
 class BookProgress(BaseModel):
     """Stato di avanzamento della scrittura del romanzo."""
+    # Immutabile: la stessa istanza viene restituita dalla cache LRU del progresso
+    model_config = ConfigDict(frozen=True)
+    
     session_id: str
     current_step: int  # Indice del capitolo corrente in scrittura (0-based)
     total_steps: int  # Numero totale di sezioni da scrivere
@@ -286,6 +323,9 @@ class BookResponse(BaseModel):
 # Modelli per la libreria personale
 class LibraryEntry(BaseModel):
     """Entry singola nella libreria."""
+    # Immutabile: le entry sono condivise tra le risposte in cache della libreria
+    model_config = ConfigDict(frozen=True)
+    
     session_id: str
     title: str
     author: str
@@ -328,6 +368,9 @@ class UsersStats(BaseModel):
 
 class LibraryStats(BaseModel):
     """Statistiche aggregate della libreria."""
+    # Immutabile: la stessa istanza viene servita dalla cache delle statistiche
+    model_config = ConfigDict(frozen=True)
+    
     total_books: int
     completed_books: int
     in_progress_books: int
@@ -371,6 +414,7 @@ class LibraryResponse(BaseModel):
     total: int
     has_more: bool = False  # Indica se ci sono altri libri da caricare
     stats: Optional[LibraryStats] = None
+    next_cursor: Optional[str] = None  # Cursore per la pagina successiva (None se non ci sono altri libri)
 
 
 class PdfEntry(BaseModel):
@@ -1,8 +1,11 @@
 """Service per la generazione di libri in background."""
+import logging
+import asyncio
 import os
 from datetime import datetime
 from pathlib import Path
 from typing import Optional
+import aiofiles
 from app.models import SubmissionRequest, QuestionAnswer
 from app.agent.writer_generator import generate_full_book, parse_outline_sections, resume_book_generation
 from app.agent.cover_generator import generate_book_cover
@@ -17,10 +20,35 @@ from app.agent.session_store_helpers import (
     update_critique_status_async,
     update_token_usage_async,
     set_real_cost_async,
+    set_writing_time_minutes_async,
 )
 from app.services.storage_service import get_storage_service
 from app.services.cost_service import calculate_real_generation_cost
 
+logger = logging.getLogger(__name__)
+
+
+async def _build_pdf_for_critique(session, generate_pdf_callback=None) -> Path:
+    """
+    Genera il PDF finale del libro (salvandolo su storage) e restituisce il path del file temporaneo.
+    
+    Args:
+        session: Sessione già caricata del libro completato
+        generate_pdf_callback: Funzione async session -> Path (evita dipendenza circolare con il router)
+    """
+    try:
+        if generate_pdf_callback is None:
+            # Fallback: importa direttamente (crea dipendenza circolare ma funziona)
+            from app.api.routers.book import build_book_pdf_to_path
+            generate_pdf_callback = build_book_pdf_to_path
+        pdf_path = await generate_pdf_callback(session)
+        if pdf_path.stat().st_size == 0:
+            pdf_path.unlink(missing_ok=True)
+            raise ValueError("PDF vuoto, non disponibile per la critica.")
+        return pdf_path
+    except Exception as e:
+        raise RuntimeError(f"Impossibile generare/recuperare PDF per critica: {e}")
+
 
 async def background_book_generation(
     session_id: str,
@@ -30,7 +58,7 @@ async def background_book_generation(
     draft_title: Optional[str],
     outline_text: str,
     api_key: str,
-    generate_pdf_callback=None,  # Callback per generare PDF (per evitare dipendenza circolare)
+    generate_pdf_callback=None,  # Callback session -> Path del PDF (per evitare dipendenza circolare)
 ):
     """
     Funzione eseguita in background per generare il libro completo.
@@ -47,12 +75,12 @@ async def background_book_generation(
     """
     session_store = get_session_store()
     try:
-        print(f"[BOOK GENERATION] Avvio generazione libro per sessione {session_id}")
+        logger.info("[BOOK GENERATION] Avvio generazione libro per sessione %s", session_id)
         
         # Verifica che il progresso sia stato inizializzato
         session = await get_session_async(session_store, session_id)
         if not session or not session.writing_progress:
-            print(f"[BOOK GENERATION] WARNING: Progresso non inizializzato per sessione {session_id}, inizializzo ora...")
+            logger.warning("[BOOK GENERATION] Progresso non inizializzato per sessione %s, inizializzo ora...", session_id)
             # Fallback: inizializza il progresso se non è stato fatto
             sections = parse_outline_sections(outline_text)
             await update_writing_progress_async(
@@ -68,7 +96,7 @@ async def background_book_generation(
         # Registra timestamp inizio scrittura capitoli
         start_time = datetime.now()
         await update_writing_times_async(session_store, session_id, start_time=start_time)
-        print(f"[BOOK GENERATION] Timestamp inizio scrittura: {start_time.isoformat()}")
+        logger.info("[BOOK GENERATION] Timestamp inizio scrittura: %s", start_time.isoformat())
         
         await generate_full_book(
             session_id=session_id,
@@ -80,24 +108,26 @@ async def background_book_generation(
             api_key=api_key,
         )
         
-        # Verifica se la generazione è stata messa in pausa
+        # Unica lettura della sessione dopo la generazione: viene riutilizzata per
+        # pausa, notifica, tempo di scrittura, costo, copertina e critica
         session = await get_session_async(session_store, session_id)
+        
+        # Verifica se la generazione è stata messa in pausa
         if session and session.writing_progress and session.writing_progress.get('is_paused', False):
-            print(f"[BOOK GENERATION] Generazione messa in pausa per sessione {session_id}")
+            logger.info("[BOOK GENERATION] Generazione messa in pausa per sessione %s", session_id)
             # Non continuare con copertina e critica se è in pausa
             return
         
-        print(f"[BOOK GENERATION] Generazione completata per sessione {session_id}")
+        logger.info("[BOOK GENERATION] Generazione completata per sessione %s", session_id)
         
         # Registra timestamp fine scrittura capitoli e calcola tempo
         end_time = datetime.now()
         await update_writing_times_async(session_store, session_id, end_time=end_time)
         writing_time_minutes = (end_time - start_time).total_seconds() / 60
-        print(f"[BOOK GENERATION] Timestamp fine scrittura: {end_time.isoformat()}, tempo totale: {writing_time_minutes:.2f} minuti")
+        logger.info("[BOOK GENERATION] Timestamp fine scrittura: %s, tempo totale: %.2f minuti", end_time.isoformat(), writing_time_minutes)
         
         # Invia notifica di completamento libro (subito dopo la scrittura)
         try:
-            session = await get_session_async(session_store, session_id)
             if session and session.user_id:
                 from app.agent.notification_store import get_notification_store
                 notification_store = get_notification_store()
@@ -115,12 +145,11 @@ async def background_book_generation(
                         "book_title": book_title,
                     }
                 )
-                print(f"[BOOK GENERATION] Notifica di completamento inviata a utente {session.user_id}")
+                logger.info("[BOOK GENERATION] Notifica di completamento inviata a utente %s", session.user_id)
         except Exception as notif_err:
-            print(f"[BOOK GENERATION] WARNING: Errore nell'invio notifica: {notif_err}")
+            logger.warning("[BOOK GENERATION] Errore nell'invio notifica: %s", notif_err)
         
         # Aggiorna writing_progress con il tempo calcolato
-        session = await get_session_async(session_store, session_id)
         if session and session.writing_progress:
             # Mantieni tutti i valori esistenti e aggiungi writing_time_minutes
             existing_progress = session.writing_progress.copy()
@@ -135,27 +164,22 @@ async def background_book_generation(
                 is_paused=False,
                 error=existing_progress.get('error'),
             )
-            # Aggiorna manualmente writing_time_minutes nel dict (update_writing_progress non lo gestisce)
-            session.writing_progress['writing_time_minutes'] = writing_time_minutes
-            # FileSessionStore salverà automaticamente al prossimo update o possiamo forzare il salvataggio
-            if hasattr(session_store, '_save_sessions'):
-                session_store._save_sessions()
+            # Salva writing_time_minutes con un aggiornamento mirato (update_writing_progress non lo gestisce)
+            await set_writing_time_minutes_async(session_store, session_id, writing_time_minutes)
         
         # Calcola e salva il costo reale basato sui token effettivi
         try:
-            session = await get_session_async(session_store, session_id)
             if session:
                 real_cost = calculate_real_generation_cost(session)
                 if real_cost is not None:
                     await set_real_cost_async(session_store, session_id, real_cost)
-                    print(f"[BOOK GENERATION] Costo reale calcolato e salvato: €{real_cost:.6f}")
+                    logger.info("[BOOK GENERATION] Costo reale calcolato e salvato: €%.6f", real_cost)
         except Exception as cost_err:
-            print(f"[BOOK GENERATION] WARNING: Errore nel calcolo costo reale: {cost_err}")
+            logger.warning("[BOOK GENERATION] Errore nel calcolo costo reale: %s", cost_err)
         
         # Genera la copertina dopo che il libro è stato completato
         try:
-            print(f"[BOOK GENERATION] Avvio generazione copertina per sessione {session_id}")
-            session = await get_session_async(session_store, session_id)
+            logger.info("[BOOK GENERATION] Avvio generazione copertina per sessione %s", session_id)
             if session:
                 cover_path = await generate_book_cover(
                     session_id=session_id,
@@ -170,57 +194,42 @@ async def background_book_generation(
                     storage_service = get_storage_service()
                     user_id = session.user_id if hasattr(session, 'user_id') else None
                     cover_filename = f"{session_id}_cover.png"
-                    with open(cover_path, 'rb') as f:
-                        cover_data = f.read()
-                    gcs_path = storage_service.upload_file(
+                    async with aiofiles.open(cover_path, 'rb') as f:
+                        cover_data = await f.read()
+                    # Upload sincrono eseguito in un thread per non bloccare l'event loop
+                    gcs_path = await asyncio.to_thread(
+                        storage_service.upload_file,
                         data=cover_data,
                         destination_path=f"covers/{cover_filename}",
                         content_type="image/png",
                         user_id=user_id,
                     )
-                    await update_cover_image_path_async(session_store, session_id, gcs_path)
-                    print(f"[BOOK GENERATION] Copertina generata e caricata su GCS: {gcs_path}")
+                    session = await update_cover_image_path_async(session_store, session_id, gcs_path)
+                    logger.info("[BOOK GENERATION] Copertina generata e caricata su GCS: %s", gcs_path)
                 except Exception as e:
-                    print(f"[BOOK GENERATION] ERRORE nel caricamento copertina su GCS: {e}, uso path locale")
-                    await update_cover_image_path_async(session_store, session_id, cover_path)
-                    print(f"[BOOK GENERATION] Copertina generata e salvata: {cover_path}")
+                    logger.error("[BOOK GENERATION] ERRORE nel caricamento copertina su GCS: %s, uso path locale", e)
+                    session = await update_cover_image_path_async(session_store, session_id, cover_path)
+                    logger.info("[BOOK GENERATION] Copertina generata e salvata: %s", cover_path)
         except Exception as e:
-            print(f"[BOOK GENERATION] ERRORE nella generazione copertina: {e}")
-            import traceback
-            traceback.print_exc()
+            logger.exception("[BOOK GENERATION] ERRORE nella generazione copertina: %s", e)
             # Non blocchiamo il processo se la copertina fallisce
         
         # Genera la valutazione critica dopo che il libro è stato completato
         try:
-            print(f"[BOOK GENERATION] Avvio valutazione critica per sessione {session_id}")
-            session = await get_session_async(session_store, session_id)
+            logger.info("[BOOK GENERATION] Avvio valutazione critica per sessione %s", session_id)
             if session and session.book_chapters and len(session.book_chapters) > 0:
                 # Critica: genera prima il PDF finale (e lo salva su disco), poi passa il PDF al modello multimodale.
                 await update_critique_status_async(session_store, session_id, "running", error=None)
+                pdf_path = await _build_pdf_for_critique(session, generate_pdf_callback)
                 try:
-                    # Usa il callback se fornito, altrimenti importa direttamente (per retrocompatibilità)
-                    if generate_pdf_callback:
-                        pdf_response = await generate_pdf_callback(session_id)
-                    else:
-                        # Fallback: importa direttamente (crea dipendenza circolare ma funziona)
-                        from app.api.routers.book import generate_book_pdf
-                        pdf_response = await generate_book_pdf(session_id, current_user=None)
-                    
-                    pdf_bytes = getattr(pdf_response, "body", None) or getattr(pdf_response, "content", None)
-                    if pdf_bytes is None:
-                        # Fallback: rigenera via endpoint e prendi il body
-                        pdf_bytes = pdf_response.body
-                    if not isinstance(pdf_bytes, (bytes, bytearray)) or len(pdf_bytes) == 0:
-                        raise ValueError("PDF bytes non disponibili per la critica.")
-                except Exception as e:
-                    raise RuntimeError(f"Impossibile generare/recuperare PDF per critica: {e}")
-
-                critique, token_usage = await generate_literary_critique_from_pdf(
-                    title=draft_title or "Romanzo",
-                    author=form_data.user_name or "Autore",
-                    pdf_bytes=bytes(pdf_bytes),
-                    api_key=api_key,
-                )
+                    critique, token_usage = await generate_literary_critique_from_pdf(
+                        title=draft_title or "Romanzo",
+                        author=form_data.user_name or "Autore",
+                        pdf_path=pdf_path,
+                        api_key=api_key,
+                    )
+                finally:
+                    pdf_path.unlink(missing_ok=True)
 
                 await update_critique_async(session_store, session_id, critique)
                 await update_critique_status_async(session_store, session_id, "completed", error=None)
@@ -235,22 +244,18 @@ async def background_book_generation(
                     model=token_usage.get("model", "gemini-3-pro-preview"),
                 )
                 
-                print(f"[BOOK GENERATION] Valutazione critica completata: score={critique.get('score', 0)}")
+                logger.info("[BOOK GENERATION] Valutazione critica completata: score=%s", critique.get('score', 0))
         except Exception as e:
-            print(f"[BOOK GENERATION] ERRORE nella valutazione critica: {e}")
-            import traceback
-            traceback.print_exc()
+            logger.exception("[BOOK GENERATION] ERRORE nella valutazione critica: %s", e)
             # Niente placeholder: settiamo status failed e salviamo errore per UI (stop polling + retry).
             try:
                 await update_critique_status_async(session_store, session_id, "failed", error=str(e))
             except Exception as _e:
-                print(f"[BOOK GENERATION] WARNING: impossibile salvare critique_status failed: {_e}")
+                logger.warning("[BOOK GENERATION] impossibile salvare critique_status failed: %s", _e)
     except ValueError as e:
         # Errore di validazione (es. outline non valido)
         error_msg = f"Errore di validazione: {str(e)}"
-        print(f"[BOOK GENERATION] ERRORE (ValueError): {error_msg}")
-        import traceback
-        traceback.print_exc()
+        logger.exception("[BOOK GENERATION] ERRORE (ValueError): %s", error_msg)
         # Salva l'errore nel progresso mantenendo il total_steps se già impostato
         session = await get_session_async(session_store, session_id)
         existing_total = 0
@@ -269,9 +274,7 @@ async def background_book_generation(
         )
     except Exception as e:
         error_msg = f"Errore nella generazione: {str(e)}"
-        print(f"[BOOK GENERATION] ERRORE (Exception): {error_msg}")
-        import traceback
-        traceback.print_exc()
+        logger.exception("[BOOK GENERATION] ERRORE (Exception): %s", error_msg)
         # Salva l'errore nel progresso mantenendo il total_steps se già impostato
         session = await get_session_async(session_store, session_id)
         existing_total = 0
@@ -293,7 +296,7 @@ async def background_book_generation(
 async def background_resume_book_generation(
     session_id: str,
     api_key: str,
-    generate_pdf_callback=None,  # Callback per generare PDF
+    generate_pdf_callback=None,  # Callback session -> Path del PDF
 ):
     """
     Funzione eseguita in background per riprendere la generazione del libro.
@@ -305,7 +308,7 @@ async def background_resume_book_generation(
     """
     session_store = get_session_store()
     try:
-        print(f"[BOOK GENERATION] Ripresa generazione libro per sessione {session_id}")
+        logger.info("[BOOK GENERATION] Ripresa generazione libro per sessione %s", session_id)
         
         # Recupera la sessione per verificare lo stato
         session = await get_session_async(session_store, session_id)
@@ -329,23 +332,25 @@ async def background_resume_book_generation(
             api_key=api_key,
         )
         
-        # Verifica se la generazione è stata completata o rimessa in pausa
+        # Unica lettura della sessione dopo la generazione: viene riutilizzata per
+        # pausa, notifica, tempo di scrittura, costo, copertina e critica
         session = await get_session_async(session_store, session_id)
+        
+        # Verifica se la generazione è stata completata o rimessa in pausa
         if session and session.writing_progress and session.writing_progress.get('is_paused', False):
-            print(f"[BOOK GENERATION] Generazione rimessa in pausa per sessione {session_id}")
+            logger.info("[BOOK GENERATION] Generazione rimessa in pausa per sessione %s", session_id)
             return
         
-        print(f"[BOOK GENERATION] Ripresa generazione completata per sessione {session_id}")
+        logger.info("[BOOK GENERATION] Ripresa generazione completata per sessione %s", session_id)
         
         # Registra timestamp fine scrittura capitoli e calcola tempo
         end_time = datetime.now()
         await update_writing_times_async(session_store, session_id, end_time=end_time)
         writing_time_minutes = (end_time - start_time).total_seconds() / 60
-        print(f"[BOOK GENERATION] Timestamp fine scrittura: {end_time.isoformat()}, tempo totale: {writing_time_minutes:.2f} minuti")
+        logger.info("[BOOK GENERATION] Timestamp fine scrittura: %s, tempo totale: %.2f minuti", end_time.isoformat(), writing_time_minutes)
         
         # Invia notifica di completamento libro (subito dopo la scrittura)
         try:
-            session = await get_session_async(session_store, session_id)
             if session and session.user_id:
                 from app.agent.notification_store import get_notification_store
                 notification_store = get_notification_store()
@@ -363,12 +368,11 @@ async def background_resume_book_generation(
                         "book_title": book_title,
                     }
                 )
-                print(f"[BOOK GENERATION] Notifica di completamento inviata a utente {session.user_id}")
+                logger.info("[BOOK GENERATION] Notifica di completamento inviata a utente %s", session.user_id)
         except Exception as notif_err:
-            print(f"[BOOK GENERATION] WARNING: Errore nell'invio notifica: {notif_err}")
+            logger.warning("[BOOK GENERATION] Errore nell'invio notifica: %s", notif_err)
         
         # Aggiorna writing_progress con il tempo calcolato
-        session = await get_session_async(session_store, session_id)
         if session and session.writing_progress:
             existing_progress = session.writing_progress.copy()
             existing_progress['writing_time_minutes'] = writing_time_minutes
@@ -382,25 +386,22 @@ async def background_resume_book_generation(
                 is_paused=False,
                 error=None,
             )
-            session.writing_progress['writing_time_minutes'] = writing_time_minutes
-            if hasattr(session_store, '_save_sessions'):
-                session_store._save_sessions()
+            # Salva writing_time_minutes con un aggiornamento mirato (update_writing_progress non lo gestisce)
+            await set_writing_time_minutes_async(session_store, session_id, writing_time_minutes)
         
         # Calcola e salva il costo reale basato sui token effettivi
         try:
-            session = await get_session_async(session_store, session_id)
             if session:
                 real_cost = calculate_real_generation_cost(session)
                 if real_cost is not None:
                     await set_real_cost_async(session_store, session_id, real_cost)
-                    print(f"[BOOK GENERATION] Costo reale calcolato e salvato: €{real_cost:.6f}")
+                    logger.info("[BOOK GENERATION] Costo reale calcolato e salvato: €%.6f", real_cost)
         except Exception as cost_err:
-            print(f"[BOOK GENERATION] WARNING: Errore nel calcolo costo reale: {cost_err}")
+            logger.warning("[BOOK GENERATION] Errore nel calcolo costo reale: %s", cost_err)
         
         # Genera la copertina dopo che il libro è stato completato
         try:
-            print(f"[BOOK GENERATION] Avvio generazione copertina per sessione {session_id}")
-            session = await get_session_async(session_store, session_id)
+            logger.info("[BOOK GENERATION] Avvio generazione copertina per sessione %s", session_id)
             if session:
                 cover_path = await generate_book_cover(
                     session_id=session_id,
@@ -416,56 +417,42 @@ async def background_resume_book_generation(
                         storage_service = get_storage_service()
                         user_id = session.user_id if hasattr(session, 'user_id') else None
                         cover_filename = f"{session_id}_cover.png"
-                        with open(cover_path, 'rb') as f:
-                            cover_data = f.read()
-                        gcs_path = storage_service.upload_file(
+                        async with aiofiles.open(cover_path, 'rb') as f:
+                            cover_data = await f.read()
+                        # Upload sincrono eseguito in un thread per non bloccare l'event loop
+                        gcs_path = await asyncio.to_thread(
+                            storage_service.upload_file,
                             data=cover_data,
                             destination_path=f"covers/{cover_filename}",
                             content_type="image/png",
                             user_id=user_id,
                         )
-                        await update_cover_image_path_async(session_store, session_id, gcs_path)
-                        print(f"[BOOK GENERATION] Copertina generata e caricata su GCS: {gcs_path}")
+                        session = await update_cover_image_path_async(session_store, session_id, gcs_path)
+                        logger.info("[BOOK GENERATION] Copertina generata e caricata su GCS: %s", gcs_path)
                     except Exception as e:
-                        print(f"[BOOK GENERATION] ERRORE nel caricamento copertina su GCS: {e}, uso path locale")
-                        await update_cover_image_path_async(session_store, session_id, cover_path)
-                        print(f"[BOOK GENERATION] Copertina generata: {cover_path}")
+                        logger.error("[BOOK GENERATION] ERRORE nel caricamento copertina su GCS: %s, uso path locale", e)
+                        session = await update_cover_image_path_async(session_store, session_id, cover_path)
+                        logger.info("[BOOK GENERATION] Copertina generata: %s", cover_path)
         except Exception as e:
-            print(f"[BOOK GENERATION] ERRORE nella generazione copertina: {e}")
-            import traceback
-            traceback.print_exc()
+            logger.exception("[BOOK GENERATION] ERRORE nella generazione copertina: %s", e)
         
         # Genera la valutazione critica dopo che il libro è stato completato
         try:
-            print(f"[BOOK GENERATION] Avvio valutazione critica per sessione {session_id}")
-            session = await get_session_async(session_store, session_id)
+            logger.info("[BOOK GENERATION] Avvio valutazione critica per sessione %s", session_id)
             if session and session.book_chapters and len(session.book_chapters) > 0:
                 # Critica: genera prima il PDF finale (e lo salva su disco), poi passa il PDF al modello multimodale.
                 await update_critique_status_async(session_store, session_id, "running", error=None)
+                pdf_path = await _build_pdf_for_critique(session, generate_pdf_callback)
                 try:
-                    # Usa il callback se fornito
-                    if generate_pdf_callback:
-                        pdf_response = await generate_pdf_callback(session_id)
-                    else:
-                        # Fallback: importa direttamente dalla funzione helper
-                        from app.api.routers.book import generate_book_pdf
-                        pdf_response = await generate_book_pdf(session_id, current_user=None)
-                    
-                    pdf_bytes = getattr(pdf_response, "body", None) or getattr(pdf_response, "content", None)
-                    if pdf_bytes is None:
-                        pdf_bytes = pdf_response.body
-                    if not isinstance(pdf_bytes, (bytes, bytearray)) or len(pdf_bytes) == 0:
-                        raise ValueError("PDF bytes non disponibili per la critica.")
-                except Exception as e:
-                    raise RuntimeError(f"Impossibile generare/recuperare PDF per critica: {e}")
-
-                # La funzione gestisce automaticamente quale API key usare (Gemini o OpenAI)
-                critique, token_usage = await generate_literary_critique_from_pdf(
-                    title=session.current_title or "Romanzo",
-                    author=session.form_data.user_name or "Autore",
-                    pdf_bytes=bytes(pdf_bytes),
-                    api_key=None,  # None = auto-detect da env in base al provider configurato
-                )
+                    # La funzione gestisce automaticamente quale API key usare (Gemini o OpenAI)
+                    critique, token_usage = await generate_literary_critique_from_pdf(
+                        title=session.current_title or "Romanzo",
+                        author=session.form_data.user_name or "Autore",
+                        pdf_path=pdf_path,
+                        api_key=None,  # None = auto-detect da env in base al provider configurato
+                    )
+                finally:
+                    pdf_path.unlink(missing_ok=True)
 
                 await update_critique_async(session_store, session_id, critique)
                 await update_critique_status_async(session_store, session_id, "completed", error=None)
@@ -480,21 +467,17 @@ async def background_resume_book_generation(
                     model=token_usage.get("model", "gemini-3-pro-preview"),
                 )
                 
-                print(f"[BOOK GENERATION] Valutazione critica completata: score={critique.get('score', 0)}")
+                logger.info("[BOOK GENERATION] Valutazione critica completata: score=%s", critique.get('score', 0))
         except Exception as e:
-            print(f"[BOOK GENERATION] ERRORE nella valutazione critica: {e}")
-            import traceback
-            traceback.print_exc()
+            logger.exception("[BOOK GENERATION] ERRORE nella valutazione critica: %s", e)
             # Niente placeholder: settiamo status failed e salviamo errore per UI (stop polling + retry).
             try:
                 await update_critique_status_async(session_store, session_id, "failed", error=str(e))
             except Exception as _e:
-                print(f"[BOOK GENERATION] WARNING: impossibile salvare critique_status failed: {_e}")
+                logger.warning("[BOOK GENERATION] impossibile salvare critique_status failed: %s", _e)
     except ValueError as e:
         error_msg = f"Errore di validazione: {str(e)}"
-        print(f"[BOOK GENERATION] ERRORE (ValueError): {error_msg}")
-        import traceback
-        traceback.print_exc()
+        logger.exception("[BOOK GENERATION] ERRORE (ValueError): %s", error_msg)
         session = await get_session_async(session_store, session_id)
         existing_total = 0
         if session and session.writing_progress:
@@ -512,9 +495,7 @@ async def background_resume_book_generation(
         )
     except Exception as e:
         error_msg = f"Errore nella ripresa generazione: {str(e)}"
-        print(f"[BOOK GENERATION] ERRORE (Exception): {error_msg}")
-        import traceback
-        traceback.print_exc()
+        logger.exception("[BOOK GENERATION] ERRORE (Exception): %s", error_msg)
         session = await get_session_async(session_store, session_id)
         existing_total = 0
         if session and session.writing_progress:
@@ -0,0 +1,259 @@
+"""Costruzione del BookProgress condivisa tra polling del progresso e ripristino sessione."""
+import hashlib
+import logging
+from collections import OrderedDict
+from typing import Optional
+
+from app.models import BookProgress, LiteraryCritique
+from app.agent.session_store import SessionData, get_session_store
+from app.agent.session_store_helpers import set_outline_section_count_async
+from app.agent.writer_generator import count_outline_sections
+from app.core.config import get_app_config
+from app.services.pdf_service import build_chapters_fast, calculate_total_pages
+from app.services.stats_service import calculate_generation_cost
+
+logger = logging.getLogger(__name__)
+
+# Piccola cache LRU dei BookProgress: i poll ravvicinati senza cambi di stato
+# restituiscono l'oggetto già costruito. Una sola voce per sessione (session_id -> (stato, progresso)):
+# un libro in scrittura sostituisce la propria voce invece di accumulare versioni con i capitoli
+_PROGRESS_CACHE_MAX_ENTRIES = 128
+_progress_cache: "OrderedDict[str, tuple[tuple, BookProgress]]" = OrderedDict()
+
+
+def _progress_state(session: SessionData, session_id: str) -> tuple:
+    """
+    Tutti i campi della sessione che determinano il BookProgress: cambia a ogni salvataggio,
+    nuovo capitolo o aggiornamento del progresso, della critica, del costo o del tempo.
+    """
+    progress = session.writing_progress or {}
+    return (
+        session_id,
+        session.updated_at,
+        len(session.book_chapters or []),
+        session.critique_status,
+        session.real_cost_eur,
+        progress.get("current_step", 0),
+        progress.get("total_steps", 0),
+        progress.get("current_section_name"),
+        progress.get("is_complete", False),
+        progress.get("is_paused", False),
+        progress.get("error"),
+        progress.get("writing_time_minutes"),
+        session.critique_error,
+        session.outline_section_count,
+    )
+
+
+def _safe_int(value, default: int = 0) -> int:
+    """Converte un valore in int, restituendo default se non è numerico."""
+    try:
+        return int(value)
+    except (TypeError, ValueError):
+        return default
+
+
+def get_book_progress_etag(session: SessionData, session_id: str) -> str:
+    """
+    ETag debole del progresso: deriva da tutti i campi della sessione che determinano la risposta
+    (gli stessi che validano la cache del BookProgress), così errori di
+    generazione o della critica e aggiornamenti tardivi di costo/tempo non vengono nascosti da un 304.
+    """
+    digest = hashlib.md5(repr(_progress_state(session, session_id)).encode("utf-8")).hexdigest()
+    return f'W/"{digest}"'
+
+
+async def calculate_estimated_time(
+    session: SessionData,
+    current_step: int,
+    total_steps: int,
+) -> tuple[Optional[float], Optional[str]]:
+    """Calcola la stima del tempo rimanente per completare il libro usando modello lineare."""
+    try:
+        current_step = _safe_int(current_step)
+        total_steps = _safe_int(total_steps)
+        
+        if total_steps <= 0:
+            return None, None
+        
+        remaining_chapters = total_steps - current_step
+        if remaining_chapters <= 0:
+            return None, None
+        
+        app_config = get_app_config()
+        current_model = session.form_data.llm_model if session.form_data else None
+        
+        from app.utils.stats_utils import get_generation_method, get_linear_params_for_method, calculate_residual_time_linear
+        method = get_generation_method(current_model)
+        a, b = get_linear_params_for_method(method, app_config)
+        
+        k = current_step + 1
+        N = total_steps
+        
+        estimated_seconds = calculate_residual_time_linear(k, N, a, b)
+        estimated_minutes = estimated_seconds / 60
+        
+        return round(estimated_minutes, 1), None
+    
+    except Exception as e:
+        logger.exception("[CALCULATE_ESTIMATED_TIME] ERRORE nel calcolo stima tempo: %s", e)
+        return None, None
+
+
+async def build_book_progress(session: SessionData, session_id: str) -> BookProgress:
+    """
+    Costruisce il BookProgress di una sessione a partire dal progresso salvato.
+    
+    Usato sia dal polling del progresso sia dal ripristino della sessione.
+    Il risultato è tenuto in una piccola cache LRU (una voce per sessione) finché la sessione non cambia.
+    
+    Args:
+        session: Sessione già caricata (e con accesso già verificato)
+        session_id: ID della sessione
+    
+    Returns:
+        BookProgress con capitoli, pagine, costi, critica e stima tempo
+    """
+    state = _progress_state(session, session_id)
+    cached = _progress_cache.get(session_id)
+    if cached is not None and cached[0] == state:
+        _progress_cache.move_to_end(session_id)
+        return cached[1]
+    
+    # Configurazione letta una sola volta (fallback stima tempo)
+    app_config = get_app_config()
+    
+    progress = session.writing_progress or {}
+    chapters = session.book_chapters or []
+    
+    # Converti i capitoli in oggetti Chapter (conteggio pagine in un solo passaggio)
+    completed_chapters = build_chapters_fast(chapters)
+    
+    # Calcola total_pages se il libro è completato
+    total_pages = None
+    is_complete = progress.get('is_complete', False)
+    if is_complete and len(completed_chapters) > 0:
+        total_pages = calculate_total_pages(completed_chapters)
+    
+    # Calcola writing_time_minutes se disponibile o calcolabile
+    writing_time_minutes = progress.get('writing_time_minutes')
+    if writing_time_minutes is None and is_complete:
+        if session.writing_start_time and session.writing_end_time:
+            delta = session.writing_end_time - session.writing_start_time
+            writing_time_minutes = delta.total_seconds() / 60
+    
+    # Costo reale basato sui token effettivi; per i libri vecchi senza tracking usa la stima,
+    # calcolata solo a libro completo (senza total_pages non c'è nulla da stimare)
+    estimated_cost = getattr(session, 'real_cost_eur', None)
+    if estimated_cost is None and is_complete and total_pages:
+        estimated_cost = calculate_generation_cost(session, total_pages)
+    
+    # Recupera la valutazione critica se disponibile
+    critique = None
+    if session.literary_critique:
+        try:
+            critique = LiteraryCritique.from_stored(session.literary_critique)
+        except Exception as e:
+            logger.error("[BOOK PROGRESS] Errore nel parsing critique: %s", e)
+    
+    # Backward-compat: sessioni vecchie potrebbero avere critique senza critique_status
+    critique_status = session.critique_status
+    critique_error = session.critique_error
+    if critique_status is None:
+        if critique is not None:
+            critique_status = "completed"
+        elif is_complete:
+            critique_status = "pending"
+    
+    # Calcola stima tempo se il libro non è completato
+    estimated_time_minutes = None
+    estimated_time_confidence = None
+    calculated_total_steps = None
+    if not is_complete:
+        raw_current = progress.get('current_step', 0)
+        raw_total = progress.get('total_steps', 0)
+        current_step = _safe_int(raw_current)
+        total_steps = _safe_int(raw_total)
+        if logger.isEnabledFor(logging.DEBUG):
+            logger.debug("[BOOK PROGRESS] Valori grezzi: current_step=%r, total_steps=%r", raw_current, raw_total)
+        
+        if current_step < 0:
+            logger.warning("[BOOK PROGRESS] current_step negativo (%s), correggo a 0", current_step)
+            current_step = 0
+        
+        # FALLBACK: Se total_steps è 0 ma is_complete è False, prova a calcolarlo dall'outline
+        if total_steps == 0:
+            logger.warning("[BOOK PROGRESS] total_steps è 0 nel progress dict, provo a calcolarlo dall'outline")
+            if session.current_outline:
+                try:
+                    total_steps = session.outline_section_count or count_outline_sections(session.current_outline)
+                    calculated_total_steps = total_steps
+                    if session.outline_section_count is None:
+                        # Memorizza il conteggio: i poll successivi non ri-analizzano l'outline
+                        session.outline_section_count = total_steps
+                        await set_outline_section_count_async(get_session_store(), session_id, total_steps)
+                    logger.info("[BOOK PROGRESS] Calcolato total_steps dall'outline: %s", total_steps)
+                except Exception as e:
+                    logger.error("[BOOK PROGRESS] Errore nel parsing outline per calcolare total_steps: %s", e)
+                    total_steps = 0
+            if total_steps == 0:
+                logger.info("[BOOK PROGRESS] total_steps ancora 0, uso default 1 per permettere calcolo")
+                total_steps = 1
+                calculated_total_steps = 1
+        
+        logger.debug("[BOOK PROGRESS] Calcolo stima tempo: current_step=%s, total_steps=%s", current_step, total_steps)
+        
+        # Calcola sempre la stima
+        estimated_time_minutes, estimated_time_confidence = await calculate_estimated_time(
+            session, current_step, total_steps
+        )
+        logger.debug("[BOOK PROGRESS] estimated_time_minutes: %s, confidence: %s", estimated_time_minutes, estimated_time_confidence)
+        
+        # Fallback finale
+        if estimated_time_minutes is None:
+            remaining = total_steps - current_step
+            if remaining > 0:
+                logger.warning("[BOOK PROGRESS] calculate_estimated_time ha restituito None, uso fallback finale")
+                time_config = app_config.get("time_estimation", {})
+                fallback_seconds = time_config.get("fallback_seconds_per_chapter", 45)
+                estimated_time_minutes = (remaining * fallback_seconds) / 60
+                estimated_time_confidence = "low"
+                logger.info("[BOOK PROGRESS] Fallback finale applicato: %.1f minuti", estimated_time_minutes)
+    
+    # Assicuriamoci che total_steps sia valido nel BookProgress
+    if not is_complete and calculated_total_steps is not None and calculated_total_steps > 0:
+        final_total_steps = calculated_total_steps
+    else:
+        final_total_steps = progress.get('total_steps', 0)
+    
+    # Ultima garanzia
+    if not is_complete and final_total_steps <= 0:
+        logger.warning("[BOOK PROGRESS] SAFETY: final_total_steps è %s, uso 1 come minimo", final_total_steps)
+        final_total_steps = 1
+    
+    logger.debug("[BOOK PROGRESS] Valori finali: total_steps=%s, estimated_time_minutes=%s, estimated_time_confidence=%s", final_total_steps, estimated_time_minutes, estimated_time_confidence)
+    
+    book_progress = BookProgress(
+        session_id=session_id,
+        current_step=progress.get('current_step', 0),
+        total_steps=final_total_steps,
+        current_section_name=progress.get('current_section_name'),
+        completed_chapters=completed_chapters,
+        is_complete=is_complete,
+        is_paused=progress.get('is_paused', False),
+        error=progress.get('error'),
+        total_pages=total_pages,
+        writing_time_minutes=writing_time_minutes,
+        estimated_cost=estimated_cost,
+        critique=critique,
+        critique_status=critique_status,
+        critique_error=critique_error,
+        estimated_time_minutes=estimated_time_minutes,
+        estimated_time_confidence=estimated_time_confidence,
+    )
+    
+    _progress_cache[session_id] = (state, book_progress)
+    _progress_cache.move_to_end(session_id)
+    if len(_progress_cache) > _PROGRESS_CACHE_MAX_ENTRIES:
+        _progress_cache.popitem(last=False)
+    return book_progress
@@ -1,8 +1,11 @@
 """Service per la generazione di critiche letterarie."""
+import logging
+import hashlib
 import os
-import sys
+from functools import lru_cache
 from pathlib import Path
 from typing import Optional
+from xml.sax.saxutils import escape as xml_escape
 
 from google.cloud import texttospeech
 
@@ -13,33 +16,160 @@ from app.agent.session_store import get_session_store
 from app.agent.session_store_helpers import get_session_async
 from app.agent.literary_critic import generate_literary_critique_from_pdf
 
+logger = logging.getLogger(__name__)
+
+
+# Root del progetto (backend/app/services -> root), calcolata una sola volta
+_ROOT_DIR = Path(__file__).resolve().parent.parent.parent
+
+
+@lru_cache(maxsize=1)
+def _get_default_credentials_path() -> Optional[str]:
+    """Restituisce il path delle credenziali di default se esiste, altrimenti None."""
+    default_cred_path = _ROOT_DIR / "credentials" / "narrai-app-credentials.json"
+    if default_cred_path.exists():
+        return str(default_cred_path)
+    return None
+
 
 def setup_google_tts_credentials():
-    """Configura le credenziali Google Cloud per Text-to-Speech."""
+    """
+    Configura le credenziali Google Cloud per Text-to-Speech.
+    
+    Eseguita una sola volta all'avvio dell'app (hook di startup in main.py),
+    così le richieste trovano GOOGLE_APPLICATION_CREDENTIALS già impostata.
+    """
     cred_path = os.getenv("GOOGLE_APPLICATION_CREDENTIALS")
     
     if not cred_path:
-        root_dir = Path(__file__).parent.parent.parent
-        default_cred_path = root_dir / "credentials" / "narrai-app-credentials.json"
-        if default_cred_path.exists():
-            cred_path = str(default_cred_path)
+        default_cred_path = _get_default_credentials_path()
+        if default_cred_path:
+            cred_path = default_cred_path
             os.environ["GOOGLE_APPLICATION_CREDENTIALS"] = cred_path
-            print(f"[CRITIQUE AUDIO] Usando credenziali di default: {cred_path}", file=sys.stderr)
+            logger.info("[CRITIQUE AUDIO] Usando credenziali di default: %s", cred_path)
         else:
-            print(f"[CRITIQUE AUDIO] WARNING: Nessuna credenziale trovata. Cerca GOOGLE_APPLICATION_CREDENTIALS o credentials/narrai-app-credentials.json", file=sys.stderr)
+            logger.warning("[CRITIQUE AUDIO] Nessuna credenziale trovata. Cerca GOOGLE_APPLICATION_CREDENTIALS o credentials/narrai-app-credentials.json")
     elif not Path(cred_path).is_absolute():
-        root_dir = Path(__file__).parent.parent.parent
-        abs_cred_path = (root_dir / cred_path.lstrip("./")).resolve()
+        abs_cred_path = (_ROOT_DIR / cred_path.lstrip("./")).resolve()
         if abs_cred_path.exists():
             os.environ["GOOGLE_APPLICATION_CREDENTIALS"] = str(abs_cred_path)
-            print(f"[CRITIQUE AUDIO] Credenziali caricate da: {abs_cred_path}", file=sys.stderr)
+            logger.info("[CRITIQUE AUDIO] Credenziali caricate da: %s", abs_cred_path)
         else:
-            print(f"[CRITIQUE AUDIO] WARNING: Path credenziali non trovato: {abs_cred_path}", file=sys.stderr)
+            logger.warning("[CRITIQUE AUDIO] Path credenziali non trovato: %s", abs_cred_path)
     else:
         if Path(cred_path).exists():
-            print(f"[CRITIQUE AUDIO] Credenziali caricate da: {cred_path}", file=sys.stderr)
+            logger.info("[CRITIQUE AUDIO] Credenziali caricate da: %s", cred_path)
         else:
-            print(f"[CRITIQUE AUDIO] WARNING: Path credenziali non trovato: {cred_path}", file=sys.stderr)
+            logger.warning("[CRITIQUE AUDIO] Path credenziali non trovato: %s", cred_path)
+
+
+# Limite dell'input del Text-to-Speech: 5000 byte di SSML, markup incluso
+_TTS_MAX_INPUT_BYTES = 5000
+_SSML_SECTION_BREAK = '<break time="400ms"/>'
+DEFAULT_TTS_VOICE = "it-IT-Standard-A"
+
+
+def _utf8_len(text: str) -> int:
+    """Lunghezza in byte UTF-8 (l'unità del limite del Text-to-Speech)."""
+    return len(text.encode("utf-8"))
+
+
+def _truncate_ssml_sentence(text: str, max_bytes: int) -> Optional[str]:
+    """
+    Frase SSML <s>testo...</s> con il prefisso più lungo del testo che sta in max_bytes.
+    Il taglio avviene sul testo non ancora escapato: nessuna entità XML o carattere
+    multibyte viene spezzato. None se non entra nemmeno un carattere.
+    """
+    def fits(n: int) -> bool:
+        return _utf8_len(f"<s>{xml_escape(text[:n])}...</s>") <= max_bytes
+    
+    # Ricerca binaria: la lunghezza della frase cresce con il prefisso
+    low, high = 0, len(text)
+    while low < high:
+        mid = (low + high + 1) // 2
+        if fits(mid):
+            low = mid
+        else:
+            high = mid - 1
+    if low == 0:
+        return None
+    return f"<s>{xml_escape(text[:low])}...</s>"
+
+
+def build_critique_ssml(critique: LiteraryCritique, max_bytes: int = _TTS_MAX_INPUT_BYTES) -> Optional[str]:
+    """
+    Costruisce l'input SSML per la lettura della critica.
+    
+    Ogni sezione (Sintesi, Punti di forza, Punti di debolezza) è un paragrafo
+    con un titolo a ritmo leggermente ridotto e una frase per ogni punto;
+    le sezioni sono separate da una pausa breve invece che da ". ".
+    
+    Args:
+        critique: Critica letteraria da leggere
+        max_bytes: Dimensione massima dell'SSML in byte UTF-8 (testo escapato e markup)
+    
+    Returns:
+        Stringa SSML, oppure None se la critica non ha contenuto
+    """
+    sections = []
+    if critique.summary:
+        sections.append(("Sintesi", [critique.summary]))
+    if critique.pros:
+        sections.append(("Punti di forza", critique.pros))
+    if critique.cons:
+        sections.append(("Punti di debolezza", critique.cons))
+    
+    paragraphs = []
+    used = _utf8_len("<speak></speak>")
+    truncated = False
+    for title, sentences in sections:
+        header = f'<p><prosody rate="95%">{title}.</prosody>'
+        # Markup fisso del paragrafo: titolo, chiusura e pausa dalla sezione precedente
+        overhead = _utf8_len(header) + _utf8_len("</p>") + (_utf8_len(_SSML_SECTION_BREAK) if paragraphs else 0)
+        body = []
+        body_bytes = 0
+        for sentence in sentences:
+            text = sentence.strip() if sentence else ""
+            if not text:
+                continue
+            sentence_ssml = f"<s>{xml_escape(text)}</s>"
+            available = max_bytes - used - overhead - body_bytes
+            if _utf8_len(sentence_ssml) > available:
+                sentence_ssml = _truncate_ssml_sentence(text, available)
+                truncated = True
+            if sentence_ssml:
+                body.append(sentence_ssml)
+                body_bytes += _utf8_len(sentence_ssml)
+            if truncated:
+                break
+        if body:
+            paragraphs.append(f'{header}{"".join(body)}</p>')
+            used += overhead + body_bytes
+        if truncated:
+            logger.info("[CRITIQUE AUDIO] Testo troncato a %s byte di SSML", max_bytes)
+            break
+    
+    if not paragraphs:
+        return None
+    
+    return f"<speak>{_SSML_SECTION_BREAK.join(paragraphs)}</speak>"
+
+
+def get_critique_audio_etag(critique: LiteraryCritique, voice_name: Optional[str] = None) -> Optional[str]:
+    """
+    Calcola l'ETag dell'audio della critica senza invocare il Text-to-Speech.
+    
+    L'audio dipende solo dall'SSML e dalla voce, quindi l'hash di questi due
+    valori identifica il contenuto e permette di rispondere 304 alle revalidazioni.
+    
+    Returns:
+        ETag quotato, oppure None se la critica non ha contenuto
+    """
+    ssml = build_critique_ssml(critique)
+    if not ssml:
+        return None
+    digest = hashlib.md5(f"{voice_name or DEFAULT_TTS_VOICE}\n{ssml}".encode("utf-8")).hexdigest()
+    return f'"{digest}"'
 
 
 def handle_tts_error(e: Exception) -> HTTPException:
@@ -104,45 +234,25 @@ async def generate_critique_audio(
     if isinstance(critique, dict):
         critique = LiteraryCritique(**critique)
     
-    # Costruisci testo completo per la sintesi vocale
-    text_parts = []
-    
-    if critique.summary:
-        text_parts.append(f"Sintesi: {critique.summary}")
-    
-    if critique.pros and len(critique.pros) > 0:
-        pros_text = ". ".join(critique.pros)
-        text_parts.append(f"Punti di forza: {pros_text}")
-    
-    if critique.cons and len(critique.cons) > 0:
-        cons_text = ". ".join(critique.cons)
-        text_parts.append(f"Punti di debolezza: {cons_text}")
-    
-    if not text_parts:
+    # Costruisci SSML per la sintesi vocale (pause tra sezioni gestite dal markup)
+    ssml = build_critique_ssml(critique)
+    if not ssml:
         raise HTTPException(status_code=400, detail="Critica vuota, nessun contenuto da leggere")
     
-    full_text = ". ".join(text_parts)
-    
-    # Limita la lunghezza del testo
-    max_chars = 4500
-    if len(full_text) > max_chars:
-        full_text = full_text[:max_chars] + "..."
-        print(f"[CRITIQUE AUDIO] Testo troncato a {max_chars} caratteri", file=sys.stderr)
-    
     # Configurazione voce italiana
     if not voice_name:
-        voice_name = "it-IT-Standard-A"
+        voice_name = DEFAULT_TTS_VOICE
     
     # Inizializza client Google Cloud Text-to-Speech
+    # (le credenziali sono risolte una sola volta all'avvio, vedi setup_google_tts_credentials)
     try:
-        setup_google_tts_credentials()
         client = texttospeech.TextToSpeechClient()
-        print(f"[CRITIQUE AUDIO] Client TTS inizializzato con successo", file=sys.stderr)
+        logger.info("[CRITIQUE AUDIO] Client TTS inizializzato con successo")
     except Exception as e:
         raise handle_tts_error(e)
     
     # Configura sintesi vocale
-    synthesis_input = texttospeech.SynthesisInput(text=full_text)
+    synthesis_input = texttospeech.SynthesisInput(ssml=ssml)
     
     voice = texttospeech.VoiceSelectionParams(
         language_code="it-IT",
@@ -165,12 +275,12 @@ async def generate_critique_audio(
             audio_config=audio_config,
         )
         
-        print(f"[CRITIQUE AUDIO] Audio generato con successo per sessione {session_id} ({len(response.audio_content)} bytes)", file=sys.stderr)
+        logger.info("[CRITIQUE AUDIO] Audio generato con successo per sessione %s (%s bytes)", session_id, len(response.audio_content))
         return response.audio_content
         
     except Exception as e:
         error_str = str(e)
-        print(f"[CRITIQUE AUDIO] Errore nella sintesi vocale: {error_str}", file=sys.stderr)
+        logger.error("[CRITIQUE AUDIO] Errore nella sintesi vocale: %s", error_str)
         raise handle_tts_error(e)
 
 
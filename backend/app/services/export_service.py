@@ -14,6 +14,7 @@ from docx.enum.text import WD_ALIGN_PARAGRAPH
 from app.agent.session_store import SessionData
 from app.services.pdf_service import (
     get_model_abbreviation,
+    get_pdf_title_slug,
     escape_html,
     markdown_to_html,
 )
@@ -209,10 +210,7 @@ def generate_epub(session: SessionData) -> tuple[bytes, str]:
     # Nome file
     date_prefix = datetime.now().strftime("%Y-%m-%d")
     model_abbrev = get_model_abbreviation(session.form_data.llm_model)
-    title_sanitized = "".join(c for c in book_title if c.isalnum() or c in (' ', '-', '_')).rstrip()
-    title_sanitized = title_sanitized.replace(" ", "_")
-    if not title_sanitized:
-        title_sanitized = f"Libro_{session.session_id[:8]}"
+    title_sanitized = get_pdf_title_slug(session)
     filename = f"{date_prefix}_{model_abbrev}_{title_sanitized}.epub"
     
     return epub_bytes, filename
@@ -343,10 +341,7 @@ def generate_docx(session: SessionData) -> tuple[bytes, str]:
     # Nome file
     date_prefix = datetime.now().strftime("%Y-%m-%d")
     model_abbrev = get_model_abbreviation(session.form_data.llm_model)
-    title_sanitized = "".join(c for c in book_title if c.isalnum() or c in (' ', '-', '_')).rstrip()
-    title_sanitized = title_sanitized.replace(" ", "_")
-    if not title_sanitized:
-        title_sanitized = f"Libro_{session.session_id[:8]}"
+    title_sanitized = get_pdf_title_slug(session)
     filename = f"{date_prefix}_{model_abbrev}_{title_sanitized}.docx"
     
     return docx_bytes, filename
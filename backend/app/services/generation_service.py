@@ -7,6 +7,7 @@ from app.models import SubmissionRequest, QuestionAnswer
 from app.agent.question_generator import generate_questions
 from app.agent.draft_generator import generate_draft
 from app.agent.outline_generator import generate_outline
+from app.agent.writer_generator import count_outline_sections
 from app.agent.session_store import get_session_store
 from app.agent.session_store_helpers import (
     update_questions_progress_async,
@@ -17,6 +18,7 @@ from app.agent.session_store_helpers import (
     update_outline_async,
     get_session_async,
     update_token_usage_async,
+    set_outline_section_count_async,
 )
 from app.core.config import get_app_config
 
@@ -249,6 +251,14 @@ async def background_generate_outline(
             # Salva l'outline nella sessione
             await update_outline_async(session_store, session_id, outline_text)
             
+            # Memorizza il numero di sezioni, così il polling del progresso non ri-analizza l'outline
+            try:
+                await set_outline_section_count_async(
+                    session_store, session_id, count_outline_sections(outline_text)
+                )
+            except ValueError:
+                pass
+            
             # Salva token usage per la fase outline
             await update_token_usage_async(
                 session_store,
@@ -1,9 +1,9 @@
 """Servizio per la gestione della libreria e file system."""
-from pathlib import Path
 from datetime import datetime
 from typing import Optional
 from app.agent.session_store import SessionData, get_session_store
-from app.services.pdf_service import get_model_abbreviation, calculate_page_count
+from app.services.pdf_service import get_expected_pdf_filename, calculate_page_count
+from app.services.storage_service import BOOKS_DIR
 from app.core.config import get_app_config
 import math
 
@@ -12,15 +12,14 @@ def scan_pdf_directory() -> list:
     """Scansiona la directory books/ e restituisce lista di PDF disponibili."""
     from app.models import PdfEntry
     
-    books_dir = Path(__file__).parent.parent.parent / "books"
     pdf_entries = []
     
-    if not books_dir.exists():
+    if not BOOKS_DIR.exists():
         return pdf_entries
     
     session_store = get_session_store()
     
-    for pdf_file in sorted(books_dir.glob("*.pdf"), key=lambda x: x.stat().st_mtime, reverse=True):
+    for pdf_file in sorted(BOOKS_DIR.glob("*.pdf"), key=lambda x: x.stat().st_mtime, reverse=True):
         try:
             # Prova a parsare il nome file: YYYY-MM-DD_g3p_TitoloLibro.pdf
             filename = pdf_file.name
@@ -44,11 +43,7 @@ def scan_pdf_directory() -> list:
             for sid, session in session_store._sessions.items():
                 # Genera il nome file atteso per questa sessione
                 if session.current_title:
-                    date_prefix = session.created_at.strftime("%Y-%m-%d")
-                    model_abbrev = get_model_abbreviation(session.form_data.llm_model)
-                    title_sanitized = "".join(c for c in session.current_title if c.isalnum() or c in (' ', '-', '_')).rstrip()
-                    title_sanitized = title_sanitized.replace(" ", "_")
-                    expected_filename = f"{date_prefix}_{model_abbrev}_{title_sanitized}.pdf"
+                    expected_filename = get_expected_pdf_filename(session)
                     
                     if filename == expected_filename:
                         session_id = sid
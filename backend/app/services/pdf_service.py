@@ -1,4 +1,7 @@
 """Servizio per la generazione e gestione di file PDF."""
+import os
+import re
+from functools import lru_cache
 from pathlib import Path
 from io import BytesIO
 from datetime import datetime
@@ -13,13 +16,16 @@ from reportlab.platypus import SimpleDocTemplate, Paragraph, Spacer, PageBreak
 from reportlab.lib.enums import TA_CENTER
 from xhtml2pdf import pisa
 from app.agent.session_store import SessionData
+from app.models import Chapter
 from app.core.config import get_app_config
 from app.services.storage_service import get_storage_service
 
 
+@lru_cache(maxsize=64)
 def get_model_abbreviation(model_name: str) -> str:
     """
     Converte il nome completo del modello in una versione abbreviata per il nome del PDF.
+    Memoizzata: i modelli distinti sono pochi.
     
     Args:
         model_name: Nome completo del modello (es: "gemini-2.5-flash", "gemini-3-pro-preview")
@@ -41,6 +47,93 @@ def get_model_abbreviation(model_name: str) -> str:
         return model_name.replace("gemini-", "g").replace("-", "").replace("_", "")[:6]
 
 
+# Caratteri ammessi nei nomi file: alfanumerici Unicode (\w, come str.isalnum() più "_"), spazio e "-"
+_FILENAME_UNSAFE_CHARS_RE = re.compile(r"[^\w \-]")
+
+
+@lru_cache(maxsize=2048)
+def sanitize_title_for_filename(title: str) -> str:
+    """Rimuove i caratteri non ammessi dal titolo e sostituisce gli spazi con "_"."""
+    return _FILENAME_UNSAFE_CHARS_RE.sub("", title).rstrip().replace(" ", "_")
+
+
+def get_pdf_title_slug(session: SessionData) -> str:
+    """Parte del nome dei file esportati (PDF, EPUB, DOCX) derivata dal titolo (Libro_<id> se il titolo non ha caratteri validi)."""
+    return sanitize_title_for_filename(session.current_title or "Romanzo") or f"Libro_{session.session_id[:8]}"
+
+
+def get_expected_pdf_filename(session: SessionData) -> str:
+    """
+    Nome del PDF salvato al completamento del libro: YYYY-MM-DD_<modello>_<titolo>.pdf.
+    
+    La data è quella di creazione della sessione, così il nome è ricostruibile
+    in qualunque momento (libreria, pulizia, eliminazione).
+    """
+    return _build_expected_pdf_filename(session.created_at, session.form_data.llm_model, get_pdf_title_slug(session))
+
+
+@lru_cache(maxsize=4096)
+def _build_expected_pdf_filename(created_at: datetime, llm_model: str, title_slug: str) -> str:
+    """
+    Parte memoizzata di get_expected_pdf_filename: lo stesso libro viene chiesto più volte
+    per richiesta (LibraryEntry, ricerca del PDF locale), così strftime e abbreviazione
+    del modello sono eseguiti una sola volta per libro.
+    """
+    return f"{created_at.strftime('%Y-%m-%d')}_{get_model_abbreviation(llm_model)}_{title_slug}.pdf"
+
+
+def _is_session_pdf_name(name: str, id_prefix: str) -> bool:
+    """
+    Un PDF locale appartiene al libro se il nome contiene il prefisso del session_id.
+    Nessun confronto sul titolo: un titolo generico (es. "Romanzo") corrisponderebbe ai PDF
+    di altri libri e altri utenti, e questi nomi servono per eliminare file.
+    """
+    return id_prefix in name[:-len(".pdf")]
+
+
+def index_local_pdfs(books_dir: Path) -> dict[str, Path]:
+    """Indice nome file -> path dei PDF locali, costruito con una sola scansione della cartella."""
+    with os.scandir(books_dir) as scan:
+        return {
+            item.name: Path(item.path)
+            for item in scan
+            if item.name.endswith(".pdf") and item.is_file()
+        }
+
+
+def match_local_pdf(local_pdfs: dict[str, Path], session: SessionData) -> Optional[str]:
+    """Cerca nell'indice un PDF del libro quando il nome atteso non esiste (prefisso del session_id nel nome)."""
+    id_prefix = session.session_id[:8]
+    for name in local_pdfs:
+        if _is_session_pdf_name(name, id_prefix):
+            return name
+    return None
+
+
+def locate_pdf_for_session(local_pdfs: dict[str, Path], session: SessionData) -> Optional[str]:
+    """
+    Nome del PDF locale del libro nell'indice: quello atteso se presente (ricerca O(1)),
+    altrimenti il primo che corrisponde a match_local_pdf.
+    """
+    expected_filename = get_expected_pdf_filename(session)
+    if expected_filename in local_pdfs:
+        return expected_filename
+    return match_local_pdf(local_pdfs, session)
+
+
+def find_local_pdf(books_dir: Path, session: SessionData) -> Optional[Path]:
+    """
+    Come match_local_pdf, ma per un solo libro senza indice: scansione della cartella
+    interrotta al primo PDF che corrisponde, senza creare un Path per ogni file.
+    """
+    id_prefix = session.session_id[:8]
+    with os.scandir(books_dir) as scan:
+        for item in scan:
+            if item.name.endswith(".pdf") and _is_session_pdf_name(item.name, id_prefix) and item.is_file():
+                return Path(item.path)
+    return None
+
+
 def escape_html(text: str) -> str:
     """Escapa caratteri speciali per HTML."""
     if not text:
@@ -81,13 +174,62 @@ def calculate_page_count(content: str) -> int:
         return 0
 
 
+def calculate_page_counts(contents: list[str]) -> list[int]:
+    """
+    Calcola il numero di pagine di più contenuti in un solo passaggio.
+    
+    Equivale a chiamare calculate_page_count su ogni contenuto, ma legge la
+    configurazione una sola volta e usa aritmetica intera per l'arrotondamento.
+    """
+    words_per_page = get_app_config().get("validation", {}).get("words_per_page", 250)
+    return [max(1, -(-len(content.split()) // words_per_page)) if content else 0 for content in contents]
+
+
+def build_chapters_fast(book_chapters: list[dict]) -> list[Chapter]:
+    """
+    Converte i capitoli salvati nella sessione in oggetti Chapter con il conteggio pagine.
+    
+    Usa Chapter.model_construct per saltare la validazione pydantic: i capitoli
+    provengono dal nostro store e sono già stati validati in scrittura.
+    I page_count salvati con il capitolo sono riusati; si contano le parole solo per i capitoli vecchi.
+    """
+    contents = [ch_dict.get('content', '') for ch_dict in book_chapters]
+    page_counts = [ch_dict.get('page_count') for ch_dict in book_chapters]
+    missing = [idx for idx, page_count in enumerate(page_counts) if page_count is None]
+    if missing:
+        for idx, page_count in zip(missing, calculate_page_counts([contents[idx] for idx in missing])):
+            page_counts[idx] = page_count
+    return [
+        Chapter.model_construct(
+            title=ch_dict.get('title', f'Capitolo {idx + 1}'),
+            content=content,
+            section_index=ch_dict.get('section_index', idx),
+            page_count=page_count,
+        )
+        for idx, (ch_dict, content, page_count) in enumerate(zip(book_chapters, contents, page_counts))
+    ]
+
+
+def calculate_total_pages(chapters: list[Chapter]) -> int:
+    """
+    Calcola le pagine totali del libro: capitoli + copertina + indice.
+    
+    Usa i page_count già calcolati da build_chapters_fast, senza rileggere i contenuti.
+    """
+    toc_chapters_per_page = get_app_config().get("validation", {}).get("toc_chapters_per_page", 30)
+    chapters_pages = sum(ch.page_count for ch in chapters)
+    cover_pages = 1
+    toc_pages = (len(chapters) + toc_chapters_per_page - 1) // toc_chapters_per_page
+    return chapters_pages + cover_pages + toc_pages
+
+
 def generate_summary_pdf(session: SessionData) -> tuple[bytes, str]:
     """
     Genera un PDF con tutte le informazioni del romanzo (configurazione, bozza, outline).
     
     Args:
         session: SessionData object
-        
+    
     Returns:
         Tupla (pdf_bytes, filename)
     """
@@ -207,8 +349,7 @@ def generate_summary_pdf(session: SessionData) -> tuple[bytes, str]:
     
     # Nome file
     if session.current_title:
-        filename = "".join(c for c in session.current_title if c.isalnum() or c in (' ', '-', '_')).rstrip()
-        filename = filename.replace(" ", "_")
+        filename = sanitize_title_for_filename(session.current_title)
     else:
         filename = f"Romanzo_{session.session_id[:8]}"
     filename = f"{filename}.pdf"
@@ -222,7 +363,7 @@ def generate_complete_book_pdf(session: SessionData) -> tuple[bytes, str]:
     
     Args:
         session: SessionData object
-        
+    
     Returns:
         Tupla (pdf_bytes, filename)
     """
@@ -380,10 +521,7 @@ def generate_complete_book_pdf(session: SessionData) -> tuple[bytes, str]:
     # Nome file con data, modello e titolo (formato: YYYY-MM-DD_g3p_TitoloLibro.pdf)
     date_prefix = datetime.now().strftime("%Y-%m-%d")
     model_abbrev = get_model_abbreviation(session.form_data.llm_model)
-    title_sanitized = "".join(c for c in book_title if c.isalnum() or c in (' ', '-', '_')).rstrip()
-    title_sanitized = title_sanitized.replace(" ", "_")
-    if not title_sanitized:
-        title_sanitized = f"Libro_{session.session_id[:8]}"
+    title_sanitized = get_pdf_title_slug(session)
     filename = f"{date_prefix}_{model_abbrev}_{title_sanitized}.pdf"
     
     # Salva PDF su GCS o locale tramite StorageService
@@ -1,13 +1,15 @@
 """Service per il calcolo delle statistiche della libreria."""
 import math
 from datetime import datetime
-from collections import defaultdict
-from pathlib import Path
+import hashlib
+from collections import OrderedDict, defaultdict
+from functools import lru_cache
 from typing import Optional
 
 from app.models import LibraryEntry, LibraryStats, AdvancedStats, ModelComparisonEntry
 from app.agent.session_store import get_session_store
-from app.services.storage_service import get_storage_service
+from app.services.storage_service import get_storage_service, BOOKS_DIR
+from app.services.pdf_service import get_expected_pdf_filename
 from app.core.config import get_app_config
 
 # Campi da recuperare per le entry della libreria (ottimizzazione performance)
@@ -22,6 +24,7 @@ LIBRARY_ENTRY_FIELDS = [
     "created_at",
     "updated_at",
     # book_chapters RIMOSSO - troppo pesante, usa writing_progress.total_pages
+    "book_chapters.page_count",  # Solo il conteggio pagine per capitolo (salvato in scrittura), niente contenuto
     "writing_progress",
     # current_outline RIMOSSO - usa writing_progress.total_steps per conteggio sezioni
     "literary_critique",
@@ -32,33 +35,116 @@ LIBRARY_ENTRY_FIELDS = [
     "real_cost_eur",  # Costo reale basato su token effettivi
 ]
 
-# Cache in memoria per statistiche (TTL: 30 secondi)
-_stats_cache = {}
+# Cache in memoria per statistiche (TTL di default: 30 secondi).
+# Solo in-process: i valori sono gli oggetti stessi (modelli Pydantic inclusi), mai serializzati,
+# quindi chi li legge non deve rivalidarli
+# Limitata come la cache della libreria: le voci più vecchie escono per prime
+_stats_cache: "OrderedDict[object, tuple]" = OrderedDict()
 _stats_cache_ttl = 30  # secondi
+_STATS_CACHE_MAX_ENTRIES = 256
 
 
 def get_cached_stats(cache_key: str):
     """Recupera statistiche dalla cache se valide."""
-    if cache_key in _stats_cache:
-        data, timestamp = _stats_cache[cache_key]
-        if (datetime.now() - timestamp).total_seconds() < _stats_cache_ttl:
-            return data
-        else:
-            # Cache scaduta, rimuovi
-            del _stats_cache[cache_key]
+    cached = _stats_cache.get(cache_key)
+    if cached is None:
+        return None
+    data, timestamp, ttl = cached
+    if (datetime.now() - timestamp).total_seconds() < ttl:
+        return data
+    # Cache scaduta, rimuovi
+    _stats_cache.pop(cache_key, None)
     return None
 
 
-def set_cached_stats(cache_key: str, data):
-    """Salva statistiche nella cache."""
-    _stats_cache[cache_key] = (data, datetime.now())
+def set_cached_stats(cache_key: str, data, ttl: Optional[int] = None):
+    """Salva statistiche nella cache (ttl in secondi, default _stats_cache_ttl)."""
+    _stats_cache[cache_key] = (data, datetime.now(), ttl or _stats_cache_ttl)
+    _stats_cache.move_to_end(cache_key)
+    if len(_stats_cache) > _STATS_CACHE_MAX_ENTRIES:
+        _stats_cache.popitem(last=False)
+
+
+# Cache in memoria delle risposte di /api/library per utente e filtri (TTL: 30 secondi)
+_library_cache: "OrderedDict[tuple, tuple]" = OrderedDict()
+_LIBRARY_CACHE_MAX_ENTRIES = 256
+
+# Versione dei dati della libreria: incrementata a ogni scrittura (vedi invalidate_library_cache).
+# _library_version_per_user[None] conta le scritture di tutti gli utenti (statistiche globali admin)
+_library_version_per_user: dict[Optional[str], int] = defaultdict(int)
+_library_global_version = 0
+
+
+def get_library_cache_key(user_id: Optional[str], **params) -> tuple:
+    """Chiave di cache della libreria: utente + hash dei parametri della query."""
+    signature = "|".join(f"{name}={params[name]}" for name in sorted(params))
+    return (user_id, hashlib.blake2b(signature.encode("utf-8"), digest_size=16).hexdigest())
+
+
+def get_cached_library(cache_key: tuple):
+    """Recupera il corpo JSON di una risposta della libreria dalla cache se ancora valido."""
+    cached = _library_cache.get(cache_key)
+    if cached is None:
+        return None
+    data, timestamp = cached
+    if (datetime.now() - timestamp).total_seconds() >= _stats_cache_ttl:
+        del _library_cache[cache_key]
+        return None
+    _library_cache.move_to_end(cache_key)
+    return data
+
+
+def set_cached_library(cache_key: tuple, data):
+    """Salva il corpo JSON di una risposta della libreria nella cache (LRU limitata)."""
+    _library_cache[cache_key] = (data, datetime.now())
+    _library_cache.move_to_end(cache_key)
+    if len(_library_cache) > _LIBRARY_CACHE_MAX_ENTRIES:
+        _library_cache.popitem(last=False)
+
+
+def get_library_data_version(user_id: Optional[str]) -> tuple[int, int]:
+    """Versione corrente dei dati della libreria di un utente (None = tutti gli utenti)."""
+    return (_library_global_version, _library_version_per_user[user_id])
+
+
+def get_cached_library_stats(user_id: Optional[str], **filters) -> Optional[LibraryStats]:
+    """
+    Recupera le statistiche della libreria per utente e filtri se i dati non sono cambiati.
+    
+    La chiave include la versione dei dati: dopo una scrittura la voce non viene più trovata,
+    senza attendere la scadenza del TTL.
+    """
+    cache_key = ("lib_stats", get_library_data_version(user_id)) + get_library_cache_key(user_id, **filters)
+    return get_cached_stats(cache_key)
+
+
+def set_cached_library_stats(stats: LibraryStats, user_id: Optional[str], **filters):
+    """Salva le statistiche della libreria per utente e filtri alla versione corrente dei dati."""
+    version = get_library_data_version(user_id)
+    key_suffix = get_library_cache_key(user_id, **filters)
+    # Le voci di versioni precedenti non verrebbero più lette: rimuovile subito
+    for stale_key in [key for key in _stats_cache if key[0] == "lib_stats" and key[2:] == key_suffix]:
+        del _stats_cache[stale_key]
+    set_cached_stats(("lib_stats", version) + key_suffix, stats)
+
+
+def invalidate_library_cache(user_id: Optional[str] = None):
+    """Invalida le risposte della libreria di un utente, o di tutti se user_id è None."""
+    global _library_global_version
+    if user_id is None:
+        _library_global_version += 1
+        _library_cache.clear()
+        return
+    _library_version_per_user[user_id] += 1
+    _library_version_per_user[None] += 1
+    for cache_key in [key for key in _library_cache if key[0] == user_id]:
+        del _library_cache[cache_key]
 
 
 def invalidate_cache(cache_key: Optional[str] = None):
     """Invalida la cache. Se cache_key è None, invalida tutta la cache."""
     if cache_key:
-        if cache_key in _stats_cache:
-            del _stats_cache[cache_key]
+        _stats_cache.pop(cache_key, None)
     else:
         _stats_cache.clear()
 
@@ -97,8 +183,9 @@ def get_model_abbreviation(model_name: str) -> str:
         return model_name.replace("gemini-", "g").replace("-", "").replace("_", "")[:6]
 
 
+@lru_cache(maxsize=32)
 def llm_model_to_mode(model_name: Optional[str]) -> str:
-    """Converte il nome del modello LLM in modalità (Flash, Pro, Ultra)."""
+    """Converte il nome del modello LLM in modalità (Flash, Pro, Ultra). Memoizzata: chiamata per ogni libro."""
     if not model_name:
         return "Sconosciuto"
     
@@ -113,17 +200,18 @@ def llm_model_to_mode(model_name: Optional[str]) -> str:
         return "Sconosciuto"
 
 
-def mode_to_llm_models(mode: str) -> list[str]:
-    """Converte una modalità in lista di modelli LLM corrispondenti."""
+@lru_cache(maxsize=32)
+def mode_to_llm_models(mode: str) -> tuple[str, ...]:
+    """Converte una modalità nei modelli LLM corrispondenti (tupla immutabile, memoizzata)."""
     mode_lower = mode.lower()
     if mode_lower == "flash":
-        return ["gemini-2.5-flash", "gemini-3-flash"]
+        return ("gemini-2.5-flash", "gemini-3-flash")
     elif mode_lower == "pro":
-        return ["gemini-2.5-pro", "gemini-3-pro"]
+        return ("gemini-2.5-pro", "gemini-3-pro")
     elif mode_lower == "ultra":
-        return ["gemini-3-ultra"]
+        return ("gemini-3-ultra",)
     else:
-        return []
+        return ()
 
 
 def calculate_generation_cost(session, total_pages: Optional[int]) -> Optional[float]:
@@ -181,6 +269,46 @@ def calculate_generation_cost(session, total_pages: Optional[int]) -> Optional[f
         return None
 
 
+def sum_chapter_pages(book_chapters: list[dict]) -> Optional[int]:
+    """
+    Somma le pagine dei capitoli usando il page_count salvato in scrittura.
+    
+    Per i capitoli vecchi senza page_count conta le parole del contenuto; restituisce
+    None se il contenuto non è disponibile (sessione caricata con proiezione).
+    """
+    chapters_pages = 0
+    for ch in book_chapters:
+        page_count = ch.get('page_count')
+        if page_count is None:
+            if 'content' not in ch:
+                return None
+            page_count = calculate_page_count(ch['content'])
+        chapters_pages += page_count
+    return chapters_pages
+
+
+def get_session_pdf_location(session, status: str) -> tuple[Optional[str], Optional[str]]:
+    """
+    Path e nome del PDF di un libro completato (None, None se non disponibile).
+    Su GCS il path è costruito senza verificarne l'esistenza; in locale il file deve esistere.
+    """
+    if status != "complete":
+        return None, None
+    
+    expected_filename = get_expected_pdf_filename(session)
+    storage_service = get_storage_service()
+    
+    # Costruisci path senza verificare esistenza (verificato on-demand)
+    if storage_service.gcs_enabled:
+        return f"gs://{storage_service.bucket_name}/books/{expected_filename}", expected_filename
+    
+    # Verifica locale (veloce, no chiamate HTTP)
+    local_pdf_path = BOOKS_DIR / expected_filename
+    if local_pdf_path.exists():
+        return str(local_pdf_path), expected_filename
+    return None, None
+
+
 def session_to_library_entry(session, skip_cost_calculation: bool = False) -> LibraryEntry:
     """Converte una SessionData in una LibraryEntry."""
     import math
@@ -204,12 +332,13 @@ def session_to_library_entry(session, skip_cost_calculation: bool = False) -> Li
     
     # Per total_pages, usiamo il valore pre-calcolato
     if total_pages is None and status == "complete" and session.book_chapters:
-        chapters_pages = sum(calculate_page_count(ch.get('content', '')) for ch in session.book_chapters)
-        cover_pages = 1
-        app_config = get_app_config()
-        toc_chapters_per_page = app_config.get("validation", {}).get("toc_chapters_per_page", 30)
-        toc_pages = math.ceil(len(session.book_chapters) / toc_chapters_per_page)
-        total_pages = chapters_pages + cover_pages + toc_pages
+        chapters_pages = sum_chapter_pages(session.book_chapters)
+        if chapters_pages is not None:
+            cover_pages = 1
+            app_config = get_app_config()
+            toc_chapters_per_page = app_config.get("validation", {}).get("toc_chapters_per_page", 30)
+            toc_pages = math.ceil(len(session.book_chapters) / toc_chapters_per_page)
+            total_pages = chapters_pages + cover_pages + toc_pages
     
     # Estrai critique_score
     critique_score = None
@@ -219,34 +348,10 @@ def session_to_library_entry(session, skip_cost_calculation: bool = False) -> Li
         critique_score = getattr(session.literary_critique, 'score', None)
     
     # Cerca PDF collegato
-    pdf_path = None
-    pdf_filename = None
+    pdf_path, pdf_filename = get_session_pdf_location(session, status)
     pdf_url = None
     cover_url = None
     
-    storage_service = get_storage_service()
-    
-    if status == "complete":
-        # Prova a costruire il path atteso
-        date_prefix = session.created_at.strftime("%Y-%m-%d")
-        model_abbrev = get_model_abbreviation(session.form_data.llm_model)
-        title_sanitized = "".join(c for c in (session.current_title or "Romanzo") if c.isalnum() or c in (' ', '-', '_')).rstrip()
-        title_sanitized = title_sanitized.replace(" ", "_")
-        if not title_sanitized:
-            title_sanitized = f"Libro_{session.session_id[:8]}"
-        expected_filename = f"{date_prefix}_{model_abbrev}_{title_sanitized}.pdf"
-        
-        # Costruisci path senza verificare esistenza (verificato on-demand)
-        if storage_service.gcs_enabled:
-            pdf_path = f"gs://{storage_service.bucket_name}/books/{expected_filename}"
-            pdf_filename = expected_filename
-        else:
-            # Verifica locale (veloce, no chiamate HTTP)
-            local_pdf_path = Path(__file__).parent.parent.parent / "books" / expected_filename
-            if local_pdf_path.exists():
-                pdf_path = str(local_pdf_path)
-                pdf_filename = expected_filename
-    
     # Calcola writing_time_minutes
     writing_time_minutes = None
     if session.writing_progress:
@@ -383,7 +488,7 @@ def calculate_library_stats(entries: list[LibraryEntry]) -> LibraryStats:
         ):
             mode_time_sum_minutes[e.llm_model] += float(e.writing_time_minutes)
             mode_pages_sum_for_time[e.llm_model] += float(e.total_pages)
-
+    
     average_time_per_page_by_model = {}
     for mode in set(list(mode_time_sum_minutes.keys()) + list(mode_pages_sum_for_time.keys())):
         pages_sum = mode_pages_sum_for_time.get(mode, 0.0)
@@ -568,15 +673,14 @@ def scan_pdf_directory() -> list:
     """Scansiona la directory books/ e restituisce lista di PDF disponibili."""
     from app.models import PdfEntry
     
-    books_dir = Path(__file__).parent.parent.parent / "books"
     pdf_entries = []
     
-    if not books_dir.exists():
+    if not BOOKS_DIR.exists():
         return pdf_entries
     
     session_store = get_session_store()
     
-    for pdf_file in sorted(books_dir.glob("*.pdf"), key=lambda x: x.stat().st_mtime, reverse=True):
+    for pdf_file in sorted(BOOKS_DIR.glob("*.pdf"), key=lambda x: x.stat().st_mtime, reverse=True):
         try:
             filename = pdf_file.name
             stem = pdf_file.stem
@@ -597,11 +701,7 @@ def scan_pdf_directory() -> list:
             if hasattr(session_store, '_sessions'):
                 for sid, session in session_store._sessions.items():
                     if session.current_title:
-                        date_prefix = session.created_at.strftime("%Y-%m-%d")
-                        model_abbrev = get_model_abbreviation(session.form_data.llm_model)
-                        title_sanitized = "".join(c for c in session.current_title if c.isalnum() or c in (' ', '-', '_')).rstrip()
-                        title_sanitized = title_sanitized.replace(" ", "_")
-                        expected_filename = f"{date_prefix}_{model_abbrev}_{title_sanitized}.pdf"
+                        expected_filename = get_expected_pdf_filename(session)
                         
                         if filename == expected_filename:
                             session_id = sid
@@ -1,8 +1,10 @@
 """Servizio per la gestione di file su Google Cloud Storage o locale."""
 import os
+import shutil
 from pathlib import Path
-from typing import Optional
+from typing import Optional, Iterator, Iterable
 from io import BytesIO
+from concurrent.futures import ThreadPoolExecutor
 from datetime import timedelta
 from dotenv import load_dotenv
 
@@ -26,6 +28,38 @@ except ImportError:
     storage = None
     NotFound = Exception
 
+# Cartelle locali dei PDF (backend/books) e delle copertine (backend/sessions), condivise da servizi e router
+BOOKS_DIR = Path(__file__).resolve().parent.parent.parent / "books"
+COVERS_DIR = Path(__file__).resolve().parent.parent.parent / "sessions"
+
+def existing_local_paths(paths: Iterable[Optional[str]]) -> set[str]:
+    """
+    Sottoinsieme dei path locali che esistono su disco (path vuoti e gs:// esclusi).
+    Pensata per essere eseguita in un thread (asyncio.to_thread) dagli endpoint async.
+    """
+    return {path for path in paths if path and not path.startswith("gs://") and os.path.exists(path)}
+
+
+def remove_local_file(path: str) -> bool:
+    """
+    Elimina un file locale con una sola chiamata di sistema (niente exists() prima di unlink).
+    
+    Returns:
+        True se il file è stato eliminato, False se non esisteva
+    """
+    try:
+        os.unlink(path)
+        return True
+    except FileNotFoundError:
+        return False
+
+
+# Dimensione dei blocchi letti da open_stream (64 KB)
+STREAM_CHUNK_SIZE = 64 * 1024
+
+# Eliminazioni GCS contemporanee massime in delete_files
+GCS_DELETE_CONCURRENCY = 32
+
 
 class StorageService:
     """
@@ -95,22 +129,63 @@ class StorageService:
         Returns:
             Path del file caricato (gs://bucket/path per GCS, path locale per fallback)
         """
-        # Se user_id fornito E GCS è abilitato, organizza i file per utente
-        # Struttura: users/{user_id}/books/... o users/{user_id}/covers/...
-        # Se user_id non è disponibile o GCS non è abilitato, usa la struttura root: covers/... o books/...
-        if user_id and self.gcs_enabled:
-            if "books/" in destination_path:
-                destination_path = f"users/{user_id}/books/{destination_path.split('books/')[-1]}"
-            elif "covers/" in destination_path:
-                destination_path = f"users/{user_id}/covers/{destination_path.split('covers/')[-1]}"
-            else:
-                destination_path = f"users/{user_id}/{destination_path}"
+        destination_path = self._user_destination_path(destination_path, user_id)
         
         if self.gcs_enabled:
             return self._upload_to_gcs(data, destination_path, content_type)
         else:
             return self._upload_to_local(data, destination_path)
     
+    def upload_local_file(
+        self,
+        source_path: Path,
+        destination_path: str,
+        content_type: Optional[str] = None,
+        user_id: Optional[str] = None,
+    ) -> str:
+        """
+        Carica su GCS o locale un file già presente su disco, senza leggerlo in memoria.
+        
+        Args:
+            source_path: File locale da caricare
+            destination_path: Path di destinazione (come upload_file)
+            content_type: MIME type del file
+            user_id: ID utente per organizzare i file per utente (opzionale)
+        
+        Returns:
+            Path del file caricato (gs://bucket/path per GCS, path locale per fallback)
+        """
+        destination_path = self._user_destination_path(destination_path, user_id)
+        
+        if self.gcs_enabled:
+            if self.bucket is None:
+                self._init_gcs_client()
+            blob = self.bucket.blob(destination_path)
+            # upload_from_filename legge il file a blocchi
+            blob.upload_from_filename(str(source_path), content_type=content_type)
+            gcs_path = f"gs://{self.bucket_name}/{destination_path}"
+            print(f"[STORAGE] File caricato su GCS: {gcs_path} ({content_type or 'no content-type'})")
+            return gcs_path
+        
+        local_path = self._local_destination_path(destination_path)
+        shutil.copyfile(source_path, local_path)
+        print(f"[STORAGE] File salvato localmente: {local_path}")
+        return str(local_path)
+    
+    def _user_destination_path(self, destination_path: str, user_id: Optional[str]) -> str:
+        """
+        Se user_id fornito E GCS è abilitato, organizza i file per utente.
+        Struttura: users/{user_id}/books/... o users/{user_id}/covers/...
+        Se user_id non è disponibile o GCS non è abilitato, usa la struttura root: covers/... o books/...
+        """
+        if not (user_id and self.gcs_enabled):
+            return destination_path
+        if "books/" in destination_path:
+            return f"users/{user_id}/books/{destination_path.split('books/')[-1]}"
+        if "covers/" in destination_path:
+            return f"users/{user_id}/covers/{destination_path.split('covers/')[-1]}"
+        return f"users/{user_id}/{destination_path}"
+    
     def _upload_to_gcs(
         self,
         data: bytes,
@@ -140,6 +215,16 @@ class StorageService:
     
     def _upload_to_local(self, data: bytes, destination_path: str) -> str:
         """Upload su filesystem locale (fallback)."""
+        local_path = self._local_destination_path(destination_path)
+        
+        with open(local_path, 'wb') as f:
+            f.write(data)
+        
+        print(f"[STORAGE] File salvato localmente: {local_path}")
+        return str(local_path)
+    
+    def _local_destination_path(self, destination_path: str) -> Path:
+        """Path locale di destinazione di un upload (crea la directory se manca)."""
         # Determina la directory base in base al tipo
         if destination_path.startswith("books/"):
             local_dir = self.local_base_path / "books"
@@ -153,13 +238,7 @@ class StorageService:
             relative_path = destination_path
         
         local_dir.mkdir(parents=True, exist_ok=True)
-        local_path = local_dir / relative_path
-        
-        with open(local_path, 'wb') as f:
-            f.write(data)
-        
-        print(f"[STORAGE] File salvato localmente: {local_path}")
-        return str(local_path)
+        return local_dir / relative_path
     
     def download_file(self, source_path: str) -> bytes:
         """
@@ -174,37 +253,79 @@ class StorageService:
         # Se il path è gs://, prova sempre GCS prima (anche se gcs_enabled è False)
         # perché il file potrebbe essere stato salvato su GCS in precedenza
         if source_path.startswith("gs://"):
-            if not self.gcs_enabled:
-                # Prova a inizializzare GCS comunque (potrebbe essere solo un problema di config)
-                try:
-                    if GCS_AVAILABLE:
-                        self._init_gcs_client()
-                        self.gcs_enabled = self.client is not None and self.bucket is not None
-                except Exception as e:
-                    print(f"[STORAGE] WARN: Impossibile inizializzare GCS: {e}")
-            
-            if self.gcs_enabled:
-                try:
-                    return self._download_from_gcs(source_path)
-                except Exception as e:
-                    print(f"[STORAGE] Errore download da GCS: {e}")
-                    # Non fare fallback locale per path GCS - il file è su GCS
-                    raise FileNotFoundError(
-                        f"File non trovato su GCS: {source_path}. "
-                        f"Verifica che GCS_ENABLED=true e che le credenziali siano configurate."
-                    )
-            else:
+            self._require_gcs(source_path)
+            try:
+                return self._download_from_gcs(source_path)
+            except Exception as e:
+                print(f"[STORAGE] Errore download da GCS: {e}")
+                # Non fare fallback locale per path GCS - il file è su GCS
                 raise FileNotFoundError(
-                    f"Path GCS richiesto ({source_path}) ma GCS non è abilitato. "
-                    f"Imposta GCS_ENABLED=true nel .env"
+                    f"File non trovato su GCS: {source_path}. "
+                    f"Verifica che GCS_ENABLED=true e che le credenziali siano configurate."
                 )
         
         # Path locale
         return self._download_from_local(source_path)
     
+    def open_stream(self, source_path: str, chunk_size: int = STREAM_CHUNK_SIZE) -> Iterator[bytes]:
+        """
+        Apre un file da GCS o locale e ne restituisce il contenuto a blocchi.
+        
+        Il file viene cercato subito (FileNotFoundError prima di iniziare a leggere),
+        poi viene letto un blocco alla volta invece di tenerlo tutto in memoria.
+        
+        Args:
+            source_path: Path del file (gs://bucket/path per GCS, path locale per fallback)
+            chunk_size: Dimensione massima di ogni blocco in bytes
+        
+        Returns:
+            Iteratore sui blocchi del file
+        """
+        if source_path.startswith("gs://"):
+            self._require_gcs(source_path)
+            try:
+                reader = self._find_gcs_blob(source_path).open("rb", chunk_size=chunk_size)
+            except Exception as e:
+                print(f"[STORAGE] Errore apertura stream da GCS: {e}")
+                raise FileNotFoundError(f"File non trovato su GCS: {source_path}")
+        else:
+            reader = open(self._resolve_local_path(source_path), 'rb')
+        return self._iter_chunks(reader, chunk_size)
+    
+    @staticmethod
+    def _iter_chunks(reader, chunk_size: int) -> Iterator[bytes]:
+        """Legge un file aperto a blocchi e lo chiude a fine lettura (o se il client si disconnette)."""
+        with reader:
+            while True:
+                chunk = reader.read(chunk_size)
+                if not chunk:
+                    break
+                yield chunk
+    
+    def _require_gcs(self, source_path: str):
+        """Inizializza GCS per un path gs:// se necessario; FileNotFoundError se non è disponibile."""
+        if not self.gcs_enabled:
+            # Prova a inizializzare GCS comunque (potrebbe essere solo un problema di config)
+            try:
+                if GCS_AVAILABLE:
+                    self._init_gcs_client()
+                    self.gcs_enabled = self.client is not None and self.bucket is not None
+            except Exception as e:
+                print(f"[STORAGE] WARN: Impossibile inizializzare GCS: {e}")
+        
+        if not self.gcs_enabled:
+            raise FileNotFoundError(
+                f"Path GCS richiesto ({source_path}) ma GCS non è abilitato. "
+                f"Imposta GCS_ENABLED=true nel .env"
+            )
+    
     def _download_from_gcs(self, gcs_path: str) -> bytes:
+        """Download da Google Cloud Storage con retrocompatibilità (vedi _find_gcs_blob)."""
+        return self._find_gcs_blob(gcs_path).download_as_bytes()
+    
+    def _find_gcs_blob(self, gcs_path: str):
         """
-        Download da Google Cloud Storage con retrocompatibilità.
+        Trova il blob GCS di un file con retrocompatibilità.
         
         Cerca il file in diverse posizioni per gestire migrazione da struttura vecchia (covers/) 
         a struttura nuova (users/{user_id}/covers/).
@@ -242,7 +363,7 @@ class StorageService:
                 blob = self.bucket.blob(path)
                 if blob.exists():
                     print(f"[STORAGE] File trovato su GCS: {path} (path originale: {blob_path})")
-                    return blob.download_as_bytes()
+                    return blob
             except Exception as e:
                 last_error = e
                 continue
@@ -257,6 +378,11 @@ class StorageService:
     
     def _download_from_local(self, local_path: str) -> bytes:
         """Download da filesystem locale."""
+        with open(self._resolve_local_path(local_path), 'rb') as f:
+            return f.read()
+    
+    def _resolve_local_path(self, local_path: str) -> Path:
+        """Risolve un path locale (anche relativo) nelle directory standard; FileNotFoundError se manca."""
         path = Path(local_path)
         
         # Se è un path relativo, prova a cercarlo nelle directory standard
@@ -278,8 +404,7 @@ class StorageService:
         if not path.exists():
             raise FileNotFoundError(f"File non trovato localmente: {local_path} (cercato in: {path})")
         
-        with open(path, 'rb') as f:
-            return f.read()
+        return path
     
     def get_signed_url(
         self,
@@ -384,6 +509,53 @@ class StorageService:
         print(f"[STORAGE] File eliminato da GCS: {gcs_path}")
         return True
     
+    def delete_files(self, paths: list[str]) -> dict[str, tuple[bool, Optional[str]]]:
+        """
+        Elimina più file da GCS o locale.
+        
+        I file su GCS sono eliminati in parallelo (fino a GCS_DELETE_CONCURRENCY richieste
+        contemporanee) invece che uno dopo l'altro.
+        
+        Args:
+            paths: Path dei file da eliminare
+        
+        Returns:
+            Dict path -> (eliminato, errore): (True, None) se eliminato, (False, None) se il file
+            non esisteva, (False, messaggio) in caso di errore
+        """
+        results: dict[str, tuple[bool, Optional[str]]] = {}
+        gcs_paths = []
+        for path in paths:
+            if path.startswith("gs://") and self.gcs_enabled:
+                gcs_paths.append(path)
+                continue
+            try:
+                results[path] = (self._delete_from_local(path), None)
+            except Exception as e:
+                results[path] = (False, str(e))
+        
+        if gcs_paths:
+            if self.bucket is None:
+                self._init_gcs_client()
+            with ThreadPoolExecutor(max_workers=min(GCS_DELETE_CONCURRENCY, len(gcs_paths))) as executor:
+                results.update(zip(gcs_paths, executor.map(self._delete_gcs_blob, gcs_paths)))
+            deleted = sum(1 for path in gcs_paths if results[path][0])
+            print(f"[STORAGE] Eliminati da GCS {deleted}/{len(gcs_paths)} file")
+        return results
+    
+    def _delete_gcs_blob(self, gcs_path: str) -> tuple[bool, Optional[str]]:
+        """Elimina un file da GCS senza verificarne prima l'esistenza (vedi delete_files)."""
+        prefix = f"gs://{self.bucket_name}/"
+        blob_path = gcs_path[len(prefix):] if gcs_path.startswith(prefix) else gcs_path
+        try:
+            self.bucket.blob(blob_path).delete()
+        except NotFound:
+            # File già assente: non eliminato, ma nemmeno un errore
+            return False, None
+        except Exception as e:
+            return False, str(e)
+        return True, None
+    
     def _delete_from_local(self, local_path: str) -> bool:
         """Elimina file locale."""
         path = Path(local_path)
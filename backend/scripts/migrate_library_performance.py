@@ -3,9 +3,11 @@
 Script di migrazione per ottimizzare le performance della libreria.
 
 Questo script aggiunge i campi pre-calcolati (total_pages, completed_chapters_count)
-al writing_progress di tutti i libri completati che non li hanno ancora.
+al writing_progress di tutti i libri completati che non li hanno ancora, e il
+page_count a ogni capitolo salvato prima che venisse calcolato in scrittura.
 
-Questo evita di dover caricare book_chapters per ogni richiesta alla libreria.
+Questo evita di dover caricare book_chapters per ogni richiesta alla libreria:
+l'endpoint della libreria non esegue più alcun backfill per i libri vecchi.
 
 Uso:
     cd backend
@@ -66,8 +68,9 @@ async def migrate_sessions():
             # Verifica se ha già i campi pre-calcolati
             has_total_pages = session.writing_progress.get('total_pages') is not None
             has_chapters_count = session.writing_progress.get('completed_chapters_count') is not None
+            has_page_counts = all(ch.get('page_count') is not None for ch in session.book_chapters or [])
             
-            if has_total_pages and has_chapters_count:
+            if has_total_pages and has_chapters_count and has_page_counts:
                 print(f"[MIGRAZIONE] {session_id}: già migrato, skip")
                 skipped_count += 1
                 continue
@@ -80,13 +83,18 @@ async def migrate_sessions():
             
             completed_chapters_count = len(session.book_chapters)
             
-            # Calcola total_pages
-            chapters_pages = sum(calculate_page_count(ch.get('content', '')) for ch in session.book_chapters)
+            # Salva il page_count dei capitoli che non lo hanno
+            for ch in session.book_chapters:
+                if ch.get('page_count') is None:
+                    ch['page_count'] = calculate_page_count(ch.get('content', ''))
+            
+            # Calcola total_pages (se già presente si mantiene il valore salvato)
+            chapters_pages = sum(ch['page_count'] for ch in session.book_chapters)
             cover_pages = 1
             app_config = get_app_config()
             toc_chapters_per_page = app_config.get("validation", {}).get("toc_chapters_per_page", 30)
             toc_pages = math.ceil(completed_chapters_count / toc_chapters_per_page) if completed_chapters_count else 0
-            total_pages = chapters_pages + cover_pages + toc_pages
+            total_pages = session.writing_progress.get('total_pages') or chapters_pages + cover_pages + toc_pages
             
             # Aggiorna writing_progress
             session.writing_progress['total_pages'] = total_pages
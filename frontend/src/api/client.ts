@@ -818,8 +818,8 @@ export async function getBookCritique(sessionId: string): Promise<LiteraryCritiq
 }
 
 export async function getCritiqueAudio(sessionId: string): Promise<Blob> {
+  // GET: il browser riusa l'audio in cache e lo rivalida con ETag/If-None-Match
   const response = await fetch(`${API_BASE}/critique/audio/${sessionId}`, {
-    method: 'POST',
     credentials: 'include',
   });
   
@@ -1069,6 +1069,7 @@ export interface LibraryResponse {
   total: number;
   has_more?: boolean;  // Indica se ci sono altri libri da caricare
   stats?: LibraryStats;
+  next_cursor?: string | null;  // Cursore per caricare la pagina successiva
 }
 
 export interface LibraryFilters {
@@ -1079,7 +1080,8 @@ export interface LibraryFilters {
   search?: string;
   sort_by?: string;
   sort_order?: 'asc' | 'desc';
-  skip?: number;  // Numero di libri da saltare (per paginazione)
+  skip?: number;  // Deprecato: usare cursor
+  cursor?: string;  // Cursore restituito in next_cursor (per paginazione)
   limit?: number;  // Numero massimo di libri da restituire (per paginazione)
 }
 
@@ -1107,7 +1109,11 @@ export async function getLibrary(filters?: LibraryFilters): Promise<LibraryRespo
     if (filters.search) params.append('search', filters.search);
     if (filters.sort_by) params.append('sort_by', filters.sort_by);
     if (filters.sort_order) params.append('sort_order', filters.sort_order);
-    if (filters.skip !== undefined) params.append('skip', filters.skip.toString());
+    if (filters.cursor) {
+      params.append('cursor', filters.cursor);
+    } else if (filters.skip !== undefined) {
+      params.append('skip', filters.skip.toString());
+    }
     if (filters.limit !== undefined) params.append('limit', filters.limit.toString());
   }
   
@@ -1175,8 +1181,13 @@ export interface UsersStats {
   }>;
 }
 
-export async function getUsersStats(): Promise<UsersStats> {
-  const response = await fetch(`${API_BASE}/admin/users/stats`, {
+export async function getUsersStats(limit?: number, offset?: number): Promise<UsersStats> {
+  const params = new URLSearchParams();
+  if (limit !== undefined) params.append('limit', limit.toString());
+  if (offset !== undefined) params.append('offset', offset.toString());
+  
+  const url = `${API_BASE}/admin/users/stats${params.toString() ? '?' + params.toString() : ''}`;
+  const response = await fetch(url, {
     credentials: 'include',
   });
   
@@ -36,6 +36,7 @@ export default function LibraryView() {
   const isFirstLoad = useRef(true);
   const loadMoreRef = useRef<HTMLDivElement>(null);
   const isLoadingRef = useRef(false);  // Previene chiamate duplicate
+  const nextCursorRef = useRef<string | null>(null);  // Cursore della pagina successiva
   const pageSize = 10;  // Ridotto a 10 per caricamenti più veloci
 
   // Carica configurazione per avere modelli e generi disponibili
@@ -70,9 +71,14 @@ export default function LibraryView() {
       // Per il primo caricamento o refresh, reset paginazione
       if (!append) {
         filtersToUse.skip = 0;
+        filtersToUse.cursor = undefined;
+        filtersToUse.limit = pageSize;
+      } else if (nextCursorRef.current) {
+        // Per il caricamento incrementale, riparti dal cursore restituito dal server
+        filtersToUse.cursor = nextCursorRef.current;
         filtersToUse.limit = pageSize;
       } else {
-        // Per il caricamento incrementale, usa il conteggio passato
+        // Fallback: usa il conteggio passato
         filtersToUse.skip = currentBooksCount;
         filtersToUse.limit = pageSize;
       }
@@ -104,7 +110,8 @@ export default function LibraryView() {
         setBooks(libraryResponse.books);
       }
       
-      // Aggiorna stato hasMore
+      // Aggiorna stato hasMore e cursore
+      nextCursorRef.current = libraryResponse.next_cursor ?? null;
       setHasMore(libraryResponse.has_more ?? false);
     } catch (err) {
       const errorMessage = err instanceof Error ? err.message : 'Errore nel caricamento della libreria';